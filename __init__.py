@@ -57,7 +57,11 @@ if "bpy" in locals():
     imp.reload(cellblender_molecules)
     imp.reload(object_surface_regions)
     imp.reload(io_mesh_mcell_mdl)
+    imp.reload(resource_policy)
     imp.reload(sim_runner_queue)
+    imp.reload(run_cache)
+    imp.reload(viz_io)
+    imp.reload(sweep)
     imp.reload(mdl)         # BK: Added for MDL
     imp.reload(bng)         # DB: Adde for BNG
     #    imp.reload(sbml)        #JJT: Added for SBML
@@ -77,7 +81,11 @@ else:
     from . import cellblender_molecules
     from . import object_surface_regions
     from . import io_mesh_mcell_mdl
+    from . import resource_policy
     from . import sim_runner_queue
+    from . import run_cache
+    from . import viz_io
+    from . import sweep
     from . import mdl  # BK: Added for MDL
     from . import bng  # DB: Added for BNG
     #    from . import sbml #JJT: Added for SBML
@@ -90,6 +98,9 @@ else:
 
 simulation_queue = sim_runner_queue.SimQueue()
 
+# Status of the runs in simulation_popen_list
+simulation_popen_status = sim_runner_queue.RunStatusTable()
+
 import bpy
 import sys
 
@@ -237,12 +248,18 @@ def register():
     # Add the frame change pre handler
     add_handler ( bpy.app.handlers.frame_change_pre, cellblender_operators.frame_change_handler )
 
+    # Add the render handlers (full resolution molecules for final renders)
+    add_handler ( bpy.app.handlers.render_pre, cellblender_operators.mol_viz_render_pre )
+    add_handler ( bpy.app.handlers.render_complete, cellblender_operators.mol_viz_render_post )
+    add_handler ( bpy.app.handlers.render_cancel, cellblender_operators.mol_viz_render_post )
+
     # Add the load_pre handlers
     add_handler ( bpy.app.handlers.load_pre, cellblender_properties.report_load_pre )
 
     # Add the load_post handlers
     add_handler ( bpy.app.handlers.load_post, data_model.load_post )
     add_handler ( bpy.app.handlers.load_post, cellblender_operators.clear_run_list )
+    add_handler ( bpy.app.handlers.load_post, cellblender_operators.restore_simulation_queue )
     add_handler ( bpy.app.handlers.load_post, cellblender_operators.model_objects_update )
     add_handler ( bpy.app.handlers.load_post, object_surface_regions.object_regions_format_update )
     add_handler ( bpy.app.handlers.load_post, cellblender_operators.mcell_valid_update )
@@ -255,6 +272,10 @@ def register():
     add_handler ( bpy.app.handlers.load_post, cellblender_operators.load_preferences )
     add_handler ( bpy.app.handlers.load_post, cellblender_properties.scene_loaded )
     add_handler ( bpy.app.handlers.load_post, cellblender_operators.read_viz_data_load_post )
+    add_handler ( bpy.app.handlers.load_post, parameter_system.clear_parameter_caches )
+    add_handler ( bpy.app.handlers.load_post, io_mesh_mcell_mdl.export_mcell_mdl.clear_export_caches )
+    add_handler ( bpy.app.handlers.undo_post, parameter_system.clear_parameter_caches )
+    add_handler ( bpy.app.handlers.redo_post, parameter_system.clear_parameter_caches )
 
     # Add the scene update pre handler
     add_handler ( bpy.app.handlers.scene_update_pre, cellblender_properties.scene_loaded )
@@ -266,15 +287,22 @@ def register():
     # Register atexit function to shutdown simulation queue before quitting Blender
     atexit.register(simulation_queue.shutdown)
 
+    # Stop the viz frame prefetch threads before quitting Blender
+    atexit.register(cellblender_operators.global_viz_frame_cache.shutdown)
+
     print("CellBlender Registered")
 
 
 
 def unregister():
     remove_handler ( bpy.app.handlers.frame_change_pre, cellblender_operators.frame_change_handler )
+    remove_handler ( bpy.app.handlers.render_pre, cellblender_operators.mol_viz_render_pre )
+    remove_handler ( bpy.app.handlers.render_complete, cellblender_operators.mol_viz_render_post )
+    remove_handler ( bpy.app.handlers.render_cancel, cellblender_operators.mol_viz_render_post )
     remove_handler ( bpy.app.handlers.load_pre,         cellblender_properties.report_load_pre )
     remove_handler ( bpy.app.handlers.load_post, data_model.load_post )
     remove_handler ( bpy.app.handlers.load_post, cellblender_operators.clear_run_list )
+    remove_handler ( bpy.app.handlers.load_post, cellblender_operators.restore_simulation_queue )
     remove_handler ( bpy.app.handlers.load_post, cellblender_operators.model_objects_update )
     remove_handler ( bpy.app.handlers.load_post, object_surface_regions.object_regions_format_update )
     remove_handler ( bpy.app.handlers.load_post, cellblender_operators.mcell_valid_update )
@@ -285,6 +313,10 @@ def unregister():
     
     remove_handler ( bpy.app.handlers.load_post, cellblender_operators.load_preferences )
     remove_handler ( bpy.app.handlers.load_post, cellblender_properties.scene_loaded )
+    remove_handler ( bpy.app.handlers.load_post, parameter_system.clear_parameter_caches )
+    remove_handler ( bpy.app.handlers.load_post, io_mesh_mcell_mdl.export_mcell_mdl.clear_export_caches )
+    remove_handler ( bpy.app.handlers.undo_post, parameter_system.clear_parameter_caches )
+    remove_handler ( bpy.app.handlers.redo_post, parameter_system.clear_parameter_caches )
     remove_handler ( bpy.app.handlers.scene_update_pre, cellblender_properties.scene_loaded )
     remove_handler ( bpy.app.handlers.save_pre, data_model.save_pre )
     remove_handler ( bpy.app.handlers.save_pre, cellblender_operators.model_objects_update )
@@ -45,17 +45,16 @@ class EXTERNAL_OT_parameter_add(bpy.types.Operator):
         #jfile = json.load(filePointer) 
         jfile = accessFile(filePath,self)       
         par_list = jfile['par_list']
-        index = -1
-        for key in par_list:
-            index += 1
+        with mcell.parameter_system.batch() as batch:
+            for key in par_list:
 
-            par_name = str(key['name'])
-            par_value = str(key['value'])
-            par_unit = str(key['unit'])
-            par_type = str(key['type'])
+                par_name = str(key['name'])
+                par_value = str(key['value'])
+                par_unit = str(key['unit'])
+                par_type = str(key['type'])
 
-            mcell.parameter_system.add_general_parameter_with_values( par_name, par_value, par_unit, par_type )
-            #print ( "Adding parameter \"" + str(par_name) + "\"  =  \"" + str(par_value) + "\"  (" + str(par_unit) + ")" )
+                batch.add ( par_name, par_value, par_unit, par_type )
+                #print ( "Adding parameter \"" + str(par_name) + "\"  =  \"" + str(par_value) + "\"  (" + str(par_unit) + ")" )
  
         return {'FINISHED'}
 
@@ -31,7 +31,10 @@ import mathutils
 
 # python imports
 import array
+import collections
+import colorsys
 import glob
+import json
 import os
 import random
 import re
@@ -46,6 +49,10 @@ from . import data_model
 # import cellblender_source_info
 from cellblender.utils import project_files_path
 from cellblender.io_mesh_mcell_mdl import export_mcell_mdl
+from cellblender import viz_io
+from cellblender import sweep
+from cellblender import sim_runner_queue
+from cellblender import run_cache
 
 # from . import ParameterSpace
 
@@ -63,6 +70,20 @@ def unregister():
 
 global_mol_file_list = []
 
+# Decoded viz frames, prefetched ahead of the current frame during playback
+global_viz_frame_cache = viz_io.VizFrameCache()
+
+# Frame index (iterations, species counts, bounding boxes) of the viz directory
+global_viz_seed_index = None
+
+# True while a render is running with full resolution molecules
+global_viz_full_resolution = False
+
+# True while a MCELL_OT_mol_viz_follow modal operator is running, and the
+# modification times of the viz directories when it last looked for frames
+global_viz_follow_running = False
+global_viz_follow_mtimes = None
+
 
 
 class MCELL_OT_upgrade(bpy.types.Operator):
@@ -1381,12 +1402,8 @@ class MCELL_OT_run_simulation(bpy.types.Operator):
 
         mcell = context.scene.mcell
         if str(mcell.run_simulation.simulation_run_control) == 'QUEUE':
-            processes_list = mcell.run_simulation.processes_list
-            for pl_item in processes_list:
-                pid = int(pl_item.name.split(',')[0].split(':')[1])
-                q_item = cellblender.simulation_queue.task_dict[pid]
-                if (q_item['status'] == 'running') or (q_item['status'] == 'queued'):
-                    return False
+            if cellblender.simulation_queue.status_table.count('running', 'queued'):
+                return False
         return True
 
     def execute(self, context):
@@ -1479,11 +1496,16 @@ class MCELL_OT_run_simulation_control_normal(bpy.types.Operator):
                 # multiprocessing pool, instead of directly creating it here,
                 # because the multiprocessing package requires that the __main__
                 # module be importable by the children.
-                sp = subprocess.Popen([
+                run_args = [
                     python_path, script_file_path, mcell_binary, str(start),
                     str(end + 1), project_dir, base_name, error_file_option,
-                    log_file_option, mcell_processes_str], stdout=None,
-                    stderr=None)
+                    log_file_option, mcell_processes_str]
+                settings = resource_policy_settings(mcell.run_simulation)
+                if settings or mcell.run_simulation.use_run_cache:
+                    run_args.append(json.dumps(settings))
+                if mcell.run_simulation.use_run_cache:
+                    run_args.append(os.path.join(project_dir, RUN_CACHE_DIR))
+                sp = subprocess.Popen(run_args, stdout=None, stderr=None)
                 self.report({'INFO'}, "Simulation Running")
 
                 # This is a hackish workaround since we can't return arbitrary
@@ -1491,6 +1513,7 @@ class MCELL_OT_run_simulation_control_normal(bpy.types.Operator):
                 # properties, and we need to keep track of the progress of the
                 # subprocess objects in cellblender_panels.
                 cellblender.simulation_popen_list.append(sp)
+                simulation_process.task_id = cellblender.simulation_popen_status.watch(sp)
 
                 if ((end - start) == 0):
                     simulation_process.name = ("PID: %d, MDL: %s.main.mdl, "
@@ -1563,9 +1586,10 @@ class MCELL_OT_run_simulation_control_queue(bpy.types.Operator):
 
                 error_file_option = mcell.run_simulation.error_file
                 log_file_option = mcell.run_simulation.log_file
-                cellblender.simulation_queue.python_exec = python_path
-                cellblender.simulation_queue.start(mcell_processes)
-                cellblender.simulation_queue.notify = True
+                cellblender.simulation_queue.open_journal(
+                    os.path.join(project_dir, RUN_JOURNAL_NAME))
+                if not start_simulation_queue(mcell, python_path):
+                    return {'CANCELLED'}
 
                 processes_list = mcell.run_simulation.processes_list
                 for seed in range(start_seed,end_seed + 1):
@@ -1601,11 +1625,13 @@ class MCELL_OT_run_simulation_control_queue(bpy.types.Operator):
 
                   mdl_filename = '%s.main.mdl' % (base_name)
                   mcell_args = '-seed %d %s' % (seed, mdl_filename)
-                  proc = cellblender.simulation_queue.add_task(mcell_binary, mcell_args, project_dir)
+                  task_info = {'mdl': mdl_filename, 'seed': seed}
+                  task_id = cellblender.simulation_queue.add_task(mcell_binary, mcell_args, project_dir, task_info)
 
                   self.report({'INFO'}, "Simulation Running")
 
-                  simulation_process.name = ("PID: %d, MDL: %s, " "Seed: %d" % (proc.pid, mdl_filename, seed))
+                  simulation_process.name = queue_process_name(task_id, task_info)
+                  simulation_process.task_id = task_id
 
         else:
             status = "Python not found. Set it in Project Settings."
@@ -1615,6 +1641,261 @@ class MCELL_OT_run_simulation_control_queue(bpy.types.Operator):
         return {'FINISHED'}
 
 
+class MCELL_OT_sweep_parameter_add(bpy.types.Operator):
+    bl_idname = "mcell.sweep_parameter_add"
+    bl_label = "Add Swept Parameter"
+    bl_description = "Add a parameter to the parameter sweep"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    def execute(self, context):
+        run_sim = context.scene.mcell.run_simulation
+        run_sim.sweep_list.add()
+        run_sim.active_sweep_index = len(run_sim.sweep_list)-1
+        return {'FINISHED'}
+
+
+class MCELL_OT_sweep_parameter_remove(bpy.types.Operator):
+    bl_idname = "mcell.sweep_parameter_remove"
+    bl_label = "Remove Swept Parameter"
+    bl_description = "Remove the selected parameter from the parameter sweep"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    def execute(self, context):
+        run_sim = context.scene.mcell.run_simulation
+        run_sim.sweep_list.remove(run_sim.active_sweep_index)
+        run_sim.active_sweep_index = max(0, run_sim.active_sweep_index-1)
+        return {'FINISHED'}
+
+
+def sweep_design(run_sim):
+    """ Build the list of sweep points from the sweep settings """
+    if run_sim.sweep_design == 'LHS':
+        bounds = [(sp.par_name, sp.start, sp.stop)
+                  for sp in run_sim.sweep_list]
+        return sweep.latin_hypercube_design(
+            bounds, run_sim.sweep_points, run_sim.sweep_seed)
+    axes = [(sp.par_name, sweep.linspace(sp.start, sp.stop, sp.n_values))
+            for sp in run_sim.sweep_list]
+    return sweep.grid_design(axes)
+
+
+class MCELL_OT_run_parameter_sweep(bpy.types.Operator):
+    bl_idname = "mcell.run_parameter_sweep"
+    bl_label = "Run Parameter Sweep"
+    bl_description = ("Export one MDL variant per sweep point and queue "
+                      "every point for every seed")
+    bl_options = {'REGISTER'}
+
+    @classmethod
+    def poll(self, context):
+        return len(context.scene.mcell.run_simulation.sweep_list) > 0
+
+    def execute(self, context):
+        mcell = context.scene.mcell
+        run_sim = mcell.run_simulation
+        ps = mcell.parameter_system
+
+        par_names = set([p.par_name for p in ps.general_parameter_list])
+        for sp in run_sim.sweep_list:
+            if sp.par_name not in par_names:
+                run_sim.status = "Swept parameter \"%s\" is not a general parameter" % sp.par_name
+                return {'CANCELLED'}
+
+        if mcell.cellblender_preferences.python_binary_valid:
+            python_path = mcell.cellblender_preferences.python_binary
+        else:
+            python_path = shutil.which("python", mode=os.X_OK)
+        if not python_path:
+            run_sim.status = "Python not found. Set it in Project Settings."
+            return {'CANCELLED'}
+
+        # The points share every section except their parameters and outputs,
+        # which needs the modular format with expressions
+        export_format = mcell.export_project.export_format
+        export_as_expressions = ps.export_as_expressions
+        mcell.export_project.export_format = 'mcell_mdl_modular'
+        ps.export_as_expressions = True
+        try:
+            bpy.ops.mcell.export_project()
+        finally:
+            mcell.export_project.export_format = export_format
+            ps.export_as_expressions = export_as_expressions
+
+        if (run_sim.error_list and
+                mcell.cellblender_preferences.invalid_policy == 'dont_run'):
+            return {'CANCELLED'}
+
+        project_dir = project_files_path()
+        base_name = mcell.project_settings.base_name
+        for data_dir in ["react_data", "viz_data"]:
+            data_dir = os.path.join(project_dir, data_dir)
+            if os.path.exists(data_dir) and run_sim.remove_append == 'remove':
+                shutil.rmtree(data_dir)
+            os.makedirs(data_dir, exist_ok=True)
+
+        design = sweep_design(run_sim)
+        seeds = list(range(run_sim.start_seed, run_sim.end_seed + 1))
+        manifest = {
+            'base_name': base_name,
+            'design': run_sim.sweep_design,
+            'seeds': seeds,
+            'points': []}
+        mdl_names = []
+        for index, values in enumerate(design):
+            point = sweep.point_name(index)
+            for data_dir in ["react_data", "viz_data"]:
+                os.makedirs(os.path.join(project_dir, data_dir, point),
+                            exist_ok=True)
+            mdl_name = sweep.write_variant(
+                project_dir, base_name, point,
+                lambda out_file: export_mcell_mdl.save_general_parameters(
+                    ps, out_file, values))
+            mdl_names.append(mdl_name)
+            manifest['points'].append({
+                'name': point, 'mdl': mdl_name, 'values': values})
+        sweep.write_manifest(os.path.join(project_dir, "react_data"), manifest)
+
+        simulation_queue = cellblender.simulation_queue
+        simulation_queue.open_journal(os.path.join(project_dir, RUN_JOURNAL_NAME))
+        if not start_simulation_queue(mcell, python_path):
+            return {'CANCELLED'}
+
+        mcell_binary = mcell.cellblender_preferences.mcell_binary
+        for index, mdl_name in enumerate(mdl_names):
+            for seed in seeds:
+                task_info = {'mdl': mdl_name, 'seed': seed,
+                             'point': sweep.point_name(index)}
+                task_id = simulation_queue.add_task(
+                    mcell_binary, '-seed %d %s' % (seed, mdl_name),
+                    project_dir, task_info)
+                new_item = run_sim.processes_list.add()
+                new_item.name = queue_process_name(task_id, task_info)
+                new_item.task_id = task_id
+        run_sim.active_process_index = len(run_sim.processes_list) - 1
+        run_sim.status = ""
+
+        self.report({'INFO'}, "Queued %d sweep points x %d seeds" % (
+            len(mdl_names), len(seeds)))
+        return {'FINISHED'}
+
+
+# Journal of the simulation queue, kept in the project directory
+RUN_JOURNAL_NAME = "run_journal.jsonl"
+
+# Results of earlier runs by the hash of their inputs (see run_cache.py)
+RUN_CACHE_DIR = "run_cache"
+
+
+class MCELL_OT_clear_run_cache(bpy.types.Operator):
+    bl_idname = "mcell.clear_run_cache"
+    bl_label = "Clear Run Cache"
+    bl_description = ("Delete the stored results of earlier runs so every "
+                      "seed is simulated again")
+    bl_options = {'REGISTER'}
+
+    def execute(self, context):
+        run_cache.RunCache(os.path.join(
+            project_files_path(), RUN_CACHE_DIR)).clear()
+        self.report({'INFO'}, "Run cache cleared")
+        return {'FINISHED'}
+
+
+def resource_policy_settings(run_sim):
+    """ ResourcePolicy settings from the run options (None if there are no limits) """
+    settings = {
+        'cores_per_task': run_sim.cores_per_task if run_sim.pin_cores else 0,
+        'mem_limit_mb': run_sim.task_mem_limit,
+        'nice': run_sim.task_nice,
+        'admit_by_memory': run_sim.admit_by_memory,
+        'mem_reserve_mb': run_sim.mem_reserve,
+        'mem_per_task_mb': run_sim.task_mem_estimate}
+    if not (settings['cores_per_task'] or settings['mem_limit_mb'] or
+            settings['nice'] or settings['admit_by_memory']):
+        return None
+    return settings
+
+
+def start_simulation_queue(mcell, python_path):
+    """ Start the simulation queue with the executor set in the preferences.
+    Returns False (with the reason in the run status) if it can't be started. """
+    simulation_queue = cellblender.simulation_queue
+    workers = mcell.cellblender_preferences.sim_workers.strip()
+    if workers:
+        try:
+            simulation_queue.set_executor(sim_runner_queue.RemoteExecutor(
+                sim_runner_queue.RemoteExecutor.parse_addresses(workers),
+                mcell.cellblender_preferences.sim_worker_token))
+        except ValueError as err:
+            mcell.run_simulation.status = "Simulation Workers: %s" % err
+            return False
+    else:
+        simulation_queue.set_executor(sim_runner_queue.LocalExecutor())
+    if mcell.run_simulation.use_run_cache:
+        simulation_queue.set_run_cache(run_cache.RunCache(
+            os.path.join(project_files_path(), RUN_CACHE_DIR)))
+    else:
+        simulation_queue.set_run_cache(None)
+    settings = resource_policy_settings(mcell.run_simulation)
+    if settings:
+        simulation_queue.set_policy(sim_runner_queue.ResourcePolicy(**settings))
+    else:
+        simulation_queue.set_policy(None)
+    simulation_queue.python_exec = python_path
+    simulation_queue.start(mcell.run_simulation.mcell_processes)
+    simulation_queue.notify = True
+    return True
+
+
+def queue_process_name(task_id, task_info):
+    """ Name of a simulation queue task in the run list """
+    name = "Task: %d, MDL: %s, Seed: %d" % (
+        task_id, task_info.get('mdl', ''), task_info.get('seed', 0))
+    if task_info.get('cached'):
+        name += " (cached)"
+    return name
+
+
+class MCELL_OT_resume_simulation_queue(bpy.types.Operator):
+    bl_idname = "mcell.resume_simulation_queue"
+    bl_label = "Resume Unfinished Runs"
+    bl_description = ("Queue the runs which were interrupted or failed "
+                      "(including those of an earlier session) again")
+    bl_options = {'REGISTER'}
+
+    @classmethod
+    def poll(self, context):
+        return len(cellblender.simulation_queue.resumable) > 0
+
+    def execute(self, context):
+        mcell = context.scene.mcell
+        simulation_queue = cellblender.simulation_queue
+
+        if mcell.cellblender_preferences.python_binary_valid:
+            python_path = mcell.cellblender_preferences.python_binary
+        else:
+            python_path = shutil.which("python", mode=os.X_OK)
+        if not python_path:
+            mcell.run_simulation.status = "Python not found. Set it in Project Settings."
+            return {'CANCELLED'}
+
+        if not start_simulation_queue(mcell, python_path):
+            return {'CANCELLED'}
+        resumed = simulation_queue.resume_tasks()
+
+        # Replace the old entries of the run list by the new tasks
+        processes_list = mcell.run_simulation.processes_list
+        for idx in range(len(processes_list)-1, -1, -1):
+            if processes_list[idx].task_id not in simulation_queue.task_dict:
+                processes_list.remove(idx)
+        for task_id, task_info in resumed:
+            new_item = processes_list.add()
+            new_item.name = queue_process_name(task_id, task_info)
+            new_item.task_id = task_id
+        mcell.run_simulation.active_process_index = max(0, len(processes_list) - 1)
+        self.report({'INFO'}, "Resumed %d runs" % len(resumed))
+        return {'FINISHED'}
+
+
 class MCELL_OT_kill_simulation(bpy.types.Operator):
     bl_idname = "mcell.kill_simulation"
     bl_label = "Kill Selected Simulation"
@@ -1628,12 +1909,11 @@ class MCELL_OT_kill_simulation(bpy.types.Operator):
         mcell = context.scene.mcell
         processes_list = mcell.run_simulation.processes_list
         active_index = mcell.run_simulation.active_process_index
-        ap = processes_list[active_index]
-        pid = int(ap.name.split(',')[0].split(':')[1])
-        q_item = cellblender.simulation_queue.task_dict.get(pid)
-        if q_item:
-            if (q_item['status'] == 'running') or (q_item['status'] == 'queued'):
-                return True
+        if active_index >= len(processes_list):
+            return False
+        status = cellblender.simulation_queue.status_table.status(
+            processes_list[active_index].task_id)
+        return status in ('running', 'queued')
 
     def execute(self, context):
 
@@ -1641,13 +1921,11 @@ class MCELL_OT_kill_simulation(bpy.types.Operator):
 
         processes_list = mcell.run_simulation.processes_list
         active_index = mcell.run_simulation.active_process_index
-        ap = processes_list[active_index]
-        pid = int(ap.name.split(',')[0].split(':')[1])
-        q_item = cellblender.simulation_queue.task_dict.get(pid)
-        if q_item:
-            if (q_item['status'] == 'running') or (q_item['status'] == 'queued'):
-                # Simulation is running or waiting in queue, so let's kill it
-                cellblender.simulation_queue.kill_task(pid)
+        task_id = processes_list[active_index].task_id
+        status = cellblender.simulation_queue.status_table.status(task_id)
+        if status in ('running', 'queued'):
+            # Simulation is running or waiting in queue, so let's kill it
+            cellblender.simulation_queue.kill_task(task_id)
 
         return {'FINISHED'}
 
@@ -1663,13 +1941,11 @@ class MCELL_OT_kill_all_simulations(bpy.types.Operator):
         mcell = context.scene.mcell
         processes_list = mcell.run_simulation.processes_list
 
+        status_table = cellblender.simulation_queue.status_table
         for p_item in processes_list:
-            pid = int(p_item.name.split(',')[0].split(':')[1])
-            q_item = cellblender.simulation_queue.task_dict.get(pid)
-            if q_item:
-                if (q_item['status'] == 'running') or (q_item['status'] == 'queued'):
-                    # Simulation is running or waiting in queue, so let's kill it
-                    cellblender.simulation_queue.kill_task(pid)
+            if status_table.status(p_item.task_id) in ('running', 'queued'):
+                # Simulation is running or waiting in queue, so let's kill it
+                cellblender.simulation_queue.kill_task(p_item.task_id)
 
         return {'FINISHED'}
 
@@ -1771,6 +2047,7 @@ class MCELL_OT_run_simulation_control_opengl(bpy.types.Operator):
                 # properties, and we need to keep track of the progress of the
                 # subprocess objects in cellblender_panels.
                 cellblender.simulation_popen_list.append(sp)
+                simulation_process.task_id = cellblender.simulation_popen_status.watch(sp)
                 window_num += 1
 
 
@@ -1893,6 +2170,7 @@ class MCELL_OT_run_simulation_control_java(bpy.types.Operator):
                     # properties, and we need to keep track of the progress of the
                     # subprocess objects in cellblender_panels.
                     cellblender.simulation_popen_list.append(sp)
+                    simulation_process.task_id = cellblender.simulation_popen_status.watch(sp)
                     window_num += 1
 
 
@@ -1923,28 +2201,29 @@ class MCELL_OT_clear_run_list(bpy.types.Operator):
         mcell = context.scene.mcell
         # The collection property of subprocesses
         processes_list = mcell.run_simulation.processes_list
-        # A list holding actual subprocess objects
-        simulation_popen_list = cellblender.simulation_popen_list
-        sim_list_length = len(simulation_popen_list)
-        idx = 0
-        ctr = 0
+        # Status of the actual subprocess objects
+        status_table = cellblender.simulation_popen_status
 
-        while ctr < sim_list_length:
-            ctr += 1
-            sp = simulation_popen_list[idx]
+        for idx in range(len(processes_list)-1, -1, -1):
+            task_id = processes_list[idx].task_id
             # Simulation set is still running. Leave it in the collection
-            # property and list of subprocess objects.
-            if sp.poll() is None:
-                idx += 1
+            # property.
+            if status_table.status(task_id) == 'running':
+                continue
             # Simulation set has failed or finished. Remove it from
-            # collection property and the list of subprocess objects.
-            else:
-                processes_list.remove(idx)
-                simulation_popen_list.pop(idx)
+            # collection property and the status table.
+            processes_list.remove(idx)
+            status_table.remove(task_id)
+            if idx <= mcell.run_simulation.active_process_index:
                 mcell.run_simulation.active_process_index -= 1
                 if (mcell.run_simulation.active_process_index < 0):
                     mcell.run_simulation.active_process_index = 0
 
+        # Forget the subprocess objects which have exited
+        cellblender.simulation_popen_list[:] = [
+            sp for sp in cellblender.simulation_popen_list
+            if sp.returncode is None]
+
         return {'FINISHED'}
 
 
@@ -1967,10 +2246,9 @@ class MCELL_OT_clear_simulation_queue(bpy.types.Operator):
 
         while ctr < proc_list_length:
             ctr += 1
-            pid = int(processes_list[idx].name.split(',')[0].split(':')[1])
+            pid = processes_list[idx].task_id
             q_item = simulation_queue.task_dict.get(pid)
             if q_item:
-                proc = q_item['process']
                 if (q_item['status'] == 'queued') or (q_item['status'] == 'running'):
                     # Simulation is still running. Leave it in the collection
                     # property and simulation queue
@@ -2020,6 +2298,32 @@ def clear_run_list(context):
 
 
 
+@persistent
+def restore_simulation_queue(context):
+    """ Restore the simulation queue from the project's run journal.
+
+    Runs which are still alive are reattached and listed along with the
+    finished ones. Interrupted and failed runs can then be resumed.
+
+    """
+    if not bpy.data.filepath:
+        return
+    if not context:
+        context = bpy.context
+
+    journal_path = os.path.join(project_files_path(), RUN_JOURNAL_NAME)
+    restored = cellblender.simulation_queue.open_journal(journal_path)
+    if restored:
+        run_simulation = context.scene.mcell.run_simulation
+        run_simulation.processes_list.clear()
+        for task_id in restored:
+            new_item = run_simulation.processes_list.add()
+            new_item.name = queue_process_name(
+                task_id, cellblender.simulation_queue.task_dict[task_id]['info'])
+            new_item.task_id = task_id
+        run_simulation.active_process_index = 0
+
+
 @persistent
 def mcell_valid_update(context):
     """ Check whether the mcell executable in the .blend file is valid """
@@ -2064,7 +2368,10 @@ def create_color_list():
 
 @persistent
 def read_viz_data_load_post(context):
+    global global_viz_follow_running
     print ( "load post handler: cellblender_operators.read_viz_data_load_post() called" )
+    # Loading a file ends all modal operators, a viz follower included
+    global_viz_follow_running = False
     bpy.ops.mcell.read_viz_data()
 
 
@@ -2131,8 +2438,10 @@ class MCELL_OT_read_viz_data(bpy.types.Operator):
         mol_file_list = []
 
         if mol_file_dir != '':
-          mol_file_list = glob.glob(os.path.join(mol_file_dir, "*"))
-          mol_file_list.sort()
+          mol_file_list = read_mol_file_list(mol_file_dir)
+
+        mol_viz_prefetch_update(self, context)
+        global_viz_frame_cache.set_frame_list(mol_file_list)
 
         if mol_file_list:
           # Add all the viz_data files to global_mol_file_list (e.g.
@@ -2215,6 +2524,26 @@ class MCELL_OT_export_project(bpy.types.Operator):
 
         return {'FINISHED'}
 
+def read_mol_file_list(mol_file_dir):
+    """ Return the sorted list of frame files in a viz data directory.
+
+    The list comes from the directory's frame index file, which is brought up
+    to date (and created if needed) so the frames themselves are only read
+    when they are new or have changed.
+
+    """
+    global global_viz_seed_index
+
+    try:
+        global_viz_seed_index = viz_io.update_seed_index(mol_file_dir)
+    except OSError:
+        global_viz_seed_index = None
+        return []
+
+    return [os.path.join(mol_file_dir, entry['file'])
+            for entry in global_viz_seed_index['frames']]
+
+
 def set_viz_boundaries( context ):
         global global_mol_file_list
 
@@ -2268,8 +2597,7 @@ class MCELL_OT_select_viz_data(bpy.types.Operator):
 
         mcell.mol_viz.mol_file_dir = mol_file_dir
 
-        mol_file_list = glob.glob(os.path.join(mol_file_dir, "*"))
-        mol_file_list.sort()
+        mol_file_list = read_mol_file_list(mol_file_dir)
 
         # Reset mol_file_list and mol_viz_seed_list to empty
 #        mcell.mol_viz.mol_file_list.clear()
@@ -2280,6 +2608,9 @@ class MCELL_OT_select_viz_data(bpy.types.Operator):
 #            new_item.name = os.path.basename(mol_file_name)
             global_mol_file_list.append(os.path.basename(mol_file_name))
 
+        mol_viz_prefetch_update(self, context)
+        global_viz_frame_cache.set_frame_list(mol_file_list)
+
         create_color_list()
         set_viz_boundaries(context)
         mcell.mol_viz.mol_file_index = 0
@@ -2468,6 +2799,149 @@ class MCELL_OT_mol_viz_set_index(bpy.types.Operator):
         return{'FINISHED'}
 
 
+class MCELL_OT_mol_viz_follow(bpy.types.Operator):
+    bl_idname = "mcell.mol_viz_follow"
+    bl_label = "Follow Viz Data"
+    bl_description = ("Watch the viz data directory and load new frames "
+                      "while MCell is still running")
+    bl_options = {'REGISTER'}
+
+    _timer = None
+
+    def modal(self, context, event):
+        mcell = context.scene.mcell
+        if not mcell.mol_viz.follow_enable:
+            self.cancel(context)
+            return {'CANCELLED'}
+        if event.type == 'TIMER':
+            mol_viz_follow_poll(context)
+        return {'PASS_THROUGH'}
+
+    def execute(self, context):
+        global global_viz_follow_running
+        global global_viz_follow_mtimes
+        if global_viz_follow_running:
+            # Follow was switched off and on again before the running
+            # operator noticed, so it just keeps going
+            return {'CANCELLED'}
+        global_viz_follow_running = True
+        global_viz_follow_mtimes = None
+        mcell = context.scene.mcell
+        wm = context.window_manager
+        self._timer = wm.event_timer_add(
+            mcell.mol_viz.follow_interval, context.window)
+        wm.modal_handler_add(self)
+        return {'RUNNING_MODAL'}
+
+    def cancel(self, context):
+        global global_viz_follow_running
+        global_viz_follow_running = False
+        context.window_manager.event_timer_remove(self._timer)
+        # Following doesn't write the index on every poll, so write it now
+        mcell = context.scene.mcell
+        if global_viz_seed_index and mcell.mol_viz.mol_file_dir:
+            viz_io.save_seed_index(mcell.mol_viz.mol_file_dir,
+                                   global_viz_seed_index)
+
+
+class MCELL_OT_mol_viz_ensemble(bpy.types.Operator):
+    bl_idname = "mcell.mol_viz_ensemble"
+    bl_label = "Show Seed Ensemble"
+    bl_description = ("Load the current frame of every seed and overlay them "
+                      "or show their molecule density")
+    bl_options = {'REGISTER'}
+
+    def execute(self, context):
+        mcell = context.scene.mcell
+        mol_viz = mcell.mol_viz
+
+        if mol_viz.manual_select_viz_dir or not global_mol_file_list:
+            self.report({'ERROR'}, "Read the viz data of a project first")
+            return {'CANCELLED'}
+        if (mol_viz.ensemble_mode == 'DENSITY') and (viz_io.numpy is None):
+            self.report({'ERROR'}, "Density mode requires NumPy")
+            return {'CANCELLED'}
+
+        # The same frame file name exists in every seed directory
+        file_name = global_mol_file_list[mol_viz.mol_file_index]
+        viz_dir = os.path.relpath(os.path.join(project_files_path(), "viz_data"))
+        seed_names = [seed.name for seed in mol_viz.mol_viz_seed_list]
+        filepaths = [os.path.join(viz_dir, seed_name, file_name)
+                     for seed_name in seed_names]
+        frames = viz_io.read_frames_parallel(filepaths,
+                                             mol_viz.ensemble_workers)
+
+        mol_viz_ensemble_clear()
+        ens_obj = bpy.data.objects.get("ensemble")
+        if not ens_obj:
+            ens_obj = bpy.data.objects.new("ensemble", None)
+            context.scene.objects.link(ens_obj)
+            ens_obj.hide_select = True
+
+        if mol_viz.ensemble_mode == 'OVERLAY':
+            mol_viz_ensemble_overlay(context, ens_obj, seed_names, frames)
+        else:
+            mol_viz_ensemble_density(context, ens_obj, frames,
+                                     mol_viz.ensemble_resolution)
+
+        n_missing = frames.count(None)
+        if n_missing:
+            self.report({'WARNING'}, "%d of %d seeds have no file %s" % (
+                        n_missing, len(frames), file_name))
+        return {'FINISHED'}
+
+
+class MCELL_OT_pack_viz_data(bpy.types.Operator):
+    bl_idname = "mcell.pack_viz_data"
+    bl_label = "Pack Viz Data"
+    bl_description = ("Pack the frame files of every seed into one compressed "
+                      "archive per seed")
+    bl_options = {'REGISTER'}
+
+    def execute(self, context):
+        mcell = context.scene.mcell
+        mol_viz = mcell.mol_viz
+
+        if mol_viz.manual_select_viz_dir:
+            seed_dirs = [mol_viz.mol_file_dir]
+        else:
+            viz_dir = os.path.join(project_files_path(), "viz_data")
+            seed_dirs = [os.path.join(viz_dir, seed.name)
+                         for seed in mol_viz.mol_viz_seed_list]
+
+        n_frames = 0
+        for seed_dir in seed_dirs:
+            try:
+                n_frames += viz_io.write_seed_archive(
+                    seed_dir, quantize=mol_viz.archive_quantize,
+                    remove=mol_viz.archive_remove)
+            except (IOError, OSError, ValueError) as err:
+                self.report({'ERROR'}, "Packing %s failed: %s" % (
+                            seed_dir, str(err)))
+                return {'CANCELLED'}
+
+        global_viz_frame_cache.clear()
+        if global_mol_file_list:
+            if mol_viz.manual_select_viz_dir:
+                read_mol_file_list(mol_viz.mol_file_dir)
+            else:
+                bpy.ops.mcell.read_viz_data()
+        self.report({'INFO'}, "Packed %d frames of %d seeds" % (
+                    n_frames, len(seed_dirs)))
+        return {'FINISHED'}
+
+
+class MCELL_OT_mol_viz_ensemble_clear(bpy.types.Operator):
+    bl_idname = "mcell.mol_viz_ensemble_clear"
+    bl_label = "Clear Seed Ensemble"
+    bl_description = "Remove the seed ensemble objects from the scene"
+    bl_options = {'REGISTER'}
+
+    def execute(self, context):
+        mol_viz_ensemble_clear()
+        return {'FINISHED'}
+
+
 
 #CellBlender operator helper functions:
 
@@ -2488,9 +2962,100 @@ def frame_change_handler(scn):
         #    bpy.ops.render.render(write_still=True)
 
 
+@persistent
+def mol_viz_render_pre(scn):
+    """ Switch to full resolution molecules before a final render. """
+    global global_viz_full_resolution
+
+    mol_viz = scn.mcell.mol_viz
+    if (mol_viz.lod_enable and mol_viz.lod_full_render and
+            not global_viz_full_resolution):
+        global_viz_full_resolution = True
+        mol_viz_update(None, bpy.context)
+
+
+@persistent
+def mol_viz_render_post(scn):
+    """ Return to the subsampled molecules after a render. """
+    global global_viz_full_resolution
+
+    if global_viz_full_resolution:
+        global_viz_full_resolution = False
+        mol_viz_update(None, bpy.context)
+
+
+def mol_viz_follow_update(self, context):
+    """ Start following the viz data directory when follow is enabled. """
+
+    if context.scene.mcell.mol_viz.follow_enable:
+        bpy.ops.mcell.mol_viz_follow()
+
+
+def mol_viz_follow_poll(context):
+    """ Append frames which MCell has written since the last poll.
+
+    Only the new frames are indexed. The timeline is extended without
+    rescanning the directory and optionally moved to the newest frame.
+
+    """
+    global global_mol_file_list
+    global global_viz_seed_index
+    global global_viz_follow_mtimes
+
+    mcell = context.scene.mcell
+    mol_file_dir = mcell.mol_viz.mol_file_dir
+
+    if not global_mol_file_list:
+        # Nothing loaded yet (the seed directory may not exist until MCell
+        # writes its first frame), so try a normal read, but only once the
+        # viz directories have changed
+        dirs = [mol_file_dir]
+        if not mcell.mol_viz.manual_select_viz_dir:
+            dirs.append(os.path.join(project_files_path(), "viz_data"))
+        mtimes = []
+        for path in dirs:
+            try:
+                mtimes.append(os.stat(path).st_mtime)
+            except OSError:
+                mtimes.append(None)
+        if mtimes != global_viz_follow_mtimes:
+            global_viz_follow_mtimes = mtimes
+            bpy.ops.mcell.read_viz_data()
+        return
+
+    try:
+        seed_index = viz_io.update_seed_index(
+            mol_file_dir, seed_index=global_viz_seed_index,
+            check_all=False, save=False)
+    except OSError:
+        return
+
+    frames = seed_index['frames']
+    n_old = len(global_mol_file_list)
+    if len(frames) == n_old:
+        global_viz_seed_index = seed_index
+        return
+    if ((len(frames) < n_old) or
+            (frames[n_old-1]['file'] != global_mol_file_list[-1])):
+        # Frames were removed or renamed (e.g. a new run), so reload
+        bpy.ops.mcell.read_viz_data()
+        return
+
+    global_viz_seed_index = seed_index
+    new_file_list = [entry['file'] for entry in frames[n_old:]]
+    global_mol_file_list.extend(new_file_list)
+    global_viz_frame_cache.extend_frame_list(
+        [os.path.join(mol_file_dir, f) for f in new_file_list])
+    set_viz_boundaries(context)
+
+    if mcell.mol_viz.follow_jump:
+        context.scene.frame_set(len(global_mol_file_list) - 1)
+
+
 def mol_viz_toggle_manual_select(self, context):
     """ Toggle the option to manually load viz data. """
     global global_mol_file_list
+    global global_viz_seed_index
 
     mcell = context.scene.mcell
 
@@ -2498,6 +3063,8 @@ def mol_viz_toggle_manual_select(self, context):
     mcell.mol_viz.mol_file_name = ""
 #    mcell.mol_viz.mol_file_list.clear()
     global_mol_file_list = []
+    global_viz_seed_index = None
+    global_viz_frame_cache.clear()
     mcell.mol_viz.mol_viz_seed_list.clear()
 
     if not mcell.mol_viz.manual_select_viz_dir:
@@ -2526,6 +3093,159 @@ def get_mol_file_dir():
     return filepath
 
 
+def mol_viz_ensemble_clear():
+    """ Remove all objects, meshes and materials of the seed ensemble. """
+
+    scn_objs = bpy.context.scene.objects
+    for obj in [obj for obj in bpy.data.objects if obj.name[:4] == 'ens_']:
+        if obj.name in scn_objs:
+            scn_objs.unlink(obj)
+        bpy.data.objects.remove(obj)
+    for mesh in [m for m in bpy.data.meshes if m.name[:4] == 'ens_']:
+        if not mesh.users:
+            bpy.data.meshes.remove(mesh)
+    for mat in [m for m in bpy.data.materials if m.name[:4] == 'ens_']:
+        if not mat.users:
+            bpy.data.materials.remove(mat)
+
+
+def mol_viz_ensemble_overlay(context, ens_obj, seed_names, frames):
+    """ Show the molecules of every seed, tinted with a color per seed. """
+
+    meshes = bpy.data.meshes
+    mats = bpy.data.materials
+    objs = bpy.data.objects
+    scn_objs = context.scene.objects
+
+    for seed_num, (seed_name, frame) in enumerate(zip(seed_names, frames)):
+        if not frame:
+            continue
+        hue = float(seed_num) / len(seed_names)
+        seed_mat = mats.new("ens_%s_mat" % (seed_name))
+        seed_mat.diffuse_color = colorsys.hsv_to_rgb(hue, 0.8, 1.0)
+
+        for species, (mol_type, mol_pos, mol_orient) in frame.items():
+            ens_name = "ens_%s_%s" % (seed_name, species)
+            if mol_type == 0:
+                mol_orient = viz_io.volume_orientations(len(mol_pos) // 3)
+
+            # Copy the species glyph (or make a small one) for this seed
+            glyph_mesh = meshes.get("mol_%s_shape" % (species))
+            if glyph_mesh:
+                glyph_mesh = glyph_mesh.copy()
+                glyph_mesh.name = ens_name + "_shape"
+                glyph_mesh.materials.clear()
+            else:
+                bpy.ops.mesh.primitive_ico_sphere_add(
+                    subdivisions=0, size=0.005, location=[0, 0, 0])
+                glyph_obj = context.active_object
+                glyph_mesh = glyph_obj.data
+                glyph_mesh.name = ens_name + "_shape"
+                scn_objs.unlink(glyph_obj)
+                objs.remove(glyph_obj)
+            glyph_mesh.materials.append(seed_mat)
+            glyph_obj = objs.new(ens_name + "_shape", glyph_mesh)
+            scn_objs.link(glyph_obj)
+            glyph_obj.track_axis = "POS_Z"
+            glyph_obj.hide_select = True
+
+            pos_mesh = meshes.new(ens_name + "_pos")
+            pos_mesh.vertices.add(len(mol_pos) // 3)
+            pos_mesh.vertices.foreach_set("co", mol_pos)
+            pos_mesh.vertices.foreach_set("normal", mol_orient)
+            pos_mesh.update()
+
+            pos_obj = objs.new(ens_name, pos_mesh)
+            scn_objs.link(pos_obj)
+            glyph_obj.parent = pos_obj
+            pos_obj.dupli_type = 'VERTS'
+            pos_obj.use_dupli_vertices_rotation = True
+            pos_obj.parent = ens_obj
+            pos_obj.hide_select = True
+
+
+# Corners of a unit cube centered at the origin (index 4*x + 2*y + z) and
+# its faces with outward normals
+_cube_corners = [[x - 0.5, y - 0.5, z - 0.5]
+                 for x in (0, 1) for y in (0, 1) for z in (0, 1)]
+_cube_faces = [[0, 1, 3, 2], [4, 6, 7, 5], [0, 4, 5, 1],
+               [2, 3, 7, 6], [0, 2, 6, 4], [1, 5, 7, 3]]
+
+
+def mol_viz_ensemble_density(context, ens_obj, frames, resolution):
+    """ Show the mean molecule occupancy over seeds on a voxel grid.
+
+    Each species gets a mesh with one cube per occupied voxel. The volume of
+    a cube is proportional to the mean count in its voxel relative to the
+    species maximum, and its vertex color runs from blue (low) to red (high)
+    through a material which shows vertex colors. The relative density is
+    also stored in the "density" vertex group where it can drive particle or
+    material settings.
+
+    """
+
+    numpy = viz_io.numpy
+    grids, bbox, dims = viz_io.ensemble_density(frames, resolution)
+    if not grids:
+        return
+
+    low = numpy.array(bbox[:3])
+    step = (numpy.array(bbox[3:]) - low) / numpy.array(dims)
+    corners = numpy.array(_cube_corners)
+    faces = numpy.array(_cube_faces)
+    for species, grid in grids.items():
+        ens_name = "ens_density_%s" % (species)
+        cells = numpy.argwhere(grid > 0)
+        values = grid[tuple(cells.T)]
+        relative = values / values.max()
+        centers = low + (cells + 0.5) * step
+        n_cells = len(cells)
+
+        # 8 corners and 6 quads per cube, written with one call per array
+        sizes = (relative ** (1.0 / 3.0))[:, None, None] * step
+        cube_verts = centers[:, None, :] + corners[None, :, :] * sizes
+        vertex_index = (numpy.arange(n_cells)[:, None, None] * 8 +
+                        faces[None, :, :])
+        mesh = bpy.data.meshes.new(ens_name)
+        mesh.vertices.add(8 * n_cells)
+        mesh.vertices.foreach_set(
+            "co", cube_verts.astype(numpy.float32).ravel())
+        mesh.loops.add(24 * n_cells)
+        mesh.loops.foreach_set(
+            "vertex_index", vertex_index.astype(numpy.int32).ravel())
+        mesh.polygons.add(6 * n_cells)
+        mesh.polygons.foreach_set(
+            "loop_start", numpy.arange(0, 24 * n_cells, 4, dtype=numpy.int32))
+        mesh.polygons.foreach_set(
+            "loop_total", numpy.full(6 * n_cells, 4, dtype=numpy.int32))
+
+        colors = numpy.empty((n_cells, 3), dtype=numpy.float32)
+        colors[:, 0] = relative
+        colors[:, 1] = 0.2
+        colors[:, 2] = 1.0 - relative
+        color_layer = mesh.vertex_colors.new("density")
+        color_layer.data.foreach_set(
+            "color", numpy.repeat(colors, 24, axis=0).ravel())
+        mesh.update(calc_edges=True)
+
+        mat = bpy.data.materials.new(ens_name + "_mat")
+        mat.use_vertex_color_paint = True
+        mesh.materials.append(mat)
+
+        obj = bpy.data.objects.new(ens_name, mesh)
+        context.scene.objects.link(obj)
+        obj.parent = ens_obj
+        obj.hide_select = True
+
+        # Add vertices with equal (quantized) weights in a single call each
+        weights = numpy.round(relative * 255.0)
+        group = obj.vertex_groups.new("density")
+        for w in numpy.unique(weights):
+            cell_indices = numpy.flatnonzero(weights == w)
+            indices = (cell_indices[:, None] * 8 + numpy.arange(8)).ravel()
+            group.add(indices.tolist(), float(w) / 255.0, 'REPLACE')
+
+
 def mol_viz_update(self, context):
     """ Clear the old viz data. Draw the new viz data. """
     global global_mol_file_list
@@ -2543,15 +3263,30 @@ def mol_viz_update(self, context):
         global_undo = bpy.context.user_preferences.edit.use_global_undo
         bpy.context.user_preferences.edit.use_global_undo = False
 
-        mol_viz_clear(mcell)
+        # In incremental mode the molecule objects are kept and updated in
+        # place by mol_viz_file_read instead of being cleared every frame.
+        if not (mcell.mol_viz.mol_viz_enable and mcell.mol_viz.incremental_update):
+            mol_viz_clear(mcell)
         if mcell.mol_viz.mol_viz_enable:
-            mol_viz_file_read(mcell, filepath)
+            mol_viz_file_read(mcell, filepath, mcell.mol_viz.mol_file_index)
 
         # Reset undo back to its original state
         bpy.context.user_preferences.edit.use_global_undo = global_undo
     return
 
 
+def mol_viz_prefetch_update(self, context):
+    """ Apply the frame prefetch settings to the viz frame cache. """
+
+    mcell = context.scene.mcell
+
+    global_viz_frame_cache.configure(mcell.mol_viz.prefetch_frames,
+                                     mcell.mol_viz.prefetch_memory,
+                                     mcell.mol_viz.prefetch_threads)
+    if not mcell.mol_viz.prefetch_enable:
+        global_viz_frame_cache.drop_frames()
+
+
 def mol_viz_clear(mcell_prop, force_clear=False):
     """ Clear the viz data from the previous frame. """
 
@@ -2602,6 +3337,101 @@ def mol_viz_clear(mcell_prop, force_clear=False):
         mcell.mol_viz.mol_viz_list.remove(i)
 
 
+def mol_viz_roi_box(mol_viz):
+    """ Return the region of interest as [xmin, ymin, zmin, xmax, ymax, zmax].
+
+    None is returned when the region of interest is disabled or its object
+    doesn't exist. For an object, its world space bounding box is used.
+
+    """
+    if not mol_viz.roi_enable:
+        return None
+    if mol_viz.roi_mode == 'BOX':
+        low = [min(a, b) for a, b in zip(mol_viz.roi_min, mol_viz.roi_max)]
+        high = [max(a, b) for a, b in zip(mol_viz.roi_min, mol_viz.roi_max)]
+        return low + high
+    roi_obj = bpy.data.objects.get(mol_viz.roi_object)
+    if not roi_obj:
+        return None
+    corners = [roi_obj.matrix_world * mathutils.Vector(corner)
+               for corner in roi_obj.bound_box]
+    return ([min([c[i] for c in corners]) for i in range(3)] +
+            [max([c[i] for c in corners]) for i in range(3)])
+
+
+# Vertex group and mask modifier which hide the spare vertices of a
+# molecule object (see mol_viz_set_positions)
+MOL_SPARE_GROUP = "spare_molecules"
+
+
+def mol_viz_hide_spares(mol_obj, n_mols, n_verts):
+    """ Hide the vertices past the first n_mols of a molecule object.
+
+    The spare vertices are in a vertex group which an inverted mask
+    modifier removes before the vertices are instanced, so they show no
+    glyph in the viewport, in renders or in exports. Only the vertices whose
+    state changed since the last call are added to or removed from the group.
+
+    """
+    n_shown = mol_obj.get("n_mols", n_verts)
+    if n_shown == n_mols:
+        return
+    group = mol_obj.vertex_groups.get(MOL_SPARE_GROUP)
+    if group is None:
+        group = mol_obj.vertex_groups.new(MOL_SPARE_GROUP)
+    if MOL_SPARE_GROUP not in mol_obj.modifiers:
+        mask = mol_obj.modifiers.new(MOL_SPARE_GROUP, 'MASK')
+        mask.vertex_group = MOL_SPARE_GROUP
+        mask.invert_vertex_group = True
+    if n_mols < n_shown:
+        group.add(list(range(n_mols, n_shown)), 1.0, 'REPLACE')
+    else:
+        group.remove(list(range(n_shown, n_mols)))
+    mol_obj["n_mols"] = n_mols
+
+
+def mol_viz_set_positions(mol_obj, mol_pos, mol_orient):
+    """ Write molecule positions and orientations into an object's mesh.
+
+    The mesh is reused and only grown when the molecule count increases.
+    When the count shrinks the spare vertices are hidden (see
+    mol_viz_hide_spares), so the mesh keeps its capacity. Blender can't
+    remove vertices from a mesh, so only when fewer than half the vertices
+    are needed is a new mesh with the same name swapped in under the same
+    object.
+
+    """
+
+    meshes = bpy.data.meshes
+    mol_pos_mesh = mol_obj.data
+    n_mols = len(mol_pos) // 3
+    n_verts = len(mol_pos_mesh.vertices)
+
+    if (n_verts > n_mols) and (n_mols < n_verts // 2 or n_mols == 0):
+        old_mesh = mol_pos_mesh
+        mol_pos_mesh_name = old_mesh.name
+        old_mesh.name = mol_pos_mesh_name + "_old"
+        mol_pos_mesh = meshes.new(mol_pos_mesh_name)
+        mol_obj.data = mol_pos_mesh
+        meshes.remove(old_mesh)
+        n_verts = 0
+        # The new mesh has no spare vertices
+        mol_obj["n_mols"] = 0
+
+    if n_mols > n_verts:
+        mol_pos_mesh.vertices.add(n_mols - n_verts)
+        n_verts = n_mols
+    elif n_verts > n_mols:
+        # The spares are hidden, so what they hold does not matter
+        mol_pos = viz_io.pad_with_first(mol_pos, n_verts - n_mols)
+        mol_orient = viz_io.pad_with_first(mol_orient, n_verts - n_mols)
+    if n_verts > 0:
+        mol_pos_mesh.vertices.foreach_set("co", mol_pos)
+        mol_pos_mesh.vertices.foreach_set("normal", mol_orient)
+    mol_viz_hide_spares(mol_obj, n_mols, n_verts)
+    mol_pos_mesh.update()
+
+
 
 
 
@@ -2786,7 +3616,7 @@ def old_mol_viz_file_read(mcell_prop, filepath):
 import sys, traceback
 
 
-def mol_viz_file_read(mcell_prop, filepath):
+def mol_viz_file_read(mcell_prop, filepath, mol_file_index=None):
     """ Read and Draw the molecule viz data for the current frame. """
 
     mcell = mcell_prop
@@ -2795,85 +3625,53 @@ def mol_viz_file_read(mcell_prop, filepath):
 #        begin = resource.getrusage(resource.RUSAGE_SELF)[0]
 #        print ("Processing molecules from file:    %s" % (filepath))
 
-        # Quick check for Binary or ASCII format of molecule file:
-        mol_file = open(filepath, "rb")
-        b = array.array("I")
-        b.fromfile(mol_file, 1)
+        # Decode the whole frame (binary or ASCII) in one pass. The result
+        # maps each species name to [mol_type, positions, orientations].
+        # Frames come from the prefetch cache when reading by index.
+        frame_list = global_viz_frame_cache.frame_list
+        roi_box = mol_viz_roi_box(mcell.mol_viz)
+        seed_index = global_viz_seed_index
+        frame_entry = None
+        if (seed_index and (mol_file_index is not None) and
+                (mol_file_index < len(seed_index['frames']))):
+            frame_entry = seed_index['frames'][mol_file_index]
+            if frame_entry['file'] != os.path.basename(filepath):
+                frame_entry = None
+
+        if (roi_box and frame_entry and
+                not frame_entry.get('unindexed') and
+                not (frame_entry['bbox'] and
+                     viz_io.boxes_intersect(roi_box, frame_entry['bbox']))):
+            # Nothing in this frame is inside the region, so skip decoding
+            frame = collections.OrderedDict(
+                [(name, [info[0], [], []])
+                 for name, info in frame_entry['species'].items()])
+        elif (mcell.mol_viz.prefetch_enable and (mol_file_index is not None) and
+                (mol_file_index < len(frame_list)) and
+                (frame_list[mol_file_index] == filepath)):
+            frame = global_viz_frame_cache.get_frame(mol_file_index)
+        else:
+            frame = viz_io.read_viz_frame(filepath)
 
-        mol_dict = {}
+        if roi_box:
+            frame = viz_io.crop_frame(frame, roi_box)
 
-        if b[0] == 1:
-            # Read MCell/CellBlender Binary Format molecule file, version 1:
-            # print ("Reading binary file " + filepath )
-            bin_data = 1
-            while True:
-                try:
-                    # ni = Initially, byte array of molecule name length.
-                    # Later, array of number of molecule positions in xyz
-                    # (essentially, the number of molecules multiplied by 3).
-                    # ns = Array of ascii character codes for molecule name.
-                    # s = String of molecule name.
-                    # mt = Surface molecule flag.
-                    ni = array.array("B")          # Create a binary byte ("B") array
-                    ni.fromfile(mol_file, 1)       # Read one byte which is the number of characters in the molecule name
-                    ns = array.array("B")          # Create another byte array to hold the molecule name
-                    ns.fromfile(mol_file, ni[0])   # Read ni bytes from the file
-                    s = ns.tostring().decode()     # Decode bytes as ASCII into a string (s)
-                    mol_name = "mol_%s" % (s)      # Construct name of blender molecule viz object
-                    mt = array.array("B")          # Create a byte array for the molecule type
-                    mt.fromfile(mol_file, 1)       # Read one byte for the molecule type
-                    ni = array.array("I")          # Re-use ni as an integer array to hold the number of molecules of this name in this frame
-                    ni.fromfile(mol_file, 1)       # Read the 4 byte integer value which is 3 times the number of molecules
-                    mol_pos = array.array("f")     # Create a floating point array to hold the positions
-                    mol_orient = array.array("f")  # Create a floating point array to hold the orientations
-                    mol_pos.fromfile(mol_file, ni[0])  # Read the positions which should be 3 floats per molecule
-#                    tot += ni[0]/3  
-                    if mt[0] == 1:                                        # If mt==1, it's a surface molecule
-                        mol_orient.fromfile(mol_file, ni[0])              # Read the surface molecule orientations
-                    mol_dict[mol_name] = [mt[0], mol_pos, mol_orient]     # Create a dictionary entry for this molecule containing a list of relevant data
-                    new_item = mcell.mol_viz.mol_viz_list.add()           # Create a new collection item to hold the name for this molecule
-                    new_item.name = mol_name                              # Assign the name to the new item
-                except EOFError:
-#                    print("Molecules read: %d" % (int(tot)))
-                    mol_file.close()
-                    break
+        # Limit the instance count per species before any mesh is built
+        if mcell.mol_viz.lod_enable and not global_viz_full_resolution:
+            frame = viz_io.subsample_frame(frame, mcell.mol_viz.lod_max_mols)
 
-                except:
-                    print( "Unexpected Exception: " + str(sys.exc_info()) )
-#                    print("Molecules read: %d" % (int(tot)))
-                    mol_file.close()
-                    break
+        incremental = mcell.mol_viz.incremental_update
+        if incremental:
+            # Remember what the previous frame displayed, then start a new list
+            prev_mol_names = [item.name for item in mcell.mol_viz.mol_viz_list]
+            mcell.mol_viz.mol_viz_list.clear()
 
-        else:
-            # Read ASCII format molecule file:
-            # print ("Reading ASCII file " + filepath )
-            bin_data = 0
-            mol_file.close()
-            # Create a list of molecule names, positions, and orientations
-            # Each entry in the list is ordered like this (afaik):
-            # [molec_name, [x_pos, y_pos, z_pos, x_orient, y_orient, z_orient]]
-            # Orientations are zero in the case of volume molecules.
-            mol_data = [[s.split()[0], [
-                float(x) for x in s.split()[2:]]] for s in open(
-                    filepath, "r").read().split("\n") if s != ""]
-
-            for mol in mol_data:
-                mol_name = "mol_%s" % (mol[0])
-                if not mol_name in mol_dict:
-                    mol_orient = mol[1][3:]
-                    mt = 0
-                    # Check to see if it's a surface molecule
-                    if ((mol_orient[0] != 0.0) | (mol_orient[1] != 0.0) |
-                            (mol_orient[2] != 0.0)):
-                        mt = 1
-                    mol_dict[mol_name] = [
-                        mt, array.array("f"), array.array("f")]
-                    new_item = mcell.mol_viz.mol_viz_list.add()
-                    new_item.name = mol_name
-                mt = mol_dict[mol_name][0]
-                mol_dict[mol_name][1].extend(mol[1][:3])
-                if mt == 1:
-                    mol_dict[mol_name][2].extend(mol[1][3:])
+        mol_dict = collections.OrderedDict()
+        for s, mol_data in frame.items():
+            mol_name = "mol_%s" % (s)
+            mol_dict[mol_name] = mol_data
+            new_item = mcell.mol_viz.mol_viz_list.add()
+            new_item.name = mol_name
 
         # Get the parent object to all the molecule positions if it exists.
         # Otherwise, create it.
@@ -2904,10 +3702,9 @@ def mol_viz_file_read(mcell_prop, filepath):
 
                 # print ( "in mol_viz_file_read with mol_name = " + mol_name + ", mol_mat_name = " + mol_mat_name + ", file = " + filepath[filepath.rfind(os.sep)+1:] )
 
-                # Randomly orient volume molecules
+                # Randomly orient volume molecules (the same way every frame)
                 if mol_type == 0:
-                    mol_orient.extend([random.uniform(
-                        -1.0, 1.0) for i in range(len(mol_pos))])
+                    mol_orient = viz_io.volume_orientations(len(mol_pos) // 3)
 
                 # Look up the glyph, color, size, and other attributes from the molecules list
                 
@@ -2965,8 +3762,18 @@ def mol_viz_file_read(mcell_prop, filepath):
                 #    mol_mat.diffuse_color = mol.color
                 #    mol_mat.emit = mol.emit
 
-                # Look-up mesh to hold instances of molecule positions, create if needed
                 mol_pos_mesh_name = "%s_pos" % (mol_name)
+
+                mol_obj = objs.get(mol_name)
+                if incremental and mol_obj and mol_obj.data:
+                    # Update the existing object in place: only coordinates
+                    # and normals are written unless the count changes.
+                    mol_viz_set_positions(mol_obj, mol_pos, mol_orient)
+                    if mol_shape_obj.parent != mol_obj:
+                        mol_shape_obj.parent = mol_obj
+                    continue
+
+                # Look-up mesh to hold instances of molecule positions, create if needed
                 mol_pos_mesh = meshes.get(mol_pos_mesh_name)
                 if not mol_pos_mesh:
                     mol_pos_mesh = meshes.new(mol_pos_mesh_name)
@@ -2977,7 +3784,6 @@ def mol_viz_file_read(mcell_prop, filepath):
                 mol_pos_mesh.vertices.foreach_set("normal", mol_orient)
 
                 # Save the molecule's visibility state, so it can be restored later
-                mol_obj = objs.get(mol_name)
                 if mol_obj:
                     hide = mol_obj.hide
                     scn_objs.unlink(mol_obj)
@@ -2997,6 +3803,14 @@ def mol_viz_file_read(mcell_prop, filepath):
                 # Restore the visibility state
                 mol_obj.hide = hide
 
+        if incremental:
+            # Empty the objects of molecules which are not in this frame
+            for mol_name in prev_mol_names:
+                if mol_name not in mol_dict:
+                    mol_obj = bpy.data.objects.get(mol_name)
+                    if mol_obj and mol_obj.data:
+                        mol_viz_set_positions(mol_obj, [], [])
+
 #        utime = resource.getrusage(resource.RUSAGE_SELF)[0]-begin
 #        print ("     Processed %d molecules in %g seconds\n" % (
 #            len(mol_data), utime))
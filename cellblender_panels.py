@@ -84,23 +84,35 @@ class MCELL_UL_error_list(bpy.types.UIList):
         layout.label(item.name, icon='ERROR')
 
 
+class MCELL_UL_sweep_parameters(bpy.types.UIList):
+    def draw_item(self, context, layout, data, item, icon, active_data,
+                  active_propname, index):
+        ps = context.scene.mcell.parameter_system
+        if data.sweep_design == 'GRID':
+            text = "%s: %g to %g (%d values)" % (
+                item.par_name, item.start, item.stop, item.n_values)
+        else:
+            text = "%s: %g to %g" % (item.par_name, item.start, item.stop)
+        if ps.par_name_already_in_use(item.par_name):
+            layout.label(text, icon='FILE_TICK')
+        else:
+            layout.label(text, icon='ERROR')
+
+
 class MCELL_UL_run_simulation(bpy.types.UIList):
     def draw_item(self, context, layout, data, item, icon, active_data,
                   active_propname, index):
 
-        if len(cellblender.simulation_popen_list) > index:
-            sp = cellblender.simulation_popen_list[index]
-            # Simulations are still running
-            if sp.poll() is None:
-                layout.label(item.name, icon='POSE_DATA')
-            # Simulations have failed or were killed
-            elif sp.returncode != 0:
-                layout.label(item.name, icon='ERROR')
-            # Simulations have finished
-            else:
-                layout.label(item.name, icon='FILE_TICK')
+        status = cellblender.simulation_popen_status.status(item.task_id)
+        # Simulations are still running
+        if status == 'running':
+            layout.label(item.name, icon='POSE_DATA')
+        # Simulations have finished
+        elif status == 'completed':
+            layout.label(item.name, icon='FILE_TICK')
+        # Simulations have failed or were killed (or are unknown, e.g. after
+        # loading a blend file)
         else:
-            # Indexing error may be caused by stale data in the simulation_popen_list?? Maybe??
             layout.label(item.name, icon='ERROR')
 
 
@@ -119,28 +131,30 @@ class MCELL_UL_run_simulation_queue(bpy.types.UIList):
     def draw_item(self, context, layout, data, item, icon, active_data,
                   active_propname, index):
 
-        if len(cellblender.simulation_queue.task_dict) > index:
-            pid = int(item.name.split(',')[0].split(':')[1])
-            q_item = cellblender.simulation_queue.task_dict[pid]
-            proc = q_item['process']
-            if q_item['status'] == 'queued':
-                # Simulation is queued, waiting to run
-                layout.label(item.name, icon='TIME')
-            elif q_item['status'] == 'running':
-                # Simulation is still running
-                layout.label(item.name, icon='POSE_DATA')
-            elif q_item['status'] == 'mcell_error':
-                # Simulation failed due to error detected by MCell
-                layout.label(item.name, icon='ERROR')
-            elif q_item['status'] == 'died':
-                # Simulation was killed or failed due to some other error
-                layout.label(item.name, icon='CANCEL')
-            else:
-                # Simulation has finished normally
-                layout.label(item.name, icon='FILE_TICK')
-        else:
-            # Indexing error may be caused by stale data in the simulation_popen_list?? Maybe??
+        simulation_queue = cellblender.simulation_queue
+        entry = simulation_queue.status_table.get(item.task_id)
+        if entry is None:
+            # The run list is stale (e.g. the task was cleared)
             layout.label(item.name, icon='ERROR')
+        elif entry['status'] == 'queued':
+            # Simulation is queued, waiting to run
+            layout.label(item.name, icon='TIME')
+        elif entry['status'] == 'running':
+            # Simulation is still running
+            row = layout.row()
+            row.label(item.name, icon='POSE_DATA')
+            task = simulation_queue.task_dict.get(item.task_id)
+            if task:
+                row.label(task['progress'].summary())
+        elif entry['status'] == 'mcell_error':
+            # Simulation failed due to error detected by MCell
+            layout.label(item.name, icon='ERROR')
+        elif entry['status'] == 'died':
+            # Simulation was killed or failed due to some other error
+            layout.label(item.name, icon='CANCEL')
+        else:
+            # Simulation has finished normally
+            layout.label(item.name, icon='FILE_TICK')
 
 
 class MCELL_PT_run_simulation_queue(bpy.types.Panel):
@@ -900,6 +900,14 @@ class CellBlenderPreferencesPropertyGroup(bpy.types.PropertyGroup):
         description="Allow the project to be exported without also running"
                     " the simulation.",
         update=cellblender_operators.save_preferences)
+    sim_workers = StringProperty(
+        name="Simulation Workers", default="",
+        description="Run queued simulations on these worker daemons "
+                    "(sim_worker.py) instead of this machine: host[:port] ...")
+    sim_worker_token = StringProperty(
+        name="Worker Token", default="", subtype='PASSWORD',
+        description="Secret shared with the simulation workers (if empty, "
+                    "the CELLBLENDER_WORKER_TOKEN environment variable)")
     debug_level = IntProperty(
         name="Debug", default=0, min=0, max=100,
         description="Amount of debug information to print: 0 to 100")
@@ -1003,6 +1011,11 @@ class CellBlenderPreferencesPropertyGroup(bpy.types.PropertyGroup):
             row.prop(mcell.cellblender_preferences, "decouple_export_run")
             row = layout.row()
             row.prop(mcell.cellblender_preferences, "invalid_policy")
+            row = layout.row()
+            row.prop(mcell.cellblender_preferences, "sim_workers")
+            if mcell.cellblender_preferences.sim_workers.strip():
+                row = layout.row()
+                row.prop(mcell.cellblender_preferences, "sim_worker_token")
 
             layout.separator()
 
@@ -1153,7 +1166,8 @@ class MCellExportProjectPropertyGroup(bpy.types.PropertyGroup):
 
 class MCellRunSimulationProcessesProperty(bpy.types.PropertyGroup):
     name = StringProperty(name="Simulation Runner Process")
-    #pid = IntProperty(name="PID")
+    # Key of the run in the status table of its runner
+    task_id = IntProperty(name="Task ID", default=0)
 
     def remove_properties ( self, context ):
         print ( "Removing all Run Simulation Process Properties for " + self.name + "... no collections to remove." )
@@ -1188,6 +1202,24 @@ class MCellRunSimulationProcessesProperty(bpy.types.PropertyGroup):
         self.name = dm["name"]
 
 
+class MCellSweepParameterProperty(bpy.types.PropertyGroup):
+    par_name = StringProperty(
+        name="Parameter", default="",
+        description="Name of the general parameter to sweep")
+    start = FloatProperty(
+        name="Start", default=0.0,
+        description="First value (lower bound for Latin hypercube designs)")
+    stop = FloatProperty(
+        name="Stop", default=1.0,
+        description="Last value (upper bound for Latin hypercube designs)")
+    n_values = IntProperty(
+        name="Values", default=3, min=1,
+        description="Number of evenly spaced values in a grid design")
+
+    def remove_properties ( self, context ):
+        pass
+
+
 def sim_runner_changed_callback ( self, context ):
     """ The run lists are somewhat incompatible between sim runners, so just clear them when switching. """
     # print ( "Sim Runner has been changed!!" )
@@ -1247,6 +1279,52 @@ class MCellRunSimulationPropertyGroup(bpy.types.PropertyGroup):
 
 
     show_output_options = BoolProperty ( name='Output Options', default=False )
+    pin_cores = BoolProperty(
+        name="Pin to Cores", default=False,
+        description="Give every MCell process its own set of CPU cores")
+    cores_per_task = IntProperty(
+        name="Cores per Run", default=1, min=1,
+        description="Number of CPU cores each pinned MCell process may use")
+    task_mem_limit = IntProperty(
+        name="Memory Limit (MB)", default=0, min=0,
+        description="Address space limit of each MCell process (0 for no limit)")
+    task_nice = IntProperty(
+        name="Niceness", default=0, min=0, max=19,
+        description="Scheduling niceness of the MCell processes")
+    admit_by_memory = BoolProperty(
+        name="Start Runs by Free Memory", default=False,
+        description="Hold runs back while the free memory would not be enough "
+                    "for one more run (keeps shared machines out of swap)")
+    mem_reserve = IntProperty(
+        name="Reserve (MB)", default=1024, min=0,
+        description="Memory to leave free for other programs")
+    task_mem_estimate = IntProperty(
+        name="Per Run (MB)", default=0, min=0,
+        description="Expected memory use of a run (0 to use the largest "
+                    "peak of the runs so far)")
+    use_run_cache = BoolProperty(
+        name="Reuse Identical Runs", default=True,
+        description="Restore the results of an earlier run instead of running "
+                    "a seed again when the MDL files, MCell binary and seed "
+                    "are unchanged")
+
+    sweep_list = CollectionProperty(
+        type=MCellSweepParameterProperty, name="Swept Parameters")
+    active_sweep_index = IntProperty(
+        name="Active Swept Parameter Index", default=0)
+    sweep_design_enum = [
+        ('GRID', "Grid", "Every combination of the values of every parameter"),
+        ('LHS', "Latin Hypercube", "Points spread over the parameter ranges")]
+    sweep_design = EnumProperty(
+        items=sweep_design_enum, name="Design", default='GRID',
+        description="How the sweep points are chosen")
+    sweep_points = IntProperty(
+        name="Points", default=10, min=1,
+        description="Number of points of a Latin hypercube design")
+    sweep_seed = IntProperty(
+        name="Design Seed", default=1, min=1,
+        description="Random seed of a Latin hypercube design")
+    show_sweep_options = BoolProperty ( name='Parameter Sweep', default=False )
 
 
     simulation_run_control_enum = [
@@ -1270,6 +1348,10 @@ class MCellRunSimulationPropertyGroup(bpy.types.PropertyGroup):
             item.remove_properties(context)
         self.error_list.clear()
         self.active_err_index = 0
+        for item in self.sweep_list:
+            item.remove_properties(context)
+        self.sweep_list.clear()
+        self.active_sweep_index = 0
         print ( "Done removing all Run Simulation Properties." )
 
     def build_data_model_from_properties ( self, context ):
@@ -1381,10 +1463,19 @@ class MCellRunSimulationPropertyGroup(bpy.types.PropertyGroup):
                                           self, "active_process_index",
                                           rows=2)
                         row = layout.row()
+                        row.label(text="Sweep: " +
+                                  cellblender.simulation_queue.progress_summary())
+                        row = layout.row()
                         row.operator("mcell.clear_simulation_queue")
                         row = layout.row()
                         row.operator("mcell.kill_simulation")
                         row.operator("mcell.kill_all_simulations")
+                        if cellblender.simulation_queue.resumable:
+                            row = layout.row()
+                            row.operator("mcell.resume_simulation_queue",
+                                         text="Resume %d Unfinished Runs" % len(
+                                             cellblender.simulation_queue.resumable),
+                                         icon='RECOVER_LAST')
 
 
                 box = layout.box()
@@ -1410,6 +1501,22 @@ class MCellRunSimulationPropertyGroup(bpy.types.PropertyGroup):
                     row = box.row()
                     row.prop(self, "remove_append", expand=True)
                     row = box.row()
+                    row.prop(self, "use_run_cache")
+                    row.operator("mcell.clear_run_cache")
+
+                    row = box.row(align=True)
+                    row.prop(self, "pin_cores")
+                    if self.pin_cores:
+                        row.prop(self, "cores_per_task")
+                    row = box.row(align=True)
+                    row.prop(self, "task_mem_limit")
+                    row.prop(self, "task_nice")
+                    row = box.row(align=True)
+                    row.prop(self, "admit_by_memory")
+                    if self.admit_by_memory:
+                        row.prop(self, "mem_reserve")
+                        row.prop(self, "task_mem_estimate")
+                    row = box.row()
                     col = row.column()
                     col.prop(mcell.cellblender_preferences, "decouple_export_run")
 
@@ -1427,6 +1534,46 @@ class MCellRunSimulationPropertyGroup(bpy.types.PropertyGroup):
                     row.prop(self, "show_output_options", icon='TRIA_RIGHT',
                              text="Output / Control Options", emboss=False)
 
+                box = layout.box()
+
+                if self.show_sweep_options:
+                    row = box.row(align=True)
+                    row.alignment = 'LEFT'
+                    row.prop(self, "show_sweep_options", icon='TRIA_DOWN',
+                             text="Parameter Sweep", emboss=False)
+
+                    row = box.row()
+                    col = row.column()
+                    col.template_list("MCELL_UL_sweep_parameters", "sweep_parameters",
+                                      self, "sweep_list",
+                                      self, "active_sweep_index", rows=2)
+                    col = row.column(align=True)
+                    col.operator("mcell.sweep_parameter_add", icon='ZOOMIN', text="")
+                    col.operator("mcell.sweep_parameter_remove", icon='ZOOMOUT', text="")
+                    if self.sweep_list:
+                        sweep_par = self.sweep_list[self.active_sweep_index]
+                        row = box.row()
+                        row.prop(sweep_par, "par_name")
+                        row = box.row(align=True)
+                        row.prop(sweep_par, "start")
+                        row.prop(sweep_par, "stop")
+                        if self.sweep_design == 'GRID':
+                            row.prop(sweep_par, "n_values")
+                    row = box.row()
+                    row.prop(self, "sweep_design", expand=True)
+                    if self.sweep_design == 'LHS':
+                        row = box.row(align=True)
+                        row.prop(self, "sweep_points")
+                        row.prop(self, "sweep_seed")
+                    row = box.row()
+                    row.operator("mcell.run_parameter_sweep", icon='COLOR_RED')
+
+                else:
+                    row = box.row(align=True)
+                    row.alignment = 'LEFT'
+                    row.prop(self, "show_sweep_options", icon='TRIA_RIGHT',
+                             text="Parameter Sweep", emboss=False)
+
                 
             if self.status:
                 row = layout.row()
@@ -1491,6 +1638,88 @@ class MCellMolVizPropertyGroup(bpy.types.PropertyGroup):
         name="Manually Select Viz Directory", default=False,
         description="Toggle the option to manually load viz data.",
         update=cellblender_operators.mol_viz_toggle_manual_select)
+    follow_enable = BoolProperty(
+        name="Follow Running Simulation", default=False,
+        description="Load new viz frames as MCell writes them",
+        update=cellblender_operators.mol_viz_follow_update)
+    follow_jump = BoolProperty(
+        name="Jump to Newest Frame", default=True,
+        description="Show each new frame as soon as it is loaded")
+    follow_interval = FloatProperty(
+        name="Poll Interval (s)", default=1.0, min=0.1,
+        description="Time between checks for new viz frames")
+    incremental_update = BoolProperty(
+        name="Reuse Molecule Objects", default=True,
+        description="Update molecule positions in place on frame changes "
+                    "instead of recreating the molecule objects")
+    prefetch_enable = BoolProperty(
+        name="Prefetch Frames", default=True,
+        description="Decode upcoming frames in the background during playback",
+        update=cellblender_operators.mol_viz_prefetch_update)
+    prefetch_frames = IntProperty(
+        name="Frames Ahead", default=4, min=0, max=64,
+        description="Number of frames to decode ahead of the current frame",
+        update=cellblender_operators.mol_viz_prefetch_update)
+    prefetch_memory = IntProperty(
+        name="Cache Size (MB)", default=512, min=16,
+        description="Memory budget for decoded frames held in the cache",
+        update=cellblender_operators.mol_viz_prefetch_update)
+    prefetch_threads = IntProperty(
+        name="Prefetch Threads", default=2, min=1, max=cpu_count(),
+        description="Number of threads decoding frames in the background",
+        update=cellblender_operators.mol_viz_prefetch_update)
+    lod_enable = BoolProperty(
+        name="Limit Displayed Molecules", default=False,
+        description="Show an evenly spread subset of species with many "
+                    "molecules",
+        update=cellblender_operators.mol_viz_update)
+    lod_max_mols = IntProperty(
+        name="Max per Species", default=100000, min=1,
+        description="Largest number of molecules displayed for one species",
+        update=cellblender_operators.mol_viz_update)
+    lod_full_render = BoolProperty(
+        name="Full Resolution Renders", default=True,
+        description="Show all molecules while rendering")
+    roi_enable = BoolProperty(
+        name="Region of Interest", default=False,
+        description="Only show molecules inside a box or an object's bounds",
+        update=cellblender_operators.mol_viz_update)
+    roi_mode = EnumProperty(
+        items=[('BOX', "Box", "Show molecules inside the given corners"),
+               ('OBJECT', "Object", "Show molecules inside an object's "
+                                    "bounding box")],
+        name="Region Type", default='BOX',
+        update=cellblender_operators.mol_viz_update)
+    roi_min = FloatVectorProperty(
+        name="Min", size=3, default=(-1.0, -1.0, -1.0),
+        description="Lower corner of the region of interest",
+        update=cellblender_operators.mol_viz_update)
+    roi_max = FloatVectorProperty(
+        name="Max", size=3, default=(1.0, 1.0, 1.0),
+        description="Upper corner of the region of interest",
+        update=cellblender_operators.mol_viz_update)
+    roi_object = StringProperty(
+        name="Object",
+        description="Object whose bounding box is the region of interest",
+        update=cellblender_operators.mol_viz_update)
+    archive_quantize = BoolProperty(
+        name="16 Bit Coordinates", default=False,
+        description="Store coordinates as 16 bit integers scaled to each "
+                    "frame (smaller, with a small loss of precision)")
+    archive_remove = BoolProperty(
+        name="Remove Frame Files", default=False,
+        description="Delete the frame files once they are packed")
+    ensemble_mode = EnumProperty(
+        items=[('OVERLAY', "Overlay Seeds", "Show every seed with its own tint"),
+               ('DENSITY', "Density Grid", "Show the mean occupancy per voxel as cubes sized and colored by density")],
+        name="Ensemble Mode", default='OVERLAY',
+        description="How the current frame of all seeds is displayed")
+    ensemble_workers = IntProperty(
+        name="Workers", default=4, min=1, max=max(1, 2*cpu_count()),
+        description="Number of seed frames decoded at the same time")
+    ensemble_resolution = IntProperty(
+        name="Voxels", default=32, min=2, max=512,
+        description="Number of density voxels along the longest axis")
 
 
     def build_data_model_from_properties ( self, context ):
@@ -1683,6 +1912,13 @@ class MCellMolVizPropertyGroup(bpy.types.PropertyGroup):
             row = layout.row()
             row.label(text="Current Molecule File: "+self.mol_file_name,
                       icon='FILE')
+            seed_index = cellblender_operators.global_viz_seed_index
+            if seed_index and (self.mol_file_index < len(seed_index['frames'])):
+                frame = seed_index['frames'][self.mol_file_index]
+                n_mols = sum([info[1] for info in frame['species'].values()])
+                row = layout.row()
+                row.label(text="Iteration: %d   Molecules: %d" % (
+                          frame['iteration'], n_mols))
 # Disabled to explore UI slowdown behavior of Plot Panel and run options subpanel when mol_file_list is large
 #            row = layout.row()
 #            row.template_list("UI_UL_list", "viz_results", mcell.mol_viz,
@@ -1690,6 +1926,59 @@ class MCellMolVizPropertyGroup(bpy.types.PropertyGroup):
 #                              rows=2)
             row = layout.row()
             layout.prop(mcell.mol_viz, "mol_viz_enable")
+            row = layout.row()
+            row.prop(mcell.mol_viz, "follow_enable")
+            if self.follow_enable:
+                row = layout.row(align=True)
+                row.prop(mcell.mol_viz, "follow_jump")
+                row.prop(mcell.mol_viz, "follow_interval")
+            row = layout.row()
+            row.prop(mcell.mol_viz, "incremental_update")
+            row = layout.row()
+            row.prop(mcell.mol_viz, "prefetch_enable")
+            if self.prefetch_enable:
+                row = layout.row(align=True)
+                row.prop(mcell.mol_viz, "prefetch_frames")
+                row.prop(mcell.mol_viz, "prefetch_threads")
+                row = layout.row()
+                row.prop(mcell.mol_viz, "prefetch_memory")
+            row = layout.row()
+            row.prop(mcell.mol_viz, "lod_enable")
+            if self.lod_enable:
+                row = layout.row(align=True)
+                row.prop(mcell.mol_viz, "lod_max_mols")
+                row.prop(mcell.mol_viz, "lod_full_render")
+            row = layout.row()
+            row.prop(mcell.mol_viz, "roi_enable")
+            if self.roi_enable:
+                row.prop(mcell.mol_viz, "roi_mode", expand=True)
+                if self.roi_mode == 'BOX':
+                    row = layout.row()
+                    row.prop(mcell.mol_viz, "roi_min")
+                    row = layout.row()
+                    row.prop(mcell.mol_viz, "roi_max")
+                else:
+                    row = layout.row()
+                    row.prop_search(mcell.mol_viz, "roi_object",
+                                    context.scene, "objects",
+                                    icon='MESH_ICOSPHERE')
+            box = layout.box()
+            row = box.row(align=True)
+            row.prop(mcell.mol_viz, "archive_quantize")
+            row.prop(mcell.mol_viz, "archive_remove")
+            row = box.row()
+            row.operator("mcell.pack_viz_data", icon='PACKAGE')
+            if not self.manual_select_viz_dir:
+                box = layout.box()
+                row = box.row()
+                row.prop(mcell.mol_viz, "ensemble_mode")
+                row = box.row(align=True)
+                row.prop(mcell.mol_viz, "ensemble_workers")
+                if self.ensemble_mode == 'DENSITY':
+                    row.prop(mcell.mol_viz, "ensemble_resolution")
+                row = box.row(align=True)
+                row.operator("mcell.mol_viz_ensemble", icon='GROUP')
+                row.operator("mcell.mol_viz_ensemble_clear", icon='X')
 
 
     def draw_panel ( self, context, panel ):
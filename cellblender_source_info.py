@@ -19,8 +19,13 @@ cellblender_info = {
         "cellblender_molecules.py",
         "object_surface_regions.py",
         "run_simulations.py",
+        "resource_policy.py",
         "sim_runner_queue.py",
+        "run_cache.py",
         "run_wrapper.py",
+        "sim_worker.py",
+        "viz_io.py",
+        "sweep.py",
 
         "icons"+os.sep+"cellblender_icon.png",
         "icons"+os.sep+"mol_sel.png",
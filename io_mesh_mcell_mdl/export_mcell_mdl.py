@@ -29,12 +29,16 @@ CellBlender.
 """
 
 # python imports
+import array
+import hashlib
+import io
 import os
 import re
 import shutil
 
 # blender imports
 import bpy
+from bpy.app.handlers import persistent
 
 # from cellblender import cellblender_operators  # Shouldn't need this anymore!!
 
@@ -67,9 +71,80 @@ def save(context, filepath=""):
 
     """
     print("export_mcell_mdl.py/save()")
-    with open(filepath, "w", encoding="utf8", newline="\n") as out_file:
-        filedir = os.path.dirname(filepath)
-        save_wrapper(context, out_file, filedir)
+    out_file = io.StringIO()
+    filedir = os.path.dirname(filepath)
+    save_wrapper(context, out_file, filedir)
+    # The project directory is removed when the model has errors
+    if os.path.isdir(filedir):
+        write_mdl_if_changed(filepath, out_file.getvalue())
+
+
+# Fingerprints (sha256, size, mtime) of the MDL files written in this session
+mdl_fingerprints = {}
+
+# Geometry MDL text by object name, with the fingerprint of its mesh data
+geometry_text_cache = {}
+
+
+@persistent
+def clear_export_caches(context):
+    """ Forget the files and geometry of the previous .blend file on load """
+    mdl_fingerprints.clear()
+    geometry_text_cache.clear()
+
+
+def write_mdl_if_changed(filepath, text):
+    """ Write an MDL file unless it already holds text.
+
+    Unchanged files keep their time stamps, and changed ones are replaced
+    atomically (a run never sees a partially written file). Returns True if
+    the file was written.
+    """
+
+    data = text.encode("utf8")
+    fingerprint = hashlib.sha256(data).hexdigest()
+    try:
+        st = os.stat(filepath)
+        known = mdl_fingerprints.get(filepath)
+        if known == (fingerprint, st.st_size, st.st_mtime):
+            return False
+        if (known is None) and (st.st_size == len(data)):
+            # Written in an earlier session, so compare the contents
+            with open(filepath, "rb") as mdl_file:
+                if mdl_file.read() == data:
+                    mdl_fingerprints[filepath] = (fingerprint, st.st_size, st.st_mtime)
+                    return False
+    except OSError:
+        pass
+
+    temp_filepath = filepath + ".tmp"
+    with open(temp_filepath, "wb") as mdl_file:
+        mdl_file.write(data)
+    os.replace(temp_filepath, filepath)
+    st = os.stat(filepath)
+    mdl_fingerprints[filepath] = (fingerprint, st.st_size, st.st_mtime)
+    return True
+
+
+def geometry_fingerprint(data_object, regions):
+    """ Fingerprint of everything save_geometry writes for a mesh object """
+
+    mesh = data_object.data
+    fingerprint = hashlib.sha256()
+    fingerprint.update(data_object.name.encode("utf8"))
+    for row in data_object.matrix_world:
+        fingerprint.update(array.array('d', row).tobytes())
+    co = array.array('f', [0.0]) * (3 * len(mesh.vertices))
+    mesh.vertices.foreach_get("co", co)
+    fingerprint.update(co.tobytes())
+    loop_start = array.array('i', [0]) * len(mesh.polygons)
+    mesh.polygons.foreach_get("loop_start", loop_start)
+    fingerprint.update(loop_start.tobytes())
+    vertex_index = array.array('i', [0]) * len(mesh.loops)
+    mesh.loops.foreach_get("vertex_index", vertex_index)
+    fingerprint.update(vertex_index.tobytes())
+    fingerprint.update(repr(sorted(regions.items())).encode("utf8"))
+    return fingerprint.hexdigest()
 
 
 def dontrun_filter_ignore(unfiltered_item_list):
@@ -119,16 +194,18 @@ def save_modular_or_allinone(filedir, main_mdl_file, mdl_filename,
     mcell = bpy.context.scene.mcell
     settings = mcell.project_settings
 
-    # Save modular (e.g. Scene.molecules.mdl, Scene.reactions.mdl)
+    # Save modular (e.g. Scene.molecules.mdl, Scene.reactions.mdl). Files
+    # whose content didn't change are not written again.
     if mcell.export_project.export_format == 'mcell_mdl_modular':
         main_mdl_file.write("INCLUDE_FILE = \"%s.%s.mdl\"\n\n" %
                        (settings.base_name, mdl_filename))
         filepath = ("%s/%s.%s.mdl" %
                     (filedir, settings.base_name, mdl_filename))
-        with open(filepath, "w", encoding="utf8", newline="\n") as mdl_file:
-            # Maybe find a cleaner way to handle args list. Looks kind of ugly.
-            args.insert(1, mdl_file)
-            save_function(*args)
+        mdl_file = io.StringIO()
+        # Maybe find a cleaner way to handle args list. Looks kind of ugly.
+        args.insert(1, mdl_file)
+        save_function(*args)
+        write_mdl_if_changed(filepath, mdl_file.getvalue())
     # Or save everything in main mdl (e.g. Scene.main.mdl)
     else:
         args.insert(1, main_mdl_file)
@@ -764,13 +841,31 @@ def write_parameter_as_mdl ( p, out_file, as_expr ):
 
 
 
-def save_general_parameters(ps, out_file):
-    """ Saves parameter info to mdl output file. """
+def save_general_parameters(ps, out_file, overrides=None):
+    """ Saves parameter info to mdl output file.
+
+    overrides optionally maps parameter names to values which replace
+    their expressions (as used by parameter sweeps). The other parameters
+    are then written as expressions so that they follow the new values.
+
+    """
 
     # Export Parameters:
     if ps and ps.general_parameter_list:
-                
-        if not ps.export_as_expressions:
+
+        if overrides is not None:
+
+            ordered_names = ps.build_dependency_ordered_name_list()
+            out_file.write("/* DEFINE PARAMETERS */\n")
+            for pn in ordered_names:
+                p = ps.general_parameter_list[pn]
+                if p.par_name in overrides:
+                    out_file.write("%s = %.15g    /* swept */\n" % (p.par_name, overrides[p.par_name]))
+                else:
+                    write_parameter_as_mdl ( p, out_file, True )
+            out_file.write("\n")
+
+        elif not ps.export_as_expressions:
 
             # Output as values ... order doesn't matter
             out_file.write("/* DEFINE PARAMETERS */\n")
@@ -781,7 +876,6 @@ def save_general_parameters(ps, out_file):
         else:
 
             ordered_names = ps.build_dependency_ordered_name_list()
-            print ( "Ordered names = " + str(ordered_names) )
             # Output as expressions where order matters
             out_file.write("/* DEFINE PARAMETERS */\n")
             for pn in ordered_names:
@@ -923,9 +1017,8 @@ def save_reactions(context, out_file, rxn_list, filedir):
                 variable_rate_text = bpy.data.texts[variable_rate_name]
                 variable_out_filename = os.path.join(
                     filedir, variable_rate_name)
-                with open(variable_out_filename, "w", encoding="utf8",
-                          newline="\n") as variable_out_file:
-                    variable_out_file.write(variable_rate_text.as_string())
+                write_mdl_if_changed(variable_out_filename,
+                                     variable_rate_text.as_string())
             # Use a single-value rate constant
             else:
                 out_file.write("[%s]" % (rxn_item.fwd_rate.get_as_string_or_value(
@@ -949,6 +1042,12 @@ def save_reactions(context, out_file, rxn_list, filedir):
 def save_geometry(context, out_file, object_list):
     """ Saves geometry info to mdl output file. """
 
+    # Keep only the text of objects which are still exported
+    exported_names = set([object_item.name for object_item in object_list])
+    for name in list(geometry_text_cache.keys()):
+        if name not in exported_names:
+            del geometry_text_cache[name]
+
     # Export Model Geometry:
     for object_item in object_list:
 
@@ -965,6 +1064,18 @@ def save_geometry(context, out_file, object_list):
             context.scene.objects.active = data_object
             bpy.ops.object.mode_set(mode='OBJECT')
 
+            # Reuse the text of objects which didn't change since the last
+            # export, formatting large meshes takes a long time
+            regions = data_object.mcell.get_regions_dictionary(data_object)
+            fingerprint = geometry_fingerprint(data_object, regions)
+            cached = geometry_text_cache.get(data_object.name)
+            if cached and (cached[0] == fingerprint):
+                out_file.write(cached[1])
+                data_object.hide = saved_hide_status
+                continue
+            object_file = out_file
+            out_file = io.StringIO()
+
             out_file.write("%s POLYGON_LIST\n" % (data_object.name))
             out_file.write("{\n")
 
@@ -997,7 +1108,6 @@ def save_geometry(context, out_file, object_list):
 
             # write regions
             # regions = get_regions(data_object)
-            regions = data_object.mcell.get_regions_dictionary(data_object)
             if regions:
                 out_file.write("  DEFINE_SURFACE_REGIONS\n")
                 out_file.write("  {\n")
@@ -1016,6 +1126,10 @@ def save_geometry(context, out_file, object_list):
             # close SURFACE_REGIONS block
             out_file.write("}\n\n")
 
+            geometry_text_cache[data_object.name] = (fingerprint, out_file.getvalue())
+            out_file = object_file
+            out_file.write(geometry_text_cache[data_object.name][1])
+
             # restore proper object visibility state
             data_object.hide = saved_hide_status
 
@@ -4,13 +4,15 @@ This module supports parameters and evaluation of expressions.
 
 import bpy
 from bpy.props import *
+from bpy.app.handlers import persistent
 
 from math import *
 from random import uniform, gauss
-import parser
+import ast
+import collections
 import re
 import token
-import symbol
+import tokenize
 import sys
 
 import cellblender
@@ -160,6 +162,236 @@ def spaced_strings_from_list ( list_of_strings ):
     return space.join(list_of_strings)
 
 
+# Translations of the names and operators of MDL expressions to python
+expression_keywords = { '^': '**', 'SQRT': 'sqrt', 'EXP': 'exp', 'LOG': 'log', 'LOG10': 'log10', 'SIN': 'sin', 'COS': 'cos', 'TAN': 'tan', 'ASIN': 'asin', 'ACOS':'acos', 'ATAN': 'atan', 'ABS': 'abs', 'CEIL': 'ceil', 'FLOOR': 'floor', 'MAX': 'max', 'MIN': 'min', 'RAND_UNIFORM': 'uniform', 'RAND_GAUSSIAN': 'gauss', 'PI': 'pi', 'SEED': '1' }
+
+# Tokens which are not part of an expression list
+skipped_token_types = set ( [ token.NEWLINE, token.ENDMARKER, token.INDENT, token.DEDENT, tokenize.NL, tokenize.COMMENT ] )
+
+# Recently parsed expression lists keyed by ( parameter system address, name table version, expression )
+parsed_expressions = collections.OrderedDict()
+parsed_expressions_limit = 4096
+
+# Names that the python form of an expression may use besides parameter IDs
+# (the translations of the expression keywords)
+expression_globals = { '__builtins__': {} }
+for fname in [ 'sqrt', 'exp', 'log', 'log10', 'sin', 'cos', 'tan', 'asin', 'acos', 'atan', 'ceil', 'floor', 'pi' ]:
+    expression_globals[fname] = globals()[fname]
+expression_globals.update ( { 'abs': abs, 'max': max, 'min': min, 'uniform': uniform, 'gauss': gauss } )
+
+# Compiled python expressions keyed by parameter ID name as ( parsed_expr_py, code object )
+compiled_expressions = {}
+
+# Current values of the general parameters keyed by ID name ("g1", "g2", ...)
+parameter_values = {}
+
+
+class ParameterGraph:
+    """ Dependency graph of the parameters of one parameter system
+
+    Parameters are nodes identified by their ID names ("g1", "p3", ...) and
+    mapped to integer indexes. uses[i] lists the nodes node i depends on and
+    used_by[i] the nodes which depend on node i. The who_I_depend_on strings
+    of the parameters remain the saved form of the graph and it is rebuilt
+    from them after a file is loaded.
+    """
+
+    def __init__ ( self ):
+        self.index = {}
+        self.names = []
+        self.uses = []
+        self.used_by = []
+        self.free = []
+        self.version = 0            # Changed with every change of the graph
+        self.order_cache = None     # ( version, order, cycles, blocked ) from the last call of ordered
+
+    def node ( self, name ):
+        """ Return the index of a parameter, adding it as needed """
+        i = self.index.get ( name )
+        if i is None:
+            if len(self.free) > 0:
+                i = self.free.pop()
+                self.names[i] = name
+            else:
+                i = len(self.names)
+                self.names.append ( name )
+                self.uses.append ( [] )
+                self.used_by.append ( [] )
+            self.index[name] = i
+            self.version += 1
+        return i
+
+    def set_dependencies ( self, name, dep_names ):
+        """ Replace the list of parameters that a parameter depends on """
+        i = self.node ( name )
+        uses = sorted ( set ( [ self.node(d) for d in dep_names ] ) )
+        if uses == self.uses[i]:
+            return
+        for j in self.uses[i]:
+            self.used_by[j].remove ( i )
+        self.uses[i] = uses
+        for j in self.uses[i]:
+            self.used_by[j].append ( i )
+        self.version += 1
+
+    def remove ( self, name ):
+        i = self.index.pop ( name, None )
+        if i is None:
+            return
+        for j in self.uses[i]:
+            self.used_by[j].remove ( i )
+        self.uses[i] = []
+        for j in self.used_by[i]:
+            self.uses[j].remove ( i )
+        self.used_by[i] = []
+        self.names[i] = None
+        self.free.append ( i )
+        self.version += 1
+
+    def update_order ( self, names ):
+        """ Return ( order, cycles, blocked ) for an update of the named parameters
+
+        Every parameter that depends on the named ones (directly or not) is
+        marked dirty, and order lists the named and dirty parameters so that
+        each comes after everything it depends on. Parameters on a cycle are
+        returned as lists of names in cycles, and those which depend on a
+        cycle without being part of one are listed in blocked.
+        """
+        dirty = set()
+        stack = [ self.index[n] for n in names if n in self.index ]
+        while len(stack) > 0:
+            i = stack.pop()
+            if not (i in dirty):
+                dirty.add ( i )
+                stack.extend ( self.used_by[i] )
+        return self.sorted_order ( sorted ( dirty ) )
+
+    def ordered ( self, names ):
+        """ Return ( order, cycles, blocked ) as in update_order for the named parameters only
+
+        The named parameters must not depend on any others (as for the general
+        parameters). The result is kept until the graph changes.
+        """
+        indexes = [ self.node(n) for n in names ]
+        if (self.order_cache is None) or (self.order_cache[0] != self.version) or (self.order_cache[1] != len(indexes)):
+            self.order_cache = ( self.version, len(indexes) ) + self.sorted_order ( indexes )
+        order, cycles, blocked = self.order_cache[2:]
+        return ( list(order), [ list(c) for c in cycles ], list(blocked) )
+
+    def sorted_order ( self, nodes ):
+        """ Topological (Kahn) ordering of a list of node indexes, see update_order
+
+        Every node depending on one of the nodes must be in the list too. Nodes
+        which are free to go in any order keep the order of the list.
+        """
+        node_set = set ( nodes )
+        pending = {}
+        for i in nodes:
+            pending[i] = len ( [ j for j in self.uses[i] if j in node_set ] )
+        ready = collections.deque ( [ i for i in nodes if pending[i] == 0 ] )
+        order = []
+        while len(ready) > 0:
+            i = ready.popleft()
+            order.append ( self.names[i] )
+            for j in self.used_by[i]:
+                if j in pending:
+                    pending[j] -= 1
+                    if pending[j] == 0:
+                        ready.append ( j )
+        cycles = []
+        blocked = []
+        if len(order) < len(nodes):
+            cycles = self.cycles ( [ i for i in nodes if pending[i] > 0 ] )
+            on_cycle = set ( [ n for c in cycles for n in c ] )
+            blocked = sorted ( [ self.names[i] for i in nodes if (pending[i] > 0) and not (self.names[i] in on_cycle) ] )
+        return ( order, cycles, blocked )
+
+    def cycles ( self, nodes ):
+        """ Return the cycles among the given node indexes as sorted lists of names
+
+        These are the strongly connected components (Tarjan) with more than
+        one node, or with a node which depends on itself.
+        """
+        nodes = set ( nodes )
+        order = {}
+        low = {}
+        stack = []
+        on_stack = set()
+        found = []
+        for root in sorted ( nodes ):
+            if root in order:
+                continue
+            order[root] = low[root] = len(order)
+            stack.append ( root )
+            on_stack.add ( root )
+            work = [ [root, 0] ]
+            while len(work) > 0:
+                frame = work[-1]
+                i = frame[0]
+                if frame[1] < len(self.used_by[i]):
+                    j = self.used_by[i][frame[1]]
+                    frame[1] += 1
+                    if not (j in nodes):
+                        continue
+                    if not (j in order):
+                        order[j] = low[j] = len(order)
+                        stack.append ( j )
+                        on_stack.add ( j )
+                        work.append ( [j, 0] )
+                    elif j in on_stack:
+                        low[i] = min ( low[i], order[j] )
+                else:
+                    work.pop()
+                    if len(work) > 0:
+                        parent = work[-1][0]
+                        low[parent] = min ( low[parent], low[i] )
+                    if low[i] == order[i]:
+                        component = []
+                        while True:
+                            j = stack.pop()
+                            on_stack.discard ( j )
+                            component.append ( j )
+                            if j == i:
+                                break
+                        if (len(component) > 1) or (i in self.uses[i]):
+                            found.append ( sorted ( [ self.names[j] for j in component ] ) )
+        return found
+
+
+# Changed with every change of a name to ID map (part of the parsed_expressions keys).
+# This is not kept in the scene data since undo would take it back to numbers already used.
+name_table_version = 0
+
+#@profile('name_table_changed')
+def name_table_changed ():
+    global name_table_version
+    name_table_version += 1
+
+# Dependency graphs keyed by the address of their parameter system
+parameter_graphs = {}
+
+@persistent
+def clear_parameter_caches ( context ):
+    """ Graphs and parsed expressions are rebuilt from the parameters after a file is loaded
+    and after undo or redo (which restore the parameters without their update callbacks) """
+    parameter_graphs.clear()
+    parsed_expressions.clear()
+
+#@profile('forget_compiled_expression')
+def forget_compiled_expression ( name ):
+    """ Drop the compiled form of a parameter's expression (after its parsed expression changed) """
+    compiled_expressions.pop ( name, None )
+
+#@profile('compiled_expression')
+def compiled_expression ( name, expr_py ):
+    """ Return the code object for a python expression, compiling it only when it changed """
+    entry = compiled_expressions.get ( name )
+    if (entry is None) or (entry[0] != expr_py):
+        entry = ( expr_py, compile ( expr_py, name, 'eval' ) )
+        compiled_expressions[name] = entry
+    return entry[1]
+
+
 class MCELL_UL_draw_parameter(bpy.types.UIList):
     #@profile('MCELL_UL_draw_parameter.draw_item')
     def draw_item(self, context, layout, data, item, icon, active_data, active_propname, index):
@@ -464,7 +696,7 @@ class Expression_Handler:
     
     #@profile('Expression_Handler.get_expression_keywords')
     def get_expression_keywords(self):
-        return ( { '^': '**', 'SQRT': 'sqrt', 'EXP': 'exp', 'LOG': 'log', 'LOG10': 'log10', 'SIN': 'sin', 'COS': 'cos', 'TAN': 'tan', 'ASIN': 'asin', 'ACOS':'acos', 'ATAN': 'atan', 'ABS': 'abs', 'CEIL': 'ceil', 'FLOOR': 'floor', 'MAX': 'max', 'MIN': 'min', 'RAND_UNIFORM': 'uniform', 'RAND_GAUSSIAN': 'gauss', 'PI': 'pi', 'SEED': '1' } )
+        return ( expression_keywords )
 
     #@profile('Expression_Handler.get_mdl_keywords')
     def get_mdl_keywords(self):
@@ -884,15 +1116,13 @@ class Expression_Handler:
 
             Examples:
 
-              Expression: "A * (B + C)" becomes something like: [ 3, "*", "(", 22, "+", 5, ")", "" ]
+              Expression: "A * (B + C)" becomes something like: [ 3, "*", "(", 22, "+", 5, ")" ]
                  where 3, 22, and 5 are the ID numbers for parameters A, B, and C respectively
 
-              Expression: "A * (B + C)" when B is undefined becomes: [ 3, "*", "(", None, "B", "+", 5, ")", "" ]
+              Expression: "A * (B + C)" when B is undefined becomes: [ 3, "*", "(", None, "B", "+", 5, ")" ]
 
-              Note that the parsing may produce empty strings in the list which should not cause any problem.
+            Results are cached by expression and version of the name to ID map.
         """
-        general_parameter_list = parameter_system.general_parameter_list
-
         lcl_name_ID_dict = parameter_system['gname_to_id_dict']
 
         param_expr = param_expr.strip()
@@ -900,102 +1130,38 @@ class Expression_Handler:
         if len(param_expr) == 0:
             return []
 
-        st = None
-        pt = None
-        try:
-            st = parser.expr(param_expr)
-            pt = st.totuple()
-        except:
-            print ( "==> Parsing Exception: " + str ( sys.exc_info() ) )
-
-        parameterized_expr = None  # param_expr
-        if pt != None:
-
-            start_timer("All_Expression_Handler.recurse_tree_symbols" )
-            parameterized_expr = self.recurse_tree_symbols ( lcl_name_ID_dict, pt, [] )
-            stop_timer("All_Expression_Handler.recurse_tree_symbols" )
-            
-            if parameterized_expr != None:
-            
-                # Remove trailing empty strings from parse tree - why are they there?
-                while len(parameterized_expr) > 0:
-                    if parameterized_expr[-1] != '':
-                        break
-                    parameterized_expr = parameterized_expr[0:-2]
-
-        compressed_expr = parameterized_expr
-        if False and (compressed_expr != None):
-            # To speed things up, collapse adjacent strings within the expression
-            #   So this:       [ 3, "*", "(", 22, "+", 5, ")" ]
-            #   Becomes this:  [ 3, "*(", 22, "+", 5, ")" ]
-
-            # Can't currently do this because the expression list is in MDL
-            # Each token has to remain separate so the translation can be done
-            
-            compressed_expr = []
-            next_str = None
-            for token in parameterized_expr:
-                if type(token) == int:
-                    if next_str != None:
-                        compressed_expr = compressed_expr + [next_str]
-                        next_str = None
-                    compressed_expr = compressed_expr + [token]
-                else:
-                    # This is a string so simply concatenate (no translation done here)
-                    if next_str == None:
-                        next_str = str(token)
-                    else:
-                        next_str = next_str + str(token)
-            if next_str != None:
-                # Append any remaining strings
-                compressed_expr = compressed_expr + [next_str]
-        return compressed_expr
-
-    #@profile('Expression_Handler.count_stub')
-    def count_stub ( self ):
-        pass
+        key = ( parameter_system.as_pointer(), name_table_version, param_expr )
+        if key in parsed_expressions:
+            parsed_expressions.move_to_end ( key )
+            return list ( parsed_expressions[key] )
 
-    #@profile('Expression_Handler.recurse_tree_symbols')
-    def recurse_tree_symbols ( self, local_name_ID_dict, pt, current_expr ):
-        """ Recurse through the parse tree looking for "terminal" items which are added to the list """
-        self.count_stub()
-
-        if type(pt) == tuple:
-            # This is a tuple, so find out if it's a terminal leaf in the parse tree
-
-            terminal = False
-            if len(pt) == 2:
-                if type(pt[1]) == str:
-                    terminal = True
-
-            if terminal:
-                # This is a 2-tuple with a type and value
-                if pt[0] == token.NAME:
-                    expression_keywords = self.get_expression_keywords()
-                    if pt[1] in expression_keywords:
+        parameterized_expr = []
+        try:
+            # Check the syntax, then translate the tokens in a single pass
+            ast.parse ( param_expr, mode='eval' )
+            for tok in tokenize.generate_tokens ( io.StringIO(param_expr).readline ):
+                if tok.type == token.NAME:
+                    if tok.string in expression_keywords:
                         # This is a recognized name and not a user-defined symbol, so append the string itself
-                        return current_expr + [ pt[1] ]
+                        parameterized_expr.append ( tok.string )
+                    elif tok.string in lcl_name_ID_dict:
+                        # Append the integer ID to the list after stripping off the leading "g"
+                        parameterized_expr.append ( int(lcl_name_ID_dict[tok.string][1:]) )
                     else:
-                        # This must be a user-defined symbol, so check if it's in the dictionary
-                        pt1_str = str(pt[1])
-                        #if pt[1] in local_name_ID_dict:
-                        if pt1_str in local_name_ID_dict:
-                            # Append the integer ID to the list after stripping off the leading "g"
-                            return current_expr + [ int(local_name_ID_dict[pt1_str][1:]) ]
-                        else:
-                            # Not in the dictionary, so append a None flag followed by the undefined name
-                            return current_expr + [ None, pt[1] ]
-                else:
+                        # Not in the dictionary, so append a None flag followed by the undefined name
+                        parameterized_expr.append ( None )
+                        parameterized_expr.append ( tok.string )
+                elif not (tok.type in skipped_token_types):
                     # This is a non-name part of the expression
-                    return current_expr + [ pt[1] ]
-            else:
-                # Break it down further
-                for i in range(len(pt)):
-                    next_segment = self.recurse_tree_symbols ( local_name_ID_dict, pt[i], current_expr )
-                    if next_segment != None:
-                        current_expr = next_segment
-                return current_expr
-        return None
+                    parameterized_expr.append ( tok.string )
+        except Exception:
+            print ( "==> Parsing Exception: " + str ( sys.exc_info() ) )
+            return None
+
+        parsed_expressions[key] = parameterized_expr
+        if len(parsed_expressions) > parsed_expressions_limit:
+            parsed_expressions.popitem ( last=False )
+        return list ( parameterized_expr )
 
 
     #@profile('Expression_Handler.evaluate_parsed_expr_py')
@@ -1008,8 +1174,9 @@ class Expression_Handler:
         general_parameter_list = param_sys.general_parameter_list
         who_I_depend_on_list = self.who_I_depend_on.split()
         for I_depend_on in who_I_depend_on_list:
-            if not general_parameter_list[I_depend_on].isvalid:
-                print ( "Cannot evaluate " + self.name + " because " + general_parameter_list[I_depend_on].name + " is not valid." )
+            dep = general_parameter_list[I_depend_on]
+            if not dep.isvalid:
+                print ( "Cannot evaluate " + self.name + " because " + dep.name + " is not valid." )
                 self.isvalid = False
                 self.pending_expr = self.expr
                 param_sys.register_validity ( self.name, False )
@@ -1018,13 +1185,16 @@ class Expression_Handler:
                 self.updating = False
                 print ( "Return from evaluate_parsed_expr_py with depth = " + str(param_sys.recursion_depth) )
                 return None
-            exec ( general_parameter_list[I_depend_on].name + " = " + str(general_parameter_list[I_depend_on].value) )
-        #print ( "About to exec (" + self.name + " = " + self.parsed_expr_py + ")" )
-        exec ( self.name + " = " + self.parsed_expr_py )
+            parameter_values[I_depend_on] = dep.value
+        value = eval ( compiled_expression ( self.name, self.parsed_expr_py ), expression_globals, parameter_values )
+        if self.name[0] == "g":
+            parameter_values[self.name] = value
         self.isvalid = True
         self.pending_expr = ""
         param_sys.register_validity ( self.name, True )
-        return ( eval ( self.name, locals() ) )
+        param_sys.recursion_depth += -1
+        self.updating = False
+        return ( value )
 
 
 # Callbacks for Property updates appear to require global (non-member) functions
@@ -1434,9 +1604,12 @@ class Parameter_Data ( bpy.types.PropertyGroup, Expression_Handler ):
         #if params.suspend_evaluation:
         #    return
 
+        forget_compiled_expression ( self.name )
+
         if self.parsed_expr == "":
             self.parsed_expr_py = ""
             self.who_I_depend_on = ""
+            params.dependency_graph().set_dependencies ( self.name, [] )
             if self.value != 0:
                 self.value = 0
         else:
@@ -1483,6 +1656,13 @@ class Parameter_Data ( bpy.types.PropertyGroup, Expression_Handler ):
                     if not self.name in p.who_depends_on_me:
                         p.who_depends_on_me = (p.who_depends_on_me + " " + self.name).strip()
 
+                graph = params.dependency_graph()
+                graph.set_dependencies ( self.name, self.who_I_depend_on.split() )
+                cycles = [ c for c in graph.update_order([self.name])[1] if self.name in c ]
+                if len(cycles) > 0:
+                    params.report_cycles ( cycles )
+                    return
+
                 count_down = 3
                 done = False
                 params.recursion_depth = 0
@@ -1534,23 +1714,37 @@ class Parameter_Data ( bpy.types.PropertyGroup, Expression_Handler ):
         # Force a redraw of the expression itself
         self.expr = self.expr
 
+        if params.currently_updating:
+            # An update pass is running and will evaluate the dependents itself
+            return
+
         # Propagate forward ...
-        who_depends_on_me_list = []
-        if (self.who_depends_on_me != None) and (self.who_depends_on_me != "") and (self.who_depends_on_me != "None"):
-            who_depends_on_me_list = self.who_depends_on_me.split()
-        for pname in who_depends_on_me_list:
-            p = None
-            if pname[0] == "g":
-                p = gen_param_list[pname]
-            else:
-                p = params.panel_parameter_list[pname]
-            if p != None:
-                if p.updating:
-                    # May or may not be an error? print ( "Warning: Circular reference detected when updating " + self.name + "(" + self.par_name + ")")
-                    pass
-                p.parsed_expr = p.parsed_expr
+        params.update_parameters ( [ self.name ], evaluate_named=False )
 
 
+    #@profile('Parameter_Data.update_value')
+    def update_value ( self, params ):
+        """ Evaluate this parameter from its python expression and store the value """
+        if self.parsed_expr == "":
+            value = 0
+        elif self.parsed_expr_py == "":
+            # The expression has errors or undefined names, so there's nothing to evaluate
+            return
+        else:
+            try:
+                params.recursion_depth = 0
+                value = self.evaluate_parsed_expr_py ( params )
+            except Exception as e:
+                print ( "Error evaluating " + self.name + " (" + self.par_name + ") = " + self.parsed_expr_py + ": " + str(e) )
+                self.updating = False
+                value = None
+            params.recursion_depth = 0
+        if value is None:
+            self.isvalid = False
+            self.pending_expr = self.expr
+            params.register_validity ( self.name, False )
+        elif self.value != value:
+            self.value = value
 
 
     #@profile('Parameter_Data.regenerate_expr_from_parsed_expr')
@@ -1587,6 +1781,26 @@ class Parameter_Data ( bpy.types.PropertyGroup, Expression_Handler ):
         return expr
 
 
+class ParameterBatch:
+    """ Rows of general parameters added when the with block ends (see ParameterSystemPropertyGroup.batch) """
+
+    def __init__ ( self, parameter_system ):
+        self.parameter_system = parameter_system
+        self.rows = []
+        self.parameters = []
+
+    def add ( self, name, expression, units="", description="" ):
+        self.rows.append ( ( name, expression, units, description ) )
+
+    def __enter__ ( self ):
+        return self
+
+    def __exit__ ( self, exc_type, exc_value, traceback ):
+        if exc_type is None:
+            self.parameters = self.parameter_system.add_general_parameters ( self.rows )
+        return False
+
+
 class ParameterSystemPropertyGroup ( bpy.types.PropertyGroup ):
     """ Master list of all existing Parameters throughout the application """
     general_parameter_list = CollectionProperty ( type=Parameter_Data, name="GP List" )
@@ -1662,6 +1876,69 @@ class ParameterSystemPropertyGroup ( bpy.types.PropertyGroup ):
                 return None
 
 
+    #@profile('ParameterSystem.get_parameter_by_id')
+    def get_parameter_by_id ( self, name ):
+        """ Return a general ("g...") or panel ("p...") parameter by its ID name """
+        return self.get_parameter ( name, pp=(name[0] == "p") )
+
+
+    #@profile('ParameterSystem.dependency_graph')
+    def dependency_graph ( self ):
+        """ Return the dependency graph of this parameter system, building it as needed """
+        key = self.as_pointer()
+        if not (key in parameter_graphs):
+            graph = ParameterGraph()
+            for plist in [ self.general_parameter_list, self.panel_parameter_list ]:
+                for p in plist:
+                    graph.set_dependencies ( p.name, p.who_I_depend_on.split() )
+            parameter_graphs[key] = graph
+        return parameter_graphs[key]
+
+
+    #@profile('ParameterSystem.forget_dependency_graph')
+    def forget_dependency_graph ( self ):
+        parameter_graphs.pop ( self.as_pointer(), None )
+
+
+    #@profile('ParameterSystem.report_cycles')
+    def report_cycles ( self, cycles, blocked=None ):
+        """ Mark the parameters of circular references (and those depending on them) as invalid """
+        if blocked is None:
+            blocked = []
+        for cycle in cycles:
+            print ( "Error: Circular reference among parameters: " + self.translated_param_name_list ( spaced_strings_from_list ( cycle ) ) )
+        for name in [ n for c in cycles for n in c ] + blocked:
+            p = self.get_parameter_by_id ( name )
+            if p != None:
+                p.isvalid = False
+                p.pending_expr = p.expr
+                self.register_validity ( name, False )
+
+
+    #@profile('ParameterSystem.update_parameters')
+    def update_parameters ( self, names, evaluate_named=True ):
+        """ Evaluate the named parameters and everything depending on them
+
+        Each affected parameter is evaluated once, after all the parameters it
+        depends on. Parameters on (or behind) a circular reference are marked
+        invalid instead.
+        """
+        order, cycles, blocked = self.dependency_graph().update_order ( names )
+        if (len(cycles) > 0) or (len(blocked) > 0):
+            self.report_cycles ( cycles, blocked )
+        named = set ( names )
+        was_updating = self.currently_updating
+        self.currently_updating = True
+        try:
+            for name in order:
+                if evaluate_named or not (name in named):
+                    p = self.get_parameter_by_id ( name )
+                    if p != None:
+                        p.update_value ( self )
+        finally:
+            self.currently_updating = was_updating
+
+
     #@profile('ParameterSystem.add_general_parameter_with_values')
     def add_general_parameter_with_values ( self, name, expression, units, description ):
         """ Add a new parameter to the list of parameters """
@@ -1669,9 +1946,74 @@ class ParameterSystemPropertyGroup ( bpy.types.PropertyGroup ):
         return p
 
 
+    #@profile('ParameterSystem.add_general_parameters')
+    def add_general_parameters ( self, rows ):
+        """ Add general parameters from ( name, expression, units, description ) rows
+
+        Update callbacks are suspended while the parameters are added. Then
+        every expression is parsed once (so parameters may refer to each other
+        in any order) and everything is evaluated in one dependency ordered
+        pass. Existing parameters with undefined names are parsed again since
+        the new names may define them. Returns the new parameters.
+        """
+        new_pars = [ self.new_parameter ( new_name=name, new_expr=expr, new_units=units, new_desc=descr, parse=False ) for (name, expr, units, descr) in rows ]
+        resolve = list ( new_pars )
+        for plist in [ self.general_parameter_list, self.panel_parameter_list ]:
+            resolve.extend ( [ p for p in plist if (not p.disable_parse) and (not p.isvalid) and (p.parsed_expr_py == "") ] )
+
+        graph = self.dependency_graph()
+        users = {}
+        for p in resolve:
+            p.disable_parse = True
+            expr_list = p.parse_param_expr ( p.expr, self )
+            deps = []
+            if expr_list is None:
+                p.parsed_expr = ""
+                p.parsed_expr_py = ""
+            else:
+                p.parsed_expr = p.encode_expr_list_to_str ( expr_list )
+                if None in expr_list:
+                    p.parsed_expr_py = ""
+                else:
+                    p.parsed_expr_py = p.build_py_expr_using_ids ( expr_list, self.general_parameter_list )
+                    deps = sorted ( set ( [ "g"+str(x) for x in expr_list if type(x) == int ] ) )
+            p.who_I_depend_on = spaced_strings_from_list ( deps )
+            graph.set_dependencies ( p.name, deps )
+            for dep in deps:
+                users.setdefault ( dep, [] ).append ( p.name )
+            if (expr_list is None) or (None in expr_list):
+                p.isvalid = False
+                p.pending_expr = p.expr
+                self.register_validity ( p.name, False )
+            else:
+                p.isvalid = True
+                p.pending_expr = ""
+
+        for name, user_names in users.items():
+            dep = self.general_parameter_list[name]
+            dep.who_depends_on_me = spaced_strings_from_list ( sorted ( set ( dep.who_depends_on_me.split() + user_names ) ) )
+
+        try:
+            self.update_parameters ( [ p.name for p in resolve ] )
+        finally:
+            for p in resolve:
+                p.disable_parse = False
+        return new_pars
+
+
+    #@profile('ParameterSystem.batch')
+    def batch ( self ):
+        """ Collect parameters to add them all at once:
+
+              with parameter_system.batch() as batch:
+                  batch.add ( name, expression, units, description )
+        """
+        return ParameterBatch ( self )
+
+
     #@profile('ParameterSystem.new_parameter')
-    def new_parameter ( self, new_name=None, pp=False, new_expr=None, new_units=None, new_desc=None ):
-        """ Add a new parameter to the list of parameters """
+    def new_parameter ( self, new_name=None, pp=False, new_expr=None, new_units=None, new_desc=None, parse=True ):
+        """ Add a new parameter to the list of parameters (left unparsed when parse is False) """
         if new_name != None:
             if (not pp) and self.par_name_already_in_use(new_name):
                 # Cannot use this name because it's already used by a general parameter
@@ -1710,6 +2052,10 @@ class ParameterSystemPropertyGroup ( bpy.types.PropertyGroup ):
 
         new_par.init_par_properties()
 
+        if not parse:
+            # The caller parses and evaluates this parameter (see add_general_parameters)
+            new_par.disable_parse = True
+
         if not (new_expr is None):
             new_par.expr = new_expr
 
@@ -1721,7 +2067,7 @@ class ParameterSystemPropertyGroup ( bpy.types.PropertyGroup ):
         if new_desc != None:
             new_par.descr = new_desc
 
-        new_par.disable_parse = False
+        new_par.disable_parse = not parse
 
         return new_par
 
@@ -1742,6 +2088,8 @@ class ParameterSystemPropertyGroup ( bpy.types.PropertyGroup ):
                     rp.who_depends_on_me = spaced_strings_from_list ( [x for x in rpset] )
 
             # Delete the parameter from the panel parameter list
+            forget_compiled_expression ( unique_name )
+            self.dependency_graph().remove ( unique_name )
             self.panel_parameter_list.remove(self.panel_parameter_list.find(unique_name))
         else:
             print ( "Warning: del_panel_parameter called on a non-panel parameter: " + unique_name )
@@ -1787,7 +2135,12 @@ class ParameterSystemPropertyGroup ( bpy.types.PropertyGroup ):
                     # print ( "Testing if " + p.par_name + " is in " + str(self['gname_to_id_dict'].keys()) )
                     if p.par_name in self['gname_to_id_dict'].keys():
                         self['gname_to_id_dict'].pop(p.par_name)
+                        name_table_changed()
                     
+                    forget_compiled_expression ( p.name )
+                    parameter_values.pop ( p.name, None )
+                    self.dependency_graph().remove ( p.name )
+
                     # Remove this parameter from the general parameter list and move the pointer
                     self.general_parameter_list.remove ( self.active_par_index )
                     self.active_par_index -= 1
@@ -1798,28 +2151,33 @@ class ParameterSystemPropertyGroup ( bpy.types.PropertyGroup ):
 
 
 
+    #@profile('ParameterSystem.dependency_order')
+    def dependency_order ( self ):
+        """ Return ( names, cycles ) for the general parameters
+
+        names lists the ID names of the general parameters so that each comes
+        after the parameters it depends on. Each entry of cycles lists the ID
+        names of the parameters on one circular reference. Those parameters
+        (and any depending on them) can't be ordered and are not in names.
+        """
+        order, cycles, blocked = self.dependency_graph().ordered ( self.general_parameter_list.keys() )
+        return ( order, cycles )
+
+
     #@profile('ParameterSystem.build_dependency_ordered_name_list')
     def build_dependency_ordered_name_list ( self ):
-        print ( "Building Dependency Ordered Name List" )
-        ol = []
-        if len(self.general_parameter_list) > 0:
-            gl = self.general_parameter_list;
-            gs = set(gl.keys())
-            print ( " general parameter set (gs) = " + str(gs) )
-            while len(gs) > len(ol):
-                defined_set = set(ol)
-                print ( "  In while with already defined_set = " + str(defined_set) )
-                for n in gs:
-                    print ( n + " is " + gl[n].par_name + ", depends on (" + gl[n].who_I_depend_on + "), and depended on by (" + gl[n].who_depends_on_me + ")" )
-                    print ( "   Checking for " + n + " in the defined set" )
-                    if not ( n in defined_set):
-                        print ( "     " + n + " is not defined yet, check if it can be" )
-                        dep_set = set(gl[n].who_I_depend_on.split())
-                        if dep_set.issubset(defined_set):
-                            print ( "       " + n + " is now defined since all its dependencies are defined." )
-                            ol.append ( n );
-                            defined_set = set(ol)
-        return ol
+        """ Return the ID names of all general parameters in dependency order
+
+        Parameters which can't be ordered because of circular references are
+        reported and put at the end.
+        """
+        order, cycles, blocked = self.dependency_graph().ordered ( self.general_parameter_list.keys() )
+        if len(cycles) > 0:
+            for cycle in cycles:
+                print ( "Error: Circular reference among parameters: " + self.translated_param_name_list ( spaced_strings_from_list ( cycle ) ) )
+            unordered = set ( [ n for c in cycles for n in c ] + blocked )
+            order = order + [ n for n in self.general_parameter_list.keys() if n in unordered ]
+        return order
 
 
 
@@ -1873,8 +2231,8 @@ class ParameterSystemPropertyGroup ( bpy.types.PropertyGroup ):
         print ( "Parameter System building Data Model" )
         par_sys_dm = {}
         gen_par_list = []
-        for p in self.general_parameter_list:
-            gen_par_list.append ( p.build_data_model_from_properties() )
+        for pn in self.build_dependency_ordered_name_list():
+            gen_par_list.append ( self.general_parameter_list[pn].build_data_model_from_properties() )
         par_sys_dm['model_parameters'] = gen_par_list
         return par_sys_dm
 
@@ -1907,26 +2265,14 @@ class ParameterSystemPropertyGroup ( bpy.types.PropertyGroup ):
         while len(self.general_parameter_list) > 0:
             self.general_parameter_list.remove(0)
         self['gname_to_id_dict'] = {}
+        name_table_changed()
         self.next_gid = 1
+        self.forget_dependency_graph()
         if 'model_parameters' in par_sys_dm:
-            # Add all of the parameters - some will be invalid if they depend on other parameters that haven't been read yet
-            for p in par_sys_dm['model_parameters']:
-                print ( "Adding " + p['par_name'] + " = " + p['par_expression'] + " (" + p['par_units'] + ") ... " + p['par_description'] )
-                self.add_general_parameter_with_values ( p['par_name'], p['par_expression'], p['par_units'], p['par_description'] )
-
-            # Update the parameter expressions for any that were invalid after all have been added
-            last_num_invalid = 0
-            keep_checking = True
-            while keep_checking:
-                num_invalid = 0
-                for p in self.general_parameter_list:
-                    if not p.isvalid:
-                        num_invalid +=1
-                        # Assign it again to force an evaluation after all other parameters have been added
-                        p.expr = p.expr
-                if num_invalid == last_num_invalid:
-                    # No parameters have been updated, so exit (even if there are some remaining invalid)
-                    keep_checking = False
+            # Add all of the parameters at once so they may refer to each other in any order
+            with self.batch() as batch:
+                for p in par_sys_dm['model_parameters']:
+                    batch.add ( p['par_name'], p['par_expression'], p['par_units'], p['par_description'] )
 
 
 
@@ -1954,6 +2300,7 @@ class ParameterSystemPropertyGroup ( bpy.types.PropertyGroup ):
 
         # Perform the update
         gname_dict[param.par_name] = param.name
+        name_table_changed()
 
         # Remove all entries that match the new name (if any)
         #while param.par_name in gname_dict:
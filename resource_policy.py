@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+
+"""
+Resource limits and memory admission of MCell runs, shared by the queue
+runner (sim_runner_queue.py, run_wrapper.py) and the COMMAND runner
+(run_simulations.py). Only standard modules available in Python 2 and 3
+are used since the runners may run under either.
+"""
+
+import os
+
+
+def mem_available_kb():
+  """ Memory available for new processes in kB from /proc/meminfo (None where there is no /proc) """
+  fields = {}
+  try:
+    with open('/proc/meminfo') as f:
+      for line in f:
+        name, value = line.split(':', 1)
+        fields[name] = int(value.split()[0])
+  except (IOError, OSError, ValueError):
+    return None
+  if 'MemAvailable' in fields:
+    return fields['MemAvailable']
+  # Kernels before 3.14
+  return fields.get('MemFree', 0) + fields.get('Cached', 0) + fields.get('Buffers', 0)
+
+
+def process_rss_kb(pid):
+  """ Current resident memory of a process in kB (0 if unknown) """
+  try:
+    with open('/proc/%d/status' % pid) as f:
+      for line in f:
+        if line.startswith('VmRSS:'):
+          return int(line.split()[1])
+  except (IOError, OSError, ValueError):
+    pass
+  return 0
+
+
+# Environment variable passing the limits of a task to run_wrapper.py
+resources_env = 'CELLBLENDER_TASK_RESOURCES'
+
+
+def apply_resource_limits(spec):
+  """ Apply the limits of a task to the calling process (they are inherited
+  by the processes it starts). spec is a dict with optional 'cores' (list
+  of CPU numbers), 'mem_limit_mb' (address space limit) and 'nice'. Limits
+  the platform doesn't support are skipped. """
+  if spec.get('nice'):
+    try:
+      os.nice(spec['nice'])
+    except (AttributeError, OSError):
+      pass
+  if spec.get('cores') and hasattr(os, 'sched_setaffinity'):
+    try:
+      os.sched_setaffinity(0, spec['cores'])
+    except OSError:
+      pass
+  if spec.get('mem_limit_mb'):
+    try:
+      import resource
+      limit = spec['mem_limit_mb'] * 1024 * 1024
+      resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except (ImportError, ValueError, OSError):
+      pass
+
+
+class ResourcePolicy:
+  """ Limits and admission rule for the local processes of a SimQueue.
+
+  With cores_per_task every task is pinned to its own set of that many
+  cores (so at most cores / cores_per_task tasks run at once). Tasks can
+  get an address space limit (mem_limit_mb) and a niceness. With
+  admit_by_memory a task only starts when the available memory, less the
+  memory the running tasks are still expected to grow by, leaves room for
+  one more task plus mem_reserve_mb. A task is expected to need
+  mem_per_task_mb, or if that is 0 the largest peak seen so far.
+  """
+
+  # Seconds between memory checks while a task waits to be admitted
+  poll_interval = 2.0
+
+  def __init__(self, cores_per_task=0, mem_limit_mb=0, nice=0,
+               admit_by_memory=False, mem_reserve_mb=1024, mem_per_task_mb=0):
+    self.cores_per_task = cores_per_task
+    self.mem_limit_mb = mem_limit_mb
+    self.nice = nice
+    self.admit_by_memory = admit_by_memory
+    self.mem_reserve_mb = mem_reserve_mb
+    self.mem_per_task_mb = mem_per_task_mb
+    self.settings = (cores_per_task, mem_limit_mb, nice, admit_by_memory,
+                     mem_reserve_mb, mem_per_task_mb)
+    self.free_core_sets = []
+    if cores_per_task and hasattr(os, 'sched_getaffinity'):
+      cores = sorted(os.sched_getaffinity(0))
+      self.free_core_sets = [cores[i:i + cores_per_task] for i in
+                             range(0, len(cores) - cores_per_task + 1, cores_per_task)]
+
+  def pinning(self):
+    return bool(self.cores_per_task and hasattr(os, 'sched_getaffinity'))
+
+  def expected_kb(self, progress_list):
+    if self.mem_per_task_mb:
+      return self.mem_per_task_mb * 1024
+    return max([0] + [p.peak_rss for p in progress_list])
+
+  def admit(self, running_progress, all_progress):
+    """ True if one more task may start next to the running ones """
+    if self.pinning() and not self.free_core_sets:
+      return False
+    if self.admit_by_memory:
+      available = mem_available_kb()
+      expected = self.expected_kb(all_progress)
+      if (available != None) and expected:
+        growth = sum([max(0, expected - p.peak_rss) for p in running_progress])
+        if available - growth < expected + self.mem_reserve_mb * 1024:
+          return False
+    return True
+
+  def acquire_cores(self):
+    if self.pinning() and self.free_core_sets:
+      return self.free_core_sets.pop(0)
+    return None
+
+  def release_cores(self, cores):
+    if cores and (len(cores) == self.cores_per_task) and (cores not in self.free_core_sets):
+      self.free_core_sets.append(cores)
+      self.free_core_sets.sort()
+
+  def task_spec(self, cores):
+    return {'cores': cores, 'mem_limit_mb': self.mem_limit_mb, 'nice': self.nice}
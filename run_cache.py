@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+
+"""
+Cache of MCell run results keyed by the content of everything a run reads.
+
+The key of a run is a hash of the MCell binary, the command line arguments
+(which hold the seed and main MDL file) and every file of the project
+directory the main MDL file names, followed recursively: included MDL files
+and variable rate files. A run with the same key produces the same output,
+so when a key is found its output directories are restored instead of running
+MCell again. Restored files are copies: the viewer rewrites and removes files
+in the seed directories (.cbindex, .cbarchive), which must not reach the cache.
+
+Output directories are the "./react_data/.../seed_" and "./viz_data/.../seed_"
+paths of the MDL files with the seed appended as MCell does (seed_00001).
+"""
+
+import os
+import re
+import shutil
+import hashlib
+import threading
+
+
+quoted_re = re.compile(r'"([^"\n]*)"')
+output_re = re.compile(r'"\./((?:react|viz)_data/(?:[^"\n]*/)?)seed_"')
+
+
+class RunCache:
+
+  def __init__(self, cache_dir):
+    self.cache_dir = cache_dir
+    self.lock = threading.Lock()
+    self.hashes = {}
+
+  def file_hash(self, path):
+    """ sha256 of a file, remembered until its size or mtime changes """
+    st = os.stat(path)
+    key = (os.path.realpath(path), st.st_mtime, st.st_size)
+    with self.lock:
+      if key in self.hashes:
+        return self.hashes[key]
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+      for block in iter(lambda: f.read(1 << 20), b''):
+        h.update(block)
+    with self.lock:
+      self.hashes[key] = h.hexdigest()
+    return self.hashes[key]
+
+  def referenced_files(self, wd, mdl_name):
+    """ Return (files, output bases): the files of wd read by a run of
+    mdl_name, and the output directories it names without the seed part """
+    files = []
+    outputs = set()
+    pending = [mdl_name]
+    while pending:
+      name = pending.pop()
+      if name in files:
+        continue
+      files.append(name)
+      if not name.endswith('.mdl'):
+        continue
+      with open(os.path.join(wd, name), 'r', encoding='utf8', errors='replace') as f:
+        text = f.read()
+      outputs.update(output_re.findall(text))
+      for quoted in quoted_re.findall(text):
+        quoted = os.path.normpath(quoted)
+        if (quoted not in files) and (os.path.dirname(quoted) == '') and \
+            os.path.isfile(os.path.join(wd, quoted)):
+          pending.append(quoted)
+    return (sorted(files), sorted(outputs))
+
+  def task_key(self, cmd, args, wd, mdl_name, seed):
+    """ Return (key, output dirs relative to wd) of a run, or (None, [])
+    if the run can't be cached """
+    try:
+      files, outputs = self.referenced_files(wd, mdl_name)
+      h = hashlib.sha256()
+      h.update(('%s\n%s\n' % (self.file_hash(cmd), args)).encode())
+      for name in files:
+        h.update(('%s %s\n' % (name, self.file_hash(os.path.join(wd, name)))).encode())
+    except (IOError, OSError):
+      return (None, [])
+    return (h.hexdigest(), [os.path.normpath('%sseed_%05d' % (base, seed)) for base in outputs])
+
+  def entry_dir(self, key):
+    return os.path.join(self.cache_dir, key[:2], key)
+
+  def restore(self, key, wd, outputs):
+    """ Put the cached outputs of key in place. Returns False on a miss. """
+    entry = self.entry_dir(key)
+    if not os.path.isdir(entry):
+      return False
+    for output in outputs:
+      src = os.path.join(entry, output)
+      dest = os.path.join(wd, output)
+      self.remove_output(dest)
+      if not os.path.isdir(src):
+        continue
+      if not os.path.isdir(os.path.dirname(dest)):
+        os.makedirs(os.path.dirname(dest))
+      shutil.copytree(src, dest)
+    return True
+
+  def store(self, key, wd, outputs):
+    """ Copy the outputs of a completed run into the cache """
+    entry = self.entry_dir(key)
+    if os.path.isdir(entry):
+      return
+    temp_entry = '%s.%d.part' % (entry, os.getpid())
+    shutil.rmtree(temp_entry, ignore_errors=True)
+    try:
+      for output in outputs:
+        src = os.path.join(wd, output)
+        if os.path.isdir(src):
+          shutil.copytree(src, os.path.join(temp_entry, output))
+      if not os.path.isdir(temp_entry):
+        os.makedirs(temp_entry)
+      os.rename(temp_entry, entry)
+    except (IOError, OSError):
+      shutil.rmtree(temp_entry, ignore_errors=True)
+
+  @staticmethod
+  def remove_output(path):
+    """ Remove an output directory """
+    if os.path.isdir(path):
+      shutil.rmtree(path)
+
+  def clear(self):
+    shutil.rmtree(self.cache_dir, ignore_errors=True)
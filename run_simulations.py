@@ -1,10 +1,94 @@
 #!/usr/bin/env python
 
 import datetime
+import json
 import sys
 import multiprocessing
 import os
 import subprocess
+import time
+
+from resource_policy import ResourcePolicy, apply_resource_limits, \
+    mem_available_kb, process_rss_kb
+from run_cache import RunCache
+
+
+# Resource policy, run cache and index of this pool worker (set by init_worker)
+policy = None
+run_cache = None
+worker_index = 0
+
+# Shared by all pool workers (set by init_worker): admission_lock serializes
+# memory admission, running_pids[i] is the MCell process of worker i (0 if
+# none) and peak_kb is the largest peak memory of the runs so far.
+admission_lock = None
+running_pids = None
+peak_kb = None
+
+
+def init_worker(policy_settings, cache_dir, counter, lock, pids, peak):
+    """ Pool initializer: set up the resource policy and run cache and
+    number the workers """
+    global policy, run_cache, worker_index, admission_lock, running_pids, peak_kb
+    if policy_settings:
+        policy = ResourcePolicy(**policy_settings)
+    if cache_dir:
+        run_cache = RunCache(cache_dir)
+    with counter.get_lock():
+        worker_index = counter.value
+        counter.value += 1
+    admission_lock = lock
+    running_pids = pids
+    peak_kb = peak
+
+
+def wait_for_memory():
+    """ Wait until the available memory, less what the running MCell
+    processes are still expected to grow by, leaves room for one more
+    run (as ResourcePolicy.admit does for the queue runner). Called with
+    admission_lock held, so each admitted run is counted by the next. """
+    while True:
+        running = [pid for pid in running_pids if pid]
+        rss = dict([(pid, process_rss_kb(pid)) for pid in running])
+        if policy.mem_per_task_mb:
+            expected = policy.mem_per_task_mb * 1024
+        else:
+            expected = max([peak_kb.value] + list(rss.values()))
+        available = mem_available_kb()
+        if (available is None) or not expected:
+            return
+        growth = sum([max(0, expected - rss[pid]) for pid in running])
+        if available - growth >= expected + policy.mem_reserve_mb * 1024:
+            return
+        time.sleep(policy.poll_interval)
+
+
+def run_mcell(cmd, cwd, stdout, stderr):
+    """ Run one MCell process under the resource policy (like subprocess.call) """
+    if (policy is None) or (os.name != 'posix'):
+        return subprocess.call(cmd, cwd=cwd, stdout=stdout, stderr=stderr)
+    cores = None
+    if policy.free_core_sets:
+        cores = policy.free_core_sets[
+            worker_index % len(policy.free_core_sets)]
+    spec = policy.task_spec(cores)
+    with admission_lock:
+        if policy.admit_by_memory:
+            wait_for_memory()
+        proc = subprocess.Popen(cmd, cwd=cwd, stdout=stdout, stderr=stderr,
+                                preexec_fn=lambda: apply_resource_limits(spec))
+        running_pids[worker_index % len(running_pids)] = proc.pid
+    rc = proc.wait()
+    running_pids[worker_index % len(running_pids)] = 0
+    try:
+        import resource
+        # Largest peak of the processes this worker has waited for (kB on Linux)
+        child_peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        with peak_kb.get_lock():
+            peak_kb.value = max(peak_kb.value, child_peak)
+    except (ImportError, OSError):
+        pass
+    return rc
 
 
 def run_sim(arglist):
@@ -31,6 +115,21 @@ def run_sim(arglist):
     elif log_file_option == 'console':
         log_file = None
 
+    cache_key = None
+    if run_cache is not None:
+        # Same key as the queue runner gives the run (see add_task)
+        cache_key, outputs = run_cache.task_key(
+            mcell_binary, '-seed %d %s' % (seed, mdl_filename), project_dir,
+            mdl_filename, seed)
+        try:
+            if (cache_key is not None) and run_cache.restore(
+                    cache_key, project_dir, outputs):
+                print("Restored seed %d of %s from the run cache" % (
+                    seed, mdl_filepath))
+                return
+        except (IOError, OSError):
+            pass
+
     print("Running: " + mcell_binary + " " + mdl_filepath)
     subprocess_cwd = os.path.dirname(mdl_filepath)
     print("  Should run from cwd = " +  subprocess_cwd)
@@ -39,41 +138,55 @@ def run_sim(arglist):
     if (log_file_option == 'file' and error_file_option == 'file'):
         with open(log_filepath, "w") as log_file:
             with open (error_filepath, "w") as error_file:
-                subprocess.call(
+                rc = run_mcell(
                     [mcell_binary, '-seed', '%d' % seed, mdl_filepath],
-                    cwd=subprocess_cwd,
-                    stdout=log_file, stderr=error_file)
+                    subprocess_cwd, log_file, error_file)
     # Only output log file
     elif log_file_option == 'file':
         with open(log_filepath, "w") as log_file:
-            subprocess.call(
+            rc = run_mcell(
                 [mcell_binary, '-seed', '%d' % seed, mdl_filepath],
-                cwd=subprocess_cwd,
-                stdout=log_file, stderr=error_file)
+                subprocess_cwd, log_file, error_file)
     # Only error log file
     elif error_file_option == 'file':
         with open(error_filepath, "w") as error_file:
-            subprocess.call(
+            rc = run_mcell(
                 [mcell_binary, '-seed', '%d' % seed, mdl_filepath],
-                cwd=subprocess_cwd,
-                stdout=log_file, stderr=error_file)
+                subprocess_cwd, log_file, error_file)
     # Neither error nor output log
     else:
-        subprocess.call(
+        rc = run_mcell(
             [mcell_binary, '-seed', '%d' % seed, mdl_filepath],
-            cwd=subprocess_cwd, stdout=log_file, stderr=error_file)
+            subprocess_cwd, log_file, error_file)
+
+    if (cache_key is not None) and (rc == 0):
+        run_cache.store(cache_key, project_dir, outputs)
 
 
 if __name__ == "__main__":
-    # Get the command line arguments (excluding the script name itself)
+    # Get the command line arguments (excluding the script name itself). An
+    # optional argument holds the ResourcePolicy settings as JSON (null for
+    # none) and the one after it the run cache directory.
     mcell_binary, start_str, end_str, project_dir, base_name, \
-        error_file_option, log_file_option, mcell_processes_str = sys.argv[1:]
+        error_file_option, log_file_option, mcell_processes_str = sys.argv[1:9]
+    policy_settings = json.loads(sys.argv[9]) if len(sys.argv) > 9 else None
+    cache_dir = sys.argv[10] if len(sys.argv) > 10 else None
     start = int(start_str)
     end = int(end_str)
     mcell_processes = int(mcell_processes_str)
+    if policy_settings and policy_settings.get('cores_per_task'):
+        # No more workers than core sets
+        n_sets = len(ResourcePolicy(**policy_settings).free_core_sets)
+        mcell_processes = max(1, min(mcell_processes, n_sets))
 
     arglist = [[mcell_binary, project_dir, base_name, error_file_option, log_file_option, seed] for seed in range(start, end)]
 
     # Create a pool of mcell processes.
-    pool = multiprocessing.Pool(processes=mcell_processes)
+    counter = multiprocessing.Value('i', 0)
+    pids = multiprocessing.Array('i', mcell_processes, lock=False)
+    peak = multiprocessing.Value('l', 0)
+    pool = multiprocessing.Pool(processes=mcell_processes,
+                                initializer=init_worker,
+                                initargs=(policy_settings, cache_dir, counter,
+                                          multiprocessing.Lock(), pids, peak))
     pool.map(run_sim, arglist)
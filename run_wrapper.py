@@ -1,7 +1,10 @@
 #!/usr/bin/env python3
 
-from sim_runner_queue import OutputQueue
+from sim_runner_queue import OutputQueue, OutputMultiplexer, mux_supported, \
+  JobJournal, status_from_returncode, resources_env, apply_resource_limits
 import sys
+import os
+import json
 import signal
 import subprocess as sp
 
@@ -9,6 +12,11 @@ import subprocess as sp
 if __name__ == '__main__':
 
   wd = sys.argv[1]
+  # Optional journal of the queue and id of this task in it
+  journal = None
+  if len(sys.argv) > 3:
+    journal = JobJournal(sys.argv[2])
+    task_id = int(sys.argv[3])
   if sys.version_info.major == 3:
     cmd = input()
     args = input()
@@ -18,6 +26,10 @@ if __name__ == '__main__':
 
   sys.stdout.write('cmd: {0}   args: {1}   wd: {2}\n'.format(cmd, args, wd))
 
+  # Pinning, memory limit and niceness chosen by the queue (inherited by MCell)
+  if os.environ.get(resources_env):
+    apply_resource_limits(json.loads(os.environ[resources_env]))
+
   cmd_list = []
   cmd_list.append(cmd)
   cmd_list.extend(args.split())
@@ -25,17 +37,23 @@ if __name__ == '__main__':
   proc = sp.Popen(cmd_list, cwd=wd, bufsize=1, shell=False, close_fds=False, stdout=sp.PIPE, stderr=sp.PIPE)
 
   def sig_handler(signum, frame):
-    sys.stdout.write('Sending signal: {0} to child PID: {1}\n'.format(signum, proc.pid))
-    sys.stdout.flush()
+    if journal:
+      journal.record(task_id, status='died', rc=15)
     proc.send_signal(signum)
+    sys.stdout.write('Sent signal: {0} to child PID: {1}\n'.format(signum, proc.pid))
     sys.stdout.write('Terminated run_wrapper.py\n')
     sys.stdout.flush()
     exit(15)
 
   signal.signal(signal.SIGTERM, sig_handler)
 
-  output_q = OutputQueue() 
-  rc, res = output_q.run_proc(proc,passthrough=True)
+  if mux_supported:
+    rc, res = OutputMultiplexer().run_until_done(proc,passthrough=True)
+  else:
+    output_q = OutputQueue()
+    rc, res = output_q.run_proc(proc,passthrough=True)
 
+  if journal:
+    journal.record(task_id, status=status_from_returncode(abs(rc)), rc=abs(rc))
   exit(abs(rc))
 
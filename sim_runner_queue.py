@@ -7,8 +7,30 @@ if sys.version_info.major == 3:
 else:
   from Queue import Queue, Empty
 import threading
+import signal
 import subprocess as sp
 import time
+import re
+import errno
+import json
+import codecs
+import hashlib
+import hmac
+try:
+  from .resource_policy import ResourcePolicy, apply_resource_limits, \
+    mem_available_kb, resources_env
+except (ImportError, SystemError, ValueError):
+  # Run as a script (run_wrapper.py, sim_worker.py)
+  from resource_policy import ResourcePolicy, apply_resource_limits, \
+    mem_available_kb, resources_env
+try:
+  import selectors
+  import socket
+except ImportError:
+  # Python 2 has no selectors, so run_wrapper.py falls back to OutputQueue
+  selectors = None
+  socket = None
+from collections import deque
 
 
 
@@ -42,7 +64,7 @@ class OutputQueue:
             pass
 
 
-  def run_proc(self, proc, arg_in=None, passthrough=True, bl_text=None, e_bl_text_quit=None):
+  def run_proc(self, proc, arg_in=None, passthrough=True, bl_text=None, e_bl_text_quit=None, progress=None):
 
     if bl_text != None:
       import bpy
@@ -51,8 +73,11 @@ class OutputQueue:
 
       outs, errs = [], []
 
+      out_funcs = [self.out_q.put, outs.append]
+      if progress != None:
+        out_funcs.append(progress.feed)
       stdout_reader_thread = threading.Thread(
-          target=self.read_output, args=(proc.stdout, [self.out_q.put, outs.append])
+          target=self.read_output, args=(proc.stdout, out_funcs)
           )
 
       stderr_reader_thread = threading.Thread(
@@ -95,26 +120,862 @@ class OutputQueue:
       outs, errs = proc.communicate()
       outs = '' if outs == None else outs.decode('utf-8')
       errs = '' if errs == None else errs.decode('utf-8')
+      if progress != None:
+        progress.feed(outs)
 
     rc = proc.returncode
 
     return (rc, (outs, errs))
 
 
+class TaskProgress:
+  """ Progress of one MCell run parsed from its output as it arrives.
+
+  MCell reports "Iterations: <n> of <total>" lines. The rate is averaged
+  over the reports of the last rate_window seconds and the peak resident
+  memory is read from /proc (Linux only) for the wrapper and its children.
+  """
+
+  iterations_re = re.compile(r'Iterations:\s*(\d+)\s+of\s+(\d+)')
+  rate_window = 30.0
+
+  def __init__(self):
+    self.iteration = 0
+    self.total_iterations = 0
+    self.rate = 0.0
+    self.peak_rss = 0
+    self.start_time = None
+    self.end_time = None
+    self.partial = ''
+    self.samples = deque()
+
+  def feed(self, text):
+    """ Parse a chunk of output (chunks don't need to end on line breaks) """
+    lines = (self.partial + text).split('\n')
+    self.partial = lines.pop()[-256:]
+    now = time.time()
+    for line in lines:
+      match = self.iterations_re.search(line)
+      if match:
+        self.iteration = int(match.group(1))
+        self.total_iterations = int(match.group(2))
+        self.samples.append((now, self.iteration))
+    while (len(self.samples) > 2) and (now - self.samples[0][0] > self.rate_window):
+      self.samples.popleft()
+    if len(self.samples) > 1:
+      (t0, i0), (t1, i1) = self.samples[0], self.samples[-1]
+      if t1 > t0:
+        self.rate = (i1 - i0) / (t1 - t0)
+
+  def eta(self):
+    """ Estimated seconds until the run ends (None if unknown) """
+    if (self.rate <= 0.0) or (self.total_iterations <= 0):
+      return None
+    return max(0, self.total_iterations - self.iteration) / self.rate
+
+  def fraction(self):
+    if self.total_iterations <= 0:
+      return 0.0
+    return min(1.0, float(self.iteration) / self.total_iterations)
+
+  def sample_rss(self, pid):
+    """ Update peak_rss (in kB) from the VmHWM of pid and its children """
+    for p in [pid] + proc_children(pid):
+      try:
+        with open('/proc/%d/status' % p) as f:
+          for line in f:
+            if line.startswith('VmHWM:'):
+              self.peak_rss = max(self.peak_rss, int(line.split()[1]))
+              break
+      except (IOError, OSError, ValueError):
+        pass
+
+  def summary(self):
+    """ Short text for the run list, e.g. "42% 812 it/s ETA 0:03:10 120 MB" """
+    parts = []
+    if self.total_iterations:
+      parts.append('%d%%' % (100 * self.fraction()))
+    if self.rate > 0.0:
+      parts.append('%.0f it/s' % self.rate)
+    eta = self.eta()
+    if (eta is not None) and (self.end_time is None):
+      parts.append('ETA %s' % format_duration(eta))
+    if self.peak_rss:
+      parts.append('%.0f MB' % (self.peak_rss / 1024.0))
+    return ' '.join(parts)
+
+
+def proc_children(pid):
+  """ PIDs of the direct children of pid (empty where /proc isn't available) """
+  try:
+    with open('/proc/%d/task/%d/children' % (pid, pid)) as f:
+      return [int(p) for p in f.read().split()]
+  except (IOError, OSError, ValueError):
+    return []
+
+
+def format_duration(seconds):
+  seconds = int(seconds)
+  return '%d:%02d:%02d' % (seconds // 3600, (seconds // 60) % 60, seconds % 60)
+
+
+class _MuxStream:
+  """ Output of one pipe: recent text in a bounded ring plus text waiting to be flushed """
+
+  def __init__(self, task, pipe, echo_file, ring_bytes):
+    self.task = task
+    self.pipe = pipe
+    self.echo_file = echo_file
+    self.decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    self.ring = deque()
+    self.ring_size = 0
+    self.ring_bytes = ring_bytes
+    # Text not yet echoed (all of it is echoed)
+    self.pending = []
+    self.pending_size = 0
+    # Text not yet added to the Blender text block (only the tail is kept)
+    self.bl_pending = deque()
+    self.bl_pending_size = 0
+    self.bl_truncated = False
+    self.eof = False
+
+  def feed(self, data, final=False):
+    text = self.decoder.decode(data, final)
+    if not text:
+      return
+    if (self.task.progress != None) and (self is self.task.streams[0]):
+      self.task.progress.feed(text)
+    self.ring.append(text)
+    self.ring_size += len(text)
+    while (self.ring_size > self.ring_bytes) and (len(self.ring) > 1):
+      self.ring_size -= len(self.ring.popleft())
+    if self.task.bl_text != None:
+      self.bl_pending.append(text)
+      self.bl_pending_size += len(text)
+      while (self.bl_pending_size > self.ring_bytes) and (len(self.bl_pending) > 1):
+        self.bl_pending_size -= len(self.bl_pending.popleft())
+        self.bl_truncated = True
+    self.pending.append(text)
+    self.pending_size += len(text)
+    if self.pending_size > self.ring_bytes:
+      # Output is produced faster than it is flushed, so echo it right away
+      self.echo()
+
+  def echo(self):
+    text = ''.join(self.pending)
+    self.pending = []
+    self.pending_size = 0
+    if text and self.task.echo:
+      try:
+        self.echo_file.write(text)
+        self.echo_file.flush()
+      except (IOError, OSError):
+        # The reader is gone (e.g. Blender exited). Keep draining the
+        # pipes so the simulation can run to the end.
+        self.task.echo = False
+
+  def take_bl_pending(self):
+    text = ''.join(self.bl_pending)
+    if self.bl_truncated:
+      text = '...\n' + text
+    self.bl_pending = deque()
+    self.bl_pending_size = 0
+    self.bl_truncated = False
+    return text
+
+  def text(self):
+    return ''.join(self.ring)
+
+
+class _MuxTask:
+  def __init__(self, proc, echo, bl_text, e_bl_text_quit, ring_bytes, progress=None):
+    self.proc = proc
+    self.echo = echo
+    self.bl_text = bl_text
+    self.e_bl_text_quit = e_bl_text_quit
+    self.progress = progress
+    self.streams = [_MuxStream(self, proc.stdout, sys.stdout, ring_bytes),
+                    _MuxStream(self, proc.stderr, sys.stderr, ring_bytes)]
+    self.done = threading.Event()
+
+
+class OutputMultiplexer:
+  """ Read the output pipes of many processes with one selector loop.
+
+  Pipes are read in large chunks as soon as data arrives. The most recent
+  ring_bytes characters of each pipe are kept, and new output is echoed to
+  sys.stdout/sys.stderr and appended to a Blender text block in batches
+  every flush_interval seconds (or as soon as ring_bytes are waiting to be
+  echoed). All output is echoed, while the text block only gets the last
+  ring_bytes characters of each batch. A SimQueue runs the loop on one background
+  thread for all tasks, while run_wrapper.py runs it in its main thread
+  with run_until_done().
+
+  Selectors only handle pipes on POSIX systems (see mux_supported).
+  """
+
+  # Memory use is sampled every rss_interval seconds
+  rss_interval = 2.0
+
+  def __init__(self, flush_interval=0.25, ring_bytes=65536):
+    self.flush_interval = flush_interval
+    self.ring_bytes = ring_bytes
+    self.next_rss_sample = 0.0
+    self.selector = selectors.DefaultSelector()
+    self.lock = threading.Lock()
+    self.new_tasks = []
+    self.tasks = []
+    self.thread = None
+    self.wake_r, self.wake_w = os.pipe()
+    self.selector.register(self.wake_r, selectors.EVENT_READ, None)
+
+  def add(self, proc, echo=True, bl_text=None, e_bl_text_quit=None, progress=None):
+    """ Start collecting the stdout and stderr of proc (both must be pipes)
+
+    If a TaskProgress is given, it is fed the stdout text as it arrives.
+    """
+    task = _MuxTask(proc, echo, bl_text, e_bl_text_quit, self.ring_bytes, progress)
+    with self.lock:
+      self.new_tasks.append(task)
+      if self.thread is None:
+        self.thread = threading.Thread(target=self.run, name='output_mux')
+        self.thread.daemon = True
+        self.thread.start()
+    os.write(self.wake_w, b'x')
+    return task
+
+  def wait(self, task):
+    """ Wait until proc has exited and its pipes are drained.
+
+    Returns the same (rc, (outs, errs)) as OutputQueue.run_proc, except
+    that outs and errs hold at most the last ring_bytes characters.
+    """
+    task.done.wait()
+    rc = task.proc.wait()
+    return (rc, (task.streams[0].text(), task.streams[1].text()))
+
+  def run_proc(self, proc, arg_in=None, passthrough=True, bl_text=None, e_bl_text_quit=None, progress=None):
+    """ Drop-in replacement for OutputQueue.run_proc """
+    task = self.add(proc, echo=passthrough, bl_text=bl_text, e_bl_text_quit=e_bl_text_quit, progress=progress)
+    if arg_in:
+      for arg in arg_in:
+        proc.stdin.write('{0}\n'.format(arg).encode())
+        proc.stdin.flush()
+    return self.wait(task)
+
+  def run_until_done(self, proc, arg_in=None, passthrough=True):
+    """ Like run_proc, but runs the loop in the calling thread (no threads at all) """
+    task = _MuxTask(proc, passthrough, None, None, self.ring_bytes)
+    with self.lock:
+      self.new_tasks.append(task)
+    if arg_in:
+      for arg in arg_in:
+        proc.stdin.write('{0}\n'.format(arg).encode())
+        proc.stdin.flush()
+    self.run(until_done=True)
+    return self.wait(task)
+
+  def run(self, until_done=False):
+    next_flush = time.time() + self.flush_interval
+    while True:
+      with self.lock:
+        for task in self.new_tasks:
+          for stream in task.streams:
+            self.selector.register(stream.pipe.fileno(), selectors.EVENT_READ, stream)
+          self.tasks.append(task)
+        self.new_tasks = []
+        if until_done and not self.tasks:
+          break
+
+      for key, events in self.selector.select(max(0.0, next_flush - time.time())):
+        if key.data is None:
+          os.read(self.wake_r, 4096)
+          continue
+        stream = key.data
+        data = os.read(key.fd, 65536)
+        if data:
+          stream.feed(data)
+        else:
+          self.selector.unregister(key.fd)
+          stream.feed(b'', final=True)
+          stream.pipe.close()
+          stream.eof = True
+
+      if time.time() >= next_flush:
+        next_flush = time.time() + self.flush_interval
+        self.flush()
+      finished = [t for t in self.tasks if t.streams[0].eof and t.streams[1].eof]
+      if finished:
+        self.flush()
+        for task in finished:
+          self.tasks.remove(task)
+          task.done.set()
+
+  def flush(self):
+    """ Write out the output collected since the last flush, one write per stream """
+    if time.time() >= self.next_rss_sample:
+      self.next_rss_sample = time.time() + self.rss_interval
+      for task in self.tasks:
+        if (task.progress != None) and (task.proc.pid != None):
+          task.progress.sample_rss(task.proc.pid)
+    for task in self.tasks:
+      for stream in task.streams:
+        stream.echo()
+        if not stream.bl_pending:
+          continue
+        text = stream.take_bl_pending()
+        if task.bl_text != None:
+          if (task.e_bl_text_quit != None) and task.e_bl_text_quit.isSet():
+            continue
+          try:
+            task.bl_text.write(text)
+            task.bl_text.current_line_index=len(task.bl_text.lines)-1
+          except:
+            pass
+
+
+# Selectors can wait on pipes only on POSIX systems (and need Python 3).
+# Elsewhere the thread based OutputQueue is used.
+mux_supported = (os.name == 'posix') and (selectors is not None)
+
+
+def status_from_returncode(rc):
+  """ Task status for a run_wrapper.py return code """
+  if rc == 0:
+    return 'completed'
+  elif rc == 1:
+    return 'mcell_error'
+  return 'died'
+
+
+class JobJournal:
+  """ Append-only JSON lines record of the tasks of a SimQueue.
+
+  Each line holds a task_id, a time stamp and the fields which changed
+  (cmd, args, wd, info, pid, status, rc, cleared). Replaying the lines in
+  order gives the last known state of every task, so a later session can
+  reattach to runs which outlived Blender and resume the unfinished ones.
+  run_wrapper.py appends the final status of its task itself, which covers
+  runs that end after Blender has gone.
+
+  Since the wrappers append without any lock shared with this process, the
+  journal is only compacted (see compact) while none of its runs is alive.
+  A compacted journal starts with a {"max_task_id": n} line so that the ids
+  of cleared tasks are still never reused.
+  """
+
+  def __init__(self, path):
+    self.path = path
+    self.lock = threading.Lock()
+    # Largest task id of any record (cleared ones too) and number of lines,
+    # set by load()
+    self.max_task_id = 0
+    self.n_lines = 0
+
+  def record(self, task_id, **fields):
+    fields['task_id'] = task_id
+    fields['time'] = time.time()
+    line = json.dumps(fields, sort_keys=True) + '\n'
+    with self.lock:
+      try:
+        with open(self.path, 'a') as f:
+          f.write(line)
+      except (IOError, OSError):
+        pass
+
+  def load(self):
+    """ Return {task_id: merged fields} for all tasks not cleared """
+    tasks = {}
+    max_task_id = 0
+    self.n_lines = 0
+    try:
+      with open(self.path, 'r') as f:
+        for line in f:
+          self.n_lines += 1
+          try:
+            fields = json.loads(line)
+          except ValueError:
+            # Torn write (e.g. from a crash)
+            continue
+          if 'task_id' not in fields:
+            # Header of a compacted journal
+            max_task_id = max(max_task_id, fields.get('max_task_id', 0))
+            continue
+          tasks.setdefault(fields['task_id'], {}).update(fields)
+    except (IOError, OSError):
+      return {}
+    self.max_task_id = max([max_task_id] + list(tasks.keys()))
+    tasks = dict([(task_id, fields) for task_id, fields in tasks.items()
+                  if not fields.get('cleared')])
+    return tasks
+
+  def needs_compacting(self, tasks):
+    """ True if the last load() read many more lines than tasks """
+    return self.n_lines > 4 * len(tasks) + 16
+
+  def compact(self, tasks):
+    """ Rewrite the journal with one line per task (from load()).
+
+    Records appended by run_wrapper.py between load() and the rename would
+    be lost, so only call this while no run of the journal is alive.
+    """
+    temp_path = self.path + '.tmp'
+    with self.lock:
+      try:
+        with open(temp_path, 'w') as f:
+          f.write(json.dumps({'max_task_id': self.max_task_id}) + '\n')
+          for task_id in sorted(tasks):
+            f.write(json.dumps(tasks[task_id], sort_keys=True) + '\n')
+        os.rename(temp_path, self.path)
+      except (IOError, OSError):
+        pass
+
+
+def pid_alive(pid, name=None):
+  """ True if process pid exists (and, where /proc is available, its command line contains name) """
+  try:
+    os.kill(pid, 0)
+  except OSError as err:
+    if err.errno != errno.EPERM:
+      return False
+  if name:
+    try:
+      with open('/proc/%d/cmdline' % pid, 'rb') as f:
+        return name.encode() in f.read()
+    except (IOError, OSError):
+      pass
+  return True
+
+
+class LocalExecutor:
+  """ Run tasks on this machine, each under its own run_wrapper.py """
+
+  # Resource policies apply to tasks of this executor
+  local = True
+
+  def spawn(self, queue, task):
+    wrapper_args = [queue.python_exec, queue.run_wrapper, task['wd']]
+    if task['journal'] != None:
+      # The wrapper records its final status even if Blender is gone by then
+      wrapper_args += [task['journal'].path, str(task['task_id'])]
+    env = None
+    if queue.policy != None:
+      # The wrapper applies the limits to itself before it starts MCell
+      env = dict(os.environ)
+      env[resources_env] = json.dumps(queue.policy.task_spec(task['cores']))
+    return sp.Popen(wrapper_args, bufsize=1, shell=False, stdin=sp.PIPE, stdout=sp.PIPE, stderr=sp.PIPE, env=env)
+
+
+# Worker daemon protocol (see sim_worker.py). Every message is one line of
+# JSON, followed by 'size' bytes of payload if the header has a size.
+#
+#   worker: challenge {nonce}
+#   client: run {task_id, cmd, args, files: {name: hash}, auth}
+#           (auth is worker_auth(token, nonce) of the shared token)
+#   worker: need {hashes}          client: blob {hash, size} + data (each)
+#   worker: started {pid}, out {stream, size} + data, status {peak_rss},
+#           file {path, size} + data (outputs), exit {rc}
+#   client: kill (at any time after run)
+
+worker_port = 7467
+
+# Environment variable which holds the shared worker token
+worker_token_env = 'CELLBLENDER_WORKER_TOKEN'
+
+
+def worker_auth(token, nonce):
+  """ Answer to a worker challenge: HMAC-SHA256 of nonce keyed with token """
+  return hmac.new(token.encode(), nonce.encode(), hashlib.sha256).hexdigest()
+
+
+def send_message(sock, header, payload=b''):
+  if payload:
+    header['size'] = len(payload)
+  sock.sendall(json.dumps(header).encode() + b'\n' + payload)
+
+
+def recv_message(rfile):
+  """ Return (header, payload) of the next message, or (None, b'') at the end """
+  line = rfile.readline()
+  if not line:
+    return (None, b'')
+  header = json.loads(line.decode())
+  payload = b''
+  if header.get('size'):
+    payload = rfile.read(header['size'])
+    if len(payload) != header['size']:
+      return (None, b'')
+  return (header, payload)
+
+
+def content_hash(data):
+  return hashlib.sha256(data).hexdigest()
+
+
+def staged_file_names(wd):
+  """ Files of a project directory sent to workers: the top level files
+  except hidden ones and journals (outputs live in subdirectories) """
+  names = []
+  for name in sorted(os.listdir(wd)):
+    if name.startswith('.') or name.endswith('.jsonl'):
+      continue
+    if os.path.isfile(os.path.join(wd, name)):
+      names.append(name)
+  return names
+
+
+def safe_relpath(path):
+  """ path if it is relative and stays inside its base directory, else None """
+  path = os.path.normpath(path)
+  if os.path.isabs(path) or (path == '..') or path.startswith('..' + os.sep):
+    return None
+  return path
+
+
+class _NullInput:
+  """ Stands in for the stdin pipe of a wrapper (remote tasks get their command with the run message) """
+  def write(self, data):
+    pass
+  def flush(self):
+    pass
+  def close(self):
+    pass
+
+
+class RemoteProcess:
+  """ Popen-like handle of a task running on a worker daemon.
+
+  The output the worker streams back is written into local pipes, so
+  OutputQueue and OutputMultiplexer read it like the output of a wrapper
+  process. Output files are written into the task's working directory when
+  the run ends. pid is None (there is no local process).
+  """
+
+  def __init__(self, address, task, hash_cache, token, on_done=None, timeout=30.0):
+    self.address = address
+    self.token = token
+    self.on_done = on_done
+    self.pid = None
+    self.returncode = None
+    self.stdin = _NullInput()
+    self.sock = socket.create_connection(address, timeout)
+    self.sock.settimeout(None)
+    self.send_lock = threading.Lock()
+    self.hash_cache = hash_cache
+    self.progress = task['progress']
+    out_r, self.out_w = os.pipe()
+    err_r, self.err_w = os.pipe()
+    self.stdout = os.fdopen(out_r, 'rb')
+    self.stderr = os.fdopen(err_r, 'rb')
+    self.done = threading.Event()
+    self.thread = threading.Thread(target=self.session, args=(task,), name='remote_%d' % task['task_id'])
+    self.thread.daemon = True
+    self.thread.start()
+
+  def file_hash(self, path):
+    st = os.stat(path)
+    key = (path, st.st_mtime, st.st_size)
+    if key not in self.hash_cache:
+      with open(path, 'rb') as f:
+        self.hash_cache[key] = content_hash(f.read())
+    return self.hash_cache[key]
+
+  def send(self, header, payload=b''):
+    with self.send_lock:
+      send_message(self.sock, header, payload)
+
+  def session(self, task):
+    wd = task['wd']
+    rc = 2
+    try:
+      files = dict([(name, self.file_hash(os.path.join(wd, name)))
+                    for name in staged_file_names(wd)])
+      rfile = self.sock.makefile('rb')
+      challenge, payload = recv_message(rfile)
+      if (challenge is None) or (challenge.get('op') != 'challenge'):
+        raise ValueError('no challenge from the worker')
+      self.send({'op': 'run', 'task_id': task['task_id'], 'cmd': task['cmd'],
+                 'args': task['args'], 'files': files,
+                 'auth': worker_auth(self.token, challenge['nonce'])})
+      paths = dict([(h, name) for name, h in files.items()])
+      while True:
+        header, payload = recv_message(rfile)
+        if header is None:
+          os.write(self.err_w, ('Lost connection to worker %s:%d\n' % self.address).encode())
+          break
+        op = header['op']
+        if op == 'need':
+          for h in header['hashes']:
+            with open(os.path.join(wd, paths[h]), 'rb') as f:
+              self.send({'op': 'blob', 'hash': h}, f.read())
+        elif op == 'out':
+          os.write(self.out_w if header['stream'] == 1 else self.err_w, payload)
+        elif op == 'status':
+          self.progress.peak_rss = max(self.progress.peak_rss, header.get('peak_rss', 0))
+        elif op == 'file':
+          path = safe_relpath(header['path'])
+          if path != None:
+            path = os.path.join(wd, path)
+            if not os.path.isdir(os.path.dirname(path)):
+              os.makedirs(os.path.dirname(path))
+            with open(path + '.part', 'wb') as f:
+              f.write(payload)
+            os.rename(path + '.part', path)
+        elif op == 'exit':
+          rc = abs(header['rc'])
+          break
+      rfile.close()
+    except (IOError, OSError, ValueError, KeyError) as err:
+      try:
+        os.write(self.err_w, ('Worker %s:%d: %s\n' % (self.address + (err,))).encode())
+      except OSError:
+        pass
+    finally:
+      self.returncode = rc
+      self.sock.close()
+      os.close(self.out_w)
+      os.close(self.err_w)
+      self.done.set()
+      if self.on_done != None:
+        self.on_done()
+
+  def poll(self):
+    return self.returncode if self.done.is_set() else None
+
+  def wait(self):
+    self.done.wait()
+    return self.returncode
+
+  def terminate(self):
+    try:
+      self.send({'op': 'kill'})
+    except (IOError, OSError):
+      pass
+
+  def kill(self):
+    self.terminate()
+
+  def send_signal(self, signum):
+    self.terminate()
+
+
+class RemoteExecutor:
+  """ Run tasks on worker daemons (sim_worker.py) on other hosts.
+
+  addresses is a list of (host, port) pairs. Each task goes to the worker
+  with the fewest tasks of this queue, and the files of its working
+  directory are staged by content hash, so a worker receives every version
+  of a file only once. token is the secret shared with the workers
+  (default: the worker_token_env environment variable).
+  """
+
+  # Workers manage their own resources
+  local = False
+
+  def __init__(self, addresses, token=None):
+    self.addresses = list(addresses)
+    if not self.addresses:
+      raise ValueError('No worker addresses given')
+    self.token = token or os.environ.get(worker_token_env, '')
+    if not self.token:
+      raise ValueError('No worker token given (set %s)' % worker_token_env)
+    self.active = dict([(address, 0) for address in self.addresses])
+    self.lock = threading.Lock()
+    self.hash_cache = {}
+
+  @staticmethod
+  def parse_addresses(text):
+    """ Parse "host[:port] host[:port] ..." """
+    addresses = []
+    for item in text.replace(',', ' ').split():
+      host, sep, port = item.rpartition(':')
+      if not sep:
+        host, port = item, worker_port
+      addresses.append((host, int(port)))
+    return addresses
+
+  def spawn(self, queue, task):
+    # Try the least busy worker first, and the others if it can't be reached
+    with self.lock:
+      addresses = sorted(self.addresses, key=lambda a: self.active[a])
+    for address in addresses:
+      with self.lock:
+        self.active[address] += 1
+      try:
+        return RemoteProcess(address, task, self.hash_cache, self.token,
+                             on_done=lambda: self.release(address))
+      except (IOError, OSError) as err:
+        self.release(address)
+        error = err
+    raise error
+
+  def release(self, address):
+    with self.lock:
+      self.active[address] -= 1
+
+
+class RunStatusTable:
+  """ Status of runs by key with counts by status and per run timings.
+
+  The table is updated when a run changes state, either by the code which
+  runs it or, for processes registered with watch(), by a thread blocked in
+  the process's wait(). Drawing code only reads it, so a redraw never polls
+  processes.
+  """
+
+  finished_states = ('completed', 'mcell_error', 'died')
+
+  def __init__(self):
+    self.lock = threading.Lock()
+    self.entries = {}
+    self.counts = {}
+    self.watched = {}
+    self.next_key = 1
+
+  def set_status(self, key, status, rc=None):
+    with self.lock:
+      self.update_entry(key, status, rc)
+
+  def update_entry(self, key, status, rc):
+    """ set_status with the lock held """
+    now = time.time()
+    entry = self.entries.get(key)
+    if entry is None:
+      entry = {'status': None, 'added_time': now, 'start_time': None, 'end_time': None, 'rc': None}
+      self.entries[key] = entry
+      self.next_key = max(self.next_key, key + 1)
+    if rc != None:
+      entry['rc'] = rc
+    if entry['status'] == status:
+      return
+    if entry['status'] != None:
+      self.counts[entry['status']] -= 1
+    self.counts[status] = self.counts.get(status, 0) + 1
+    entry['status'] = status
+    if (status == 'running') and (entry['start_time'] is None):
+      entry['start_time'] = now
+    if status in self.finished_states:
+      entry['end_time'] = now
+
+  def get(self, key):
+    """ The entry of key (a dict with status, added_time, start_time, end_time and rc) or None """
+    return self.entries.get(key)
+
+  def status(self, key, default=None):
+    entry = self.entries.get(key)
+    return default if entry is None else entry['status']
+
+  def count(self, *states):
+    return sum([self.counts.get(state, 0) for state in states])
+
+  def counts_snapshot(self):
+    with self.lock:
+      return dict([(state, n) for state, n in self.counts.items() if n])
+
+  def elapsed(self, key):
+    """ Seconds the run has been (or was) running, None if it hasn't started """
+    entry = self.entries.get(key)
+    if (entry is None) or (entry['start_time'] is None):
+      return None
+    return (entry['end_time'] or time.time()) - entry['start_time']
+
+  def remove(self, key):
+    with self.lock:
+      entry = self.entries.pop(key, None)
+      if entry != None:
+        self.counts[entry['status']] -= 1
+      self.watched.pop(key, None)
+
+  def watch(self, proc):
+    """ Add a running process and return its key. Its status becomes
+    'completed' or 'died' (by return code) when it exits. """
+    with self.lock:
+      key = self.next_key
+      self.update_entry(key, 'running', None)
+      self.watched[key] = proc
+    waiter = threading.Thread(target=self.wait_for, args=(key, proc), name='run_status_%d' % key)
+    waiter.daemon = True
+    waiter.start()
+    return key
+
+  def wait_for(self, key, proc):
+    """ Block until proc exits, then record its status (unless removed meanwhile) """
+    rc = proc.wait()
+    with self.lock:
+      if (self.watched.pop(key, None) is not None) and (key in self.entries):
+        self.update_entry(key, 'completed' if rc == 0 else 'died', rc)
+
+
 class SimQueue:
+  """ Run queued MCell tasks on a pool of worker threads.
+
+  Tasks are kept as plain descriptors in task_dict (keyed by a task id) until
+  a worker picks them up, and only then is run_wrapper.py started for them.
+  No more than max_procs wrapper processes are alive at any time.
+
+  With a JobJournal (see open_journal) every status change is recorded in
+  the project directory, so the tasks can be restored in a later session.
+
+  A ResourcePolicy (see set_policy) can pin local tasks to cores, limit
+  their memory and niceness, and hold tasks back while memory is short.
+
+  Tasks are started by the executor: a LocalExecutor by default, or a
+  RemoteExecutor to run them on worker daemons (see set_executor). With a
+  run cache (see set_run_cache) a task whose inputs match an earlier
+  completed run is added as completed with that run's results.
+  """
+
   def __init__(self):
     self.work_q = Queue(maxsize=0)
     self.workers = []
     self.task_dict = {}
+    self.next_task_id = 1
     self.n_threads = 0
+    self.max_procs = 0
+    self.n_procs = 0
+    self.procs_cv = threading.Condition()
+    self.task_lock = threading.Lock()
     self.evnt_bl_text_quit = threading.Event()
     self.python_exec = 'python'
     module_dir_path = os.path.dirname(os.path.realpath(__file__))
     module_file_path = os.path.join(module_dir_path, 'run_wrapper.py')
     self.run_wrapper = module_file_path
     self.notify = False
+    self.output_mux = OutputMultiplexer() if mux_supported else None
+    self.journal = None
+    self.resumable = []
+    self.reattached = []
+    self.watch_thread = None
+    self.executor = LocalExecutor()
+    self.run_cache = None
+    self.policy = None
+    self.status_table = RunStatusTable()
+
+  def set_executor(self, executor):
+    """ Start the tasks queued from now on with executor """
+    self.executor = executor
+
+  def set_policy(self, policy):
+    """ Pin, limit and admit local tasks according to policy (a ResourcePolicy, or None) """
+    with self.procs_cv:
+      if (policy != None) and (self.policy != None) and (policy.settings == self.policy.settings):
+        # Keep the current one, which knows which cores are in use
+        return
+      self.policy = policy
+      self.procs_cv.notify_all()
+
+  def set_run_cache(self, run_cache):
+    """ Reuse the results of earlier identical runs from run_cache (a
+    run_cache.RunCache, or None to always run) for tasks added from now on.
+    Only tasks with 'mdl' and 'seed' in their info are cached. """
+    self.run_cache = run_cache
 
   def start(self,n_threads):
+    # Lowering the thread count only takes effect once the queue drains,
+    # but the process limit applies right away
+    with self.procs_cv:
+      self.max_procs = n_threads
+      self.procs_cv.notify_all()
     if n_threads > self.n_threads:
       for i in range(n_threads - self.n_threads):
         worker = threading.Thread(target=self.run_q_item, name=str(i))
@@ -133,79 +994,321 @@ class SimQueue:
         self.work_q.task_done()
         break
 
+      # Wait for a free process slot, then start the wrapper unless the task
+      # was killed in the meantime
+      with self.procs_cv:
+        while ((self.n_procs >= self.max_procs) or not self.admit()) and not self.evnt_bl_text_quit.isSet():
+          self.procs_cv.wait(None if self.policy is None else self.policy.poll_interval)
+        self.n_procs += 1
+        task['cores'] = None
+        if (self.policy != None) and self.executor.local:
+          task['cores'] = self.policy.acquire_cores()
+      with self.task_lock:
+        if task['status'] == 'queued':
+          try:
+            task['process'] = self.executor.spawn(self, task)
+            self.set_status(task, 'running')
+            self.record(task, pid=task['process'].pid, status='running')
+          except OSError as err:
+            task['stderr'] = str(err)
+            self.set_status(task, 'died')
+            self.record(task, status='died')
+      if task['status'] != 'running':
+        self.release_proc_slot(task)
+        self.work_q.task_done()
+        continue
+
       process = task['process']
       pid = process.pid
+      task['pid'] = pid
       cmd = task['cmd']
       args = task['args']
       bl_t = task['bl_text']
       if self.notify:
         sys.stdout.write('Starting PID {0} {1}\n'.format(pid, cmd))
-      out_q = OutputQueue()
+      if self.output_mux != None:
+        out_q = self.output_mux
+      else:
+        out_q = OutputQueue()
 #      sys.stdout.write('sending:  {0}\n'.format(cmd).encode().decode())
-      task['status'] = 'running'
-      rc, res = out_q.run_proc(process, arg_in=[cmd, args], passthrough=self.notify, bl_text=bl_t, e_bl_text_quit=self.evnt_bl_text_quit)
-      self.task_dict[pid]['stdout'] = res[0]
-      self.task_dict[pid]['stderr'] = res[1]
-#      self.task_dict[pid]['text'].write(res[0])
-#      self.task_dict[pid]['text'].write(res[1])
+      progress = task['progress']
+      progress.start_time = time.time()
+      rc, res = out_q.run_proc(process, arg_in=[cmd, args], passthrough=self.notify, bl_text=bl_t, e_bl_text_quit=self.evnt_bl_text_quit, progress=progress)
+      progress.end_time = time.time()
+      self.release_proc_slot(task)
+      task['stdout'] = res[0]
+      task['stderr'] = res[1]
+#      task['text'].write(res[0])
+#      task['text'].write(res[1])
       if task['status'] != 'died':
-        if rc == 0:
-          task['status'] = 'completed'
-        elif rc == 1:
-          task['status'] = 'mcell_error'
-        else:
-          task['status'] = 'died'
+        self.set_status(task, status_from_returncode(rc), rc)
+      self.record(task, status=task['status'], rc=rc)
+      if (task['status'] == 'completed') and (self.run_cache != None) and task['info'].get('cache_key'):
+        self.run_cache.store(task['info']['cache_key'], task['wd'], task['info']['outputs'])
       if self.notify:
         sys.stdout.write('Task PID {0}  status: {1}  return code: {2}\n'.format(pid, task['status'], rc))
       self.work_q.task_done()
     sys.stdout.write('Worker thread %s exiting\n' % (threading.currentThread().getName()))
 
+  def progress_summary(self):
+    """ Combine the progress of all tasks into one line of text.
+
+    The sweep ETA assumes queued tasks run as many iterations as the known
+    ones and that the current combined rate of the running tasks holds.
+    """
+    counts = self.status_table.counts_snapshot()
+    done = 0
+    remaining = 0
+    totals = []
+    rate = 0.0
+    n_unknown = 0
+    for task in list(self.task_dict.values()):
+      status = task['status']
+      progress = task['progress']
+      if progress.total_iterations:
+        totals.append(progress.total_iterations)
+      if status == 'running':
+        rate += progress.rate
+      if status in ('running', 'queued'):
+        if progress.total_iterations:
+          done += progress.iteration
+          remaining += progress.total_iterations - progress.iteration
+        else:
+          n_unknown += 1
+      elif progress.total_iterations:
+        done += progress.total_iterations
+    if totals:
+      remaining += n_unknown * (sum(totals) / len(totals))
+
+    parts = ['%d %s' % (counts[status], status) for status in
+             ('running', 'queued', 'completed', 'mcell_error', 'died')
+             if counts.get(status)]
+    if done + remaining > 0:
+      parts.append('%d%%' % (100.0 * done / (done + remaining)))
+    if rate > 0.0:
+      parts.append('%.0f it/s' % rate)
+      if remaining > 0:
+        parts.append('ETA %s' % format_duration(remaining / rate))
+    return ', '.join(parts)
+
   def clear_queue(self):
     with self.work_q.mutex:
       self.work_q.queue.clear()
 
-  def add_task(self,cmd,args,wd):
+  def admit(self):
+    """ True if the resource policy lets one more task start (procs_cv must be held) """
+    if (self.policy is None) or (not self.executor.local) or (self.n_procs == 0):
+      return True
+    tasks = list(self.task_dict.values())
+    return self.policy.admit([t['progress'] for t in tasks if t['status'] == 'running'],
+                             [t['progress'] for t in tasks])
+
+  def release_proc_slot(self, task):
+    with self.procs_cv:
+      if self.policy != None:
+        self.policy.release_cores(task.get('cores'))
+      task['cores'] = None
+      self.n_procs -= 1
+      self.procs_cv.notify()
+
+  def set_status(self, task, status, rc=None):
+    task['status'] = status
+    self.status_table.set_status(task['task_id'], status, rc)
+
+  def record(self, task, **fields):
+    # Through the journal the task was created with, which stays the same
+    # when another project's journal is opened later
+    if task['journal'] != None:
+      task['journal'].record(task['task_id'], **fields)
+
+  def new_task(self, task_id, cmd, args, wd, info, status):
     import bpy
-    process = sp.Popen([self.python_exec, self.run_wrapper, wd], bufsize=1, shell=False, stdin=sp.PIPE, stdout=sp.PIPE, stderr=sp.PIPE)
-    pid = process.pid
-    self.task_dict[pid] = {}
-    self.task_dict[pid]['process'] = process
-    self.task_dict[pid]['cmd'] = cmd
-    self.task_dict[pid]['args'] = args
-    self.task_dict[pid]['status'] = 'queued'
-    self.task_dict[pid]['stdout'] = b''
-    self.task_dict[pid]['stderr'] = b''
-    bpy.ops.text.new()
-    bl_t = bpy.data.texts[-1]
-    bl_t.name = 'task_%d_output' % pid
-    self.task_dict[pid]['bl_text'] = bl_t
-    self.work_q.put(self.task_dict[pid])
-    return process
-
-  def kill_task(self,pid):
-    if self.task_dict.get(pid):
-      task = self.task_dict[pid]
-      if task['status'] == 'running':
-        proc = task['process']
-        proc.terminate()
-        task['status'] = 'died'
-      elif task['status'] == 'queued':
-        with self.work_q.mutex:
-          self.work_q.queue.remove(task)
-        proc = task['process']
-        proc.terminate()
-        task['status'] = 'died'
-        self.work_q.task_done()
+    task = {}
+    task['task_id'] = task_id
+    task['process'] = None
+    task['pid'] = None
+    task['cmd'] = cmd
+    task['args'] = args
+    task['wd'] = wd
+    task['info'] = info
+    task['journal'] = self.journal
+    task['stdout'] = b''
+    task['stderr'] = b''
+    task['progress'] = TaskProgress()
+    bl_t = bpy.data.texts.get('task_%d_output' % task_id)
+    if bl_t is None:
+      bl_t = bpy.data.texts.new('task_%d_output' % task_id)
+    task['bl_text'] = bl_t
+    self.task_dict[task_id] = task
+    self.set_status(task, status)
+    return task
+
+  def add_task(self,cmd,args,wd,info=None):
+    """ Queue a task and return its task id (the key in task_dict).
+
+    The wrapper process is started when a worker picks the task up, so
+    'process' and 'pid' are None while the task is queued. info is a small
+    JSON-serializable dict kept with the task (e.g. the MDL file and seed).
+    """
+    task_id = self.next_task_id
+    self.next_task_id += 1
+    info = dict(info or {})
+    info.pop('cached', None)
+    if (self.run_cache != None) and ('mdl' in info) and ('seed' in info):
+      key, outputs = self.run_cache.task_key(cmd, args, wd, info['mdl'], info['seed'])
+      if key != None:
+        info['cache_key'] = key
+        info['outputs'] = outputs
+        try:
+          if self.run_cache.restore(key, wd, outputs):
+            # Same inputs as an earlier run, so reuse its results
+            info['cached'] = True
+            task = self.new_task(task_id, cmd, args, wd, info, 'completed')
+            self.record(task, cmd=cmd, args=args, wd=wd, info=info, status='completed', rc=0)
+            return task_id
+        except (IOError, OSError):
+          pass
+    task = self.new_task(task_id, cmd, args, wd, info, 'queued')
+    self.record(task, cmd=cmd, args=args, wd=wd, info=task['info'], status='queued')
+    self.work_q.put(task)
+    return task_id
+
+  def open_journal(self, path):
+    """ Use the journal at path and restore its tasks if the queue is empty.
+
+    Runs still alive from an earlier session are reattached (shown as
+    running until their process exits), runs whose process is gone without
+    a final record are marked 'died'. Tasks which were queued, died or
+    failed are listed in self.resumable for resume_tasks(). Returns the ids
+    of the restored tasks in order.
+
+    Tasks already in the queue keep writing to the journal they were created
+    with. The journal is compacted here, and only when none of its runs is
+    alive.
+    """
+    if (self.journal != None) and (self.journal.path == path):
+      return []
+    self.journal = JobJournal(path)
+    tasks = self.journal.load()
+    # New tasks must not reuse ids of this journal (cleared ones included),
+    # even when its tasks are not restored, or they would pick up the old
+    # records' fields
+    self.next_task_id = max(self.next_task_id, self.journal.max_task_id + 1)
+    if self.task_dict:
+      return []
+
+    self.resumable = []
+    restored = []
+    for task_id in sorted(tasks):
+      fields = tasks[task_id]
+      status = fields.get('status', 'died')
+      if status == 'running':
+        if fields.get('pid') and pid_alive(fields['pid'], 'run_wrapper'):
+          self.reattached.append(task_id)
+        else:
+          status = 'died'
+          self.journal.record(task_id, status=status)
+      elif status == 'queued':
+        # Queued tasks did not survive the previous session
+        status = 'died'
+        self.journal.record(task_id, status=status)
+      task = self.new_task(task_id, fields.get('cmd', ''), fields.get('args', ''),
+                           fields.get('wd', ''), fields.get('info', {}), status)
+      task['pid'] = fields.get('pid')
+      if status in ('mcell_error', 'died'):
+        self.resumable.append(task_id)
+      restored.append(task_id)
+      self.next_task_id = max(self.next_task_id, task_id + 1)
 
-  def clear_task(self,pid):
+    if (not self.reattached) and self.journal.needs_compacting(tasks):
+      self.journal.compact(self.journal.load())
+
+    if self.reattached and (self.watch_thread is None):
+      self.watch_thread = threading.Thread(target=self.watch_reattached, name='reattached')
+      self.watch_thread.daemon = True
+      self.watch_thread.start()
+    return restored
+
+  def watch_reattached(self):
+    """ Wait for reattached runs to end and take their status from the journal """
+    while self.reattached and not self.evnt_bl_text_quit.isSet():
+      time.sleep(2.0)
+      for task_id in list(self.reattached):
+        task = self.task_dict.get(task_id)
+        if (task != None) and pid_alive(task['pid'], 'run_wrapper'):
+          continue
+        self.reattached.remove(task_id)
+        if task == None:
+          continue
+        fields = task['journal'].load().get(task_id, {})
+        status = fields.get('status', 'died')
+        if status == 'running':
+          status = 'died'
+          self.record(task, status=status)
+        self.set_status(task, status)
+        if status != 'completed':
+          self.resumable.append(task_id)
+    self.watch_thread = None
+
+  def resume_tasks(self, task_ids=None):
+    """ Queue the given (default: all resumable) tasks again.
+
+    The old tasks are cleared and a list of (new task id, info) is returned.
+    """
+    if task_ids is None:
+      task_ids = list(self.resumable)
+    resumed = []
+    for task_id in task_ids:
+      task = self.task_dict.get(task_id)
+      if (task == None) or (task['status'] not in ('mcell_error', 'died')):
+        continue
+      new_id = self.add_task(task['cmd'], task['args'], task['wd'], task['info'])
+      self.clear_task(task_id)
+      resumed.append((new_id, self.task_dict[new_id]['info']))
+    return resumed
+
+  def dequeue_task(self, task):
+    """ Take a queued task out of the work queue (task_lock must be held) """
+    self.set_status(task, 'died')
+    self.record(task, status='died')
+    try:
+      with self.work_q.mutex:
+        self.work_q.queue.remove(task)
+    except ValueError:
+      # A worker already took it and will skip it
+      return
+    self.work_q.task_done()
+
+  def kill_task(self,task_id):
+    if self.task_dict.get(task_id):
+      task = self.task_dict[task_id]
+      with self.task_lock:
+        if task['status'] == 'running':
+          proc = task['process']
+          if proc != None:
+            proc.terminate()
+          else:
+            # Reattached from an earlier session
+            os.kill(task['pid'], signal.SIGTERM)
+          self.set_status(task, 'died')
+          self.record(task, status='died')
+        elif task['status'] == 'queued':
+          self.dequeue_task(task)
+
+  def clear_task(self,task_id):
     import bpy
-    if self.task_dict.get(pid):
-      if bpy.data.texts.get(self.task_dict[pid]['bl_text'].name):
-        bpy.data.texts.remove(self.task_dict[pid]['bl_text'])
-      self.task_dict.pop(pid)
+    if self.task_dict.get(task_id):
+      if bpy.data.texts.get(self.task_dict[task_id]['bl_text'].name):
+        bpy.data.texts.remove(self.task_dict[task_id]['bl_text'])
+      self.record(self.task_dict.pop(task_id), cleared=True)
+      self.status_table.remove(task_id)
+      if task_id in self.resumable:
+        self.resumable.remove(task_id)
 
   def shutdown(self):
     self.evnt_bl_text_quit.set()
+    with self.procs_cv:
+      self.procs_cv.notify_all()
 
     sys.stdout.write("Shutting down simulation queue...\n")
 
@@ -214,26 +1317,24 @@ class SimQueue:
       sys.stdout.write('Stopping thread %s\n' % (self.workers[i].getName()))
       self.work_q.put(None)
 
-    pids = list(self.task_dict.keys())
+    task_ids = list(self.task_dict.keys())
 
-    # Dequeue waiting tasks
-    for pid in pids:
-      task = self.task_dict[pid]
-      if task['status'] == 'queued':
-        with self.work_q.mutex:
-          self.work_q.queue.remove(task)
-        proc = task['process']
-        proc.terminate()
-        task['status'] = 'died'
-        self.work_q.task_done()
+    # Dequeue waiting tasks (they have no process yet)
+    with self.task_lock:
+      for task_id in task_ids:
+        task = self.task_dict[task_id]
+        if task['status'] == 'queued':
+          self.dequeue_task(task)
 
-    # Terminate running tasks
-    for pid in pids:
-      task = self.task_dict[pid]
-      if task['status'] == 'running':
+    # Terminate running tasks (runs reattached from an earlier session are
+    # left alone and will be reattached again)
+    for task_id in task_ids:
+      task = self.task_dict[task_id]
+      if (task['status'] == 'running') and (task['process'] != None):
         proc = task['process']
         proc.terminate()
-        task['status'] = 'died'
+        self.set_status(task, 'died')
+        self.record(task, status='died')
 
     # Now wait for workers to finish and exit
     sys.stdout.write('Waiting for simulation threads to exit...\n')
@@ -270,24 +1371,24 @@ if (__name__ == '__main__'):
   begin = time.time()
 
   wd = './sim_runner_test_files/mcell'
-  my_q.add_task('mcell3.2.1 -iterations 5000 -seed 1 Scene.main.mdl',wd)
-  my_q.add_task('mcell3.2.1 -iterations 5000 -seed 2 Scene.main.mdl',wd)
-  my_q.add_task('mcell3.2.1 -iterations 5000 -seed 3 Scene.main.mdl',wd)
-  my_q.add_task('mcell3.2.1 -iterations 5000 -seed 4 Scene.main.mdl',wd)
+  my_q.add_task('mcell3.2.1','-iterations 5000 -seed 1 Scene.main.mdl',wd)
+  my_q.add_task('mcell3.2.1','-iterations 5000 -seed 2 Scene.main.mdl',wd)
+  my_q.add_task('mcell3.2.1','-iterations 5000 -seed 3 Scene.main.mdl',wd)
+  my_q.add_task('mcell3.2.1','-iterations 5000 -seed 4 Scene.main.mdl',wd)
 
   time.sleep(5.)
 
-  pids = list(my_q.task_dict.keys())
-  pids.sort()
-  a_pid = pids[2]
-  my_q.task_dict[a_pid]['process'].terminate()
+  task_ids = list(my_q.task_dict.keys())
+  task_ids.sort()
+  a_task_id = task_ids[2]
+  my_q.kill_task(a_task_id)
 
   my_q.work_q.join()
 
 #  time.sleep(0.5)
 
-#  sys.stdout.write(my_q.task_dict[a_pid]['stdout'])
-#  sys.stdout.write(my_q.task_dict[a_pid]['stderr'])
+#  sys.stdout.write(my_q.task_dict[a_task_id]['stdout'])
+#  sys.stdout.write(my_q.task_dict[a_task_id]['stderr'])
 
   sys.stdout.write('\n\nTook {0:0.2f} seconds.\n\n'.format(time.time() - begin))
 
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+
+"""
+Worker daemon which runs the MCell tasks of a CellBlender simulation queue
+on another machine (see RemoteExecutor in sim_runner_queue.py):
+
+  python sim_worker.py [--host HOST] [--port 7467] [--slots N] [--root DIR]
+                       [--token TOKEN] (--mcell PATH | --allow PATH ...)
+
+The project files of a task are kept in <root>/objects by content hash and
+linked into a fresh directory for the run, so each version of a file is
+transferred once. Output is streamed back while the task runs, and the
+files it created or changed are sent back when it ends.
+
+Clients must prove they know the token shared with the worker (--token or
+the CELLBLENDER_WORKER_TOKEN environment variable) by answering a challenge
+with its HMAC. With --mcell every task runs that binary instead of the one
+it names, otherwise only the executables given with --allow are run.
+Listening on localhost (the default) gives a loopback worker for testing.
+"""
+
+from sim_runner_queue import TaskProgress, send_message, recv_message, \
+  content_hash, worker_port, worker_token_env, worker_auth
+import sys
+import os
+import hmac
+import shutil
+import socketserver
+import subprocess as sp
+import tempfile
+import threading
+
+
+class ObjectStore:
+  """ Files by content hash below root """
+
+  def __init__(self, root):
+    self.root = root
+
+  def path(self, h):
+    return os.path.join(self.root, h[:2], h)
+
+  def has(self, h):
+    return os.path.exists(self.path(h))
+
+  def put(self, h, data):
+    path = self.path(h)
+    if not os.path.isdir(os.path.dirname(path)):
+      os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = '%s.%d.part' % (path, threading.get_ident())
+    with open(temp_path, 'wb') as f:
+      f.write(data)
+    # Stored files are linked into task directories, so keep them read only
+    os.chmod(temp_path, 0o444)
+    os.rename(temp_path, path)
+
+  def link(self, h, dest):
+    try:
+      os.link(self.path(h), dest)
+    except OSError:
+      shutil.copyfile(self.path(h), dest)
+
+
+def plain_file_name(name):
+  return (name not in ('', '.', '..')) and (os.path.basename(name) == name) \
+    and ('/' not in name) and ('\\' not in name)
+
+
+class WorkerHandler(socketserver.StreamRequestHandler):
+  """ One connection runs one task """
+
+  def send(self, header, payload=b''):
+    with self.send_lock:
+      send_message(self.request, header, payload)
+
+  def handle(self):
+    self.send_lock = threading.Lock()
+    server = self.server
+    nonce = os.urandom(16).hex()
+    self.send({'op': 'challenge', 'nonce': nonce})
+    header, payload = recv_message(self.rfile)
+    if (header is None) or (header.get('op') != 'run'):
+      return
+    if not hmac.compare_digest(str(header.get('auth', '')), worker_auth(server.token, nonce)):
+      self.refuse('Worker: wrong token\n')
+      return
+    if not server.allowed(header['cmd']):
+      self.refuse('Worker: %s is not allowed on this worker\n' % header['cmd'])
+      return
+    files = header['files']
+    if not all([plain_file_name(name) for name in files]):
+      self.send({'op': 'exit', 'rc': 2})
+      return
+
+    # Stage the files of the task
+    missing = sorted(set([h for h in files.values() if not server.store.has(h)]))
+    self.send({'op': 'need', 'hashes': missing})
+    for i in range(len(missing)):
+      blob, data = recv_message(self.rfile)
+      if (blob is None) or (blob.get('op') != 'blob') or (content_hash(data) != blob['hash']):
+        return
+      server.store.put(blob['hash'], data)
+    task_dir = tempfile.mkdtemp(prefix='task_%d_' % header['task_id'], dir=server.tasks_dir)
+    try:
+      for name, h in files.items():
+        server.store.link(h, os.path.join(task_dir, name))
+      with server.slots:
+        rc = self.run_task(header, task_dir)
+      self.send_outputs(task_dir, files)
+      self.send({'op': 'exit', 'rc': rc})
+    except (IOError, OSError) as err:
+      sys.stderr.write('Task %d: %s\n' % (header['task_id'], err))
+    finally:
+      if not server.keep:
+        shutil.rmtree(task_dir, ignore_errors=True)
+
+  def refuse(self, reason):
+    sys.stderr.write(reason)
+    self.send({'op': 'out', 'stream': 2}, reason.encode())
+    self.send({'op': 'exit', 'rc': 2})
+
+  def run_task(self, header, task_dir):
+    cmd = self.server.mcell or header['cmd']
+    try:
+      proc = sp.Popen([cmd] + header['args'].split(), cwd=task_dir,
+                      stdin=sp.DEVNULL, stdout=sp.PIPE, stderr=sp.PIPE)
+    except OSError as err:
+      self.send({'op': 'out', 'stream': 2}, ('%s: %s\n' % (cmd, err)).encode())
+      return 2
+    self.send({'op': 'started', 'pid': proc.pid})
+
+    def listen():
+      # A kill message, or the client going away, ends the run
+      while True:
+        try:
+          msg, data = recv_message(self.rfile)
+        except (IOError, OSError, ValueError):
+          msg = None
+        if (msg is None) or (msg.get('op') == 'kill'):
+          if proc.poll() is None:
+            proc.terminate()
+          return
+
+    def pump(pipe, stream):
+      for data in iter(lambda: os.read(pipe.fileno(), 65536), b''):
+        try:
+          self.send({'op': 'out', 'stream': stream}, data)
+        except (IOError, OSError):
+          if proc.poll() is None:
+            proc.terminate()
+      pipe.close()
+
+    threads = [threading.Thread(target=pump, args=(proc.stdout, 1)),
+               threading.Thread(target=pump, args=(proc.stderr, 2))]
+    listener = threading.Thread(target=listen)
+    listener.daemon = True
+    for t in threads + [listener]:
+      t.start()
+
+    progress = TaskProgress()
+    while True:
+      try:
+        proc.wait(timeout=2.0)
+        break
+      except sp.TimeoutExpired:
+        progress.sample_rss(proc.pid)
+        try:
+          self.send({'op': 'status', 'peak_rss': progress.peak_rss})
+        except (IOError, OSError):
+          proc.terminate()
+    for t in threads:
+      t.join()
+    return proc.returncode
+
+  def send_outputs(self, task_dir, files):
+    """ Send the files the run created or changed """
+    for dir_path, dir_names, file_names in os.walk(task_dir):
+      dir_names.sort()
+      for name in sorted(file_names):
+        path = os.path.join(dir_path, name)
+        rel_path = os.path.relpath(path, task_dir)
+        with open(path, 'rb') as f:
+          data = f.read()
+        if (rel_path in files) and (content_hash(data) == files[rel_path]):
+          continue
+        self.send({'op': 'file', 'path': rel_path.replace(os.sep, '/')}, data)
+
+
+class WorkerServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+  daemon_threads = True
+  allow_reuse_address = True
+
+  def __init__(self, address, root, slots, token, mcell=None, allow=(), keep=False):
+    if not token:
+      raise ValueError('A worker needs a token')
+    if not (mcell or allow):
+      raise ValueError('A worker needs an MCell binary or allowed executables')
+    socketserver.TCPServer.__init__(self, address, WorkerHandler)
+    self.token = token
+    self.allow = set([os.path.realpath(path) for path in allow])
+    self.store = ObjectStore(os.path.join(root, 'objects'))
+    self.tasks_dir = os.path.join(root, 'tasks')
+    if not os.path.isdir(self.tasks_dir):
+      os.makedirs(self.tasks_dir)
+    self.slots = threading.Semaphore(slots)
+    self.mcell = mcell
+    self.keep = keep
+
+  def allowed(self, cmd):
+    """ True if a task may run cmd (a pinned binary replaces any cmd) """
+    return bool(self.mcell) or (os.path.realpath(cmd) in self.allow)
+
+
+if __name__ == '__main__':
+  import multiprocessing
+  from argparse import ArgumentParser
+
+  parser = ArgumentParser()
+  parser.add_argument('--host', default='localhost', help='address to listen on (default: localhost)')
+  parser.add_argument('--port', type=int, default=worker_port)
+  parser.add_argument('--slots', type=int, default=multiprocessing.cpu_count(), help='number of simultaneous runs')
+  parser.add_argument('--root', default=os.path.join(tempfile.gettempdir(), 'cellblender_worker'), help='directory for staged files and runs')
+  parser.add_argument('--token', default=os.environ.get(worker_token_env), help='secret shared with the clients (default: $%s)' % worker_token_env)
+  parser.add_argument('--mcell', help='MCell binary to run for every task')
+  parser.add_argument('--allow', action='append', default=[], help='executable tasks may run (if --mcell is not given)')
+  parser.add_argument('--keep', action='store_true', help='keep the task directories')
+  ns = parser.parse_args()
+  if not ns.token:
+    parser.error('a token is required (--token or %s)' % worker_token_env)
+  if not (ns.mcell or ns.allow):
+    parser.error('--mcell or --allow is required')
+
+  server = WorkerServer((ns.host, ns.port), ns.root, ns.slots, ns.token, ns.mcell, ns.allow, ns.keep)
+  sys.stdout.write('Worker listening on %s:%d with %d slots\n' % (ns.host, ns.port, ns.slots))
+  sys.stdout.flush()
+  try:
+    server.serve_forever()
+  except KeyboardInterrupt:
+    pass
+  server.server_close()
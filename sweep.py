@@ -0,0 +1,159 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# <pep8 compliant>
+
+"""
+This module builds parameter sweep designs and the MDL variants of a sweep
+without depending on Blender.
+
+A design is a list of points, each an ordered dictionary mapping parameter
+names to values. Every point gets a name (see point_name) which is used for
+its MDL files and for its output directories, react_data/<point>/seed_* and
+viz_data/<point>/seed_*.
+
+A sweep is exported in the modular format. Only the sections which differ
+between points (VARIANT_SECTIONS) are written per point. Every point main
+MDL file includes the shared files for all the other sections.
+"""
+
+import collections
+import itertools
+import json
+import os
+import random
+
+
+# Sections written per point. The parameters differ by definition and the
+# output sections name the output directories.
+VARIANT_SECTIONS = ['parameters', 'viz_output', 'rxn_output']
+
+MANIFEST_NAME = "sweep_manifest.json"
+
+# Output paths as written by the MDL exporter
+_output_prefixes = ['"./react_data/seed_"', '"./viz_data/seed_"']
+
+
+def linspace(start, stop, n_values):
+    """ n_values evenly spaced values from start to stop (inclusive) """
+    if n_values <= 1:
+        return [start]
+    step = (stop - start) / float(n_values - 1)
+    return [start + i * step for i in range(n_values)]
+
+
+def grid_design(axes):
+    """ Full factorial design.
+
+    axes is a list of (name, values) pairs. Every combination of values is
+    a point, with the last axis varying fastest.
+
+    """
+    names = [name for name, values in axes]
+    return [collections.OrderedDict(zip(names, combination))
+            for combination in itertools.product(*[values for name, values in axes])]
+
+
+def latin_hypercube_design(bounds, n_points, seed=1):
+    """ Latin hypercube design with n_points points.
+
+    bounds is a list of (name, low, high) triples. The range of every
+    parameter is split into n_points equal strata and each stratum is used
+    by exactly one point, at a random position inside it. The same seed
+    always gives the same design.
+
+    """
+    rng = random.Random(seed)
+    columns = []
+    for name, low, high in bounds:
+        strata = list(range(n_points))
+        rng.shuffle(strata)
+        width = (high - low) / float(n_points)
+        columns.append([low + (s + rng.random()) * width for s in strata])
+    names = [name for name, low, high in bounds]
+    return [collections.OrderedDict(zip(names, [c[i] for c in columns]))
+            for i in range(n_points)]
+
+
+def point_name(index):
+    """ Name of the point with the given (0 based) index, e.g. point_0001 """
+    return "point_%04d" % (index + 1)
+
+
+def retarget_outputs(mdl_text, point):
+    """ Send the reaction and viz output of an MDL text to the point's directories """
+    for prefix in _output_prefixes:
+        mdl_text = mdl_text.replace(
+            prefix, prefix[:-6] + point + '/seed_"')
+    return mdl_text
+
+
+def variant_file_name(base_name, point, section):
+    return "%s.%s.%s.mdl" % (base_name, point, section)
+
+
+def variant_main_text(main_text, base_name, point):
+    """ Main MDL text of a point: variant sections replace the shared ones """
+    for section in VARIANT_SECTIONS:
+        main_text = main_text.replace(
+            'INCLUDE_FILE = "%s.%s.mdl"' % (base_name, section),
+            'INCLUDE_FILE = "%s"' % variant_file_name(base_name, point, section))
+    return retarget_outputs(main_text, point)
+
+
+def write_variant(filedir, base_name, point, write_parameters):
+    """ Write the MDL files of one point next to the shared ones.
+
+    write_parameters(out_file) writes the point's parameter definitions.
+    The output sections are copies of the shared ones with the output
+    directories of the point. Returns the name of the point's main file.
+
+    """
+    def read(name):
+        with open(os.path.join(filedir, name), "r", encoding="utf8") as f:
+            return f.read()
+
+    def write(name, text):
+        with open(os.path.join(filedir, name), "w", encoding="utf8",
+                  newline="\n") as f:
+            f.write(text)
+
+    with open(os.path.join(filedir, variant_file_name(
+            base_name, point, 'parameters')), "w", encoding="utf8",
+            newline="\n") as f:
+        write_parameters(f)
+    for section in VARIANT_SECTIONS[1:]:
+        shared_name = "%s.%s.mdl" % (base_name, section)
+        if os.path.exists(os.path.join(filedir, shared_name)):
+            write(variant_file_name(base_name, point, section),
+                  retarget_outputs(read(shared_name), point))
+
+    main_name = "%s.%s.main.mdl" % (base_name, point)
+    main_text = read("%s.main.mdl" % base_name)
+    if 'INCLUDE_FILE = "%s.parameters.mdl"' % base_name not in main_text:
+        # The model has no parameter section yet, so add one
+        main_text = ('INCLUDE_FILE = "%s"\n\n' % variant_file_name(
+            base_name, point, 'parameters')) + main_text
+    write(main_name, variant_main_text(main_text, base_name, point))
+    return main_name
+
+
+def write_manifest(react_dir, manifest):
+    """ Write the sweep manifest into the reaction data directory """
+    with open(os.path.join(react_dir, MANIFEST_NAME), "w") as f:
+        json.dump(manifest, f, indent=2)
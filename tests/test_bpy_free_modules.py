@@ -0,0 +1,504 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# <pep8 compliant>
+
+"""
+Unit tests of the CellBlender modules which don't depend on Blender (viz_io,
+sweep, run_cache, resource_policy, sim_runner_queue and sim_worker). The
+Blender based tests are in test_suite/.
+
+Run from the add-on directory with:
+
+  python -m unittest discover tests
+"""
+
+import os
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import types
+import unittest
+
+# The modules are imported as scripts (as run_wrapper.py and sim_worker.py do)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import viz_io
+import sweep
+import run_cache
+import resource_policy
+import sim_runner_queue
+import sim_worker
+
+
+def write_binary_frame(filepath, species):
+    """ Write a cellbin frame. species is a list of (name, mol_type,
+    positions, orientations) with orientations only for mol_type 1. """
+    with open(filepath, "wb") as f:
+        f.write(struct.pack("=I", viz_io.CELLBIN_VERSION))
+        for name, mol_type, pos, orient in species:
+            f.write(struct.pack("=B", len(name)) + name.encode())
+            f.write(struct.pack("=BI", mol_type, len(pos)))
+            f.write(struct.pack("=%df" % len(pos), *pos))
+            if mol_type == 1:
+                f.write(struct.pack("=%df" % len(orient), *orient))
+
+
+def write_ascii_frame(filepath, molecules):
+    """ Write an ASCII frame. molecules is a list of (name, x, y, z, ox, oy, oz) """
+    with open(filepath, "w") as f:
+        for i, (name, x, y, z, ox, oy, oz) in enumerate(molecules):
+            f.write("%s %d %g %g %g %g %g %g\n" % (name, i, x, y, z, ox, oy, oz))
+
+
+def as_list(values):
+    return [float(v) for v in values]
+
+
+class TempDirTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix="cellblender_test_")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+
+class VizFrameTest(TempDirTestCase):
+
+    def test_binary_round_trip(self):
+        path = os.path.join(self.dir, "Scene.cellbin.0001.dat")
+        write_binary_frame(path, [
+            ("a", 0, [1.0, 2.0, 3.0, 4.0, 5.0, 6.0], None),
+            ("empty", 0, [], None),
+            ("s", 1, [0.5, 0.5, 0.5], [0.0, 0.0, 1.0])])
+        frame = viz_io.read_viz_frame(path)
+        self.assertEqual(list(frame.keys()), ["a", "empty", "s"])
+        self.assertEqual(frame["a"][0], 0)
+        self.assertEqual(as_list(frame["a"][1]), [1.0, 2.0, 3.0, 4.0, 5.0, 6.0])
+        self.assertEqual(len(frame["a"][2]), 0)
+        self.assertEqual(len(frame["empty"][1]), 0)
+        self.assertEqual(frame["s"][0], 1)
+        self.assertEqual(as_list(frame["s"][2]), [0.0, 0.0, 1.0])
+        self.assertEqual(viz_io.molecule_count(frame), 3)
+
+    def test_binary_truncated(self):
+        path = os.path.join(self.dir, "Scene.cellbin.0001.dat")
+        write_binary_frame(path, [
+            ("a", 0, [1.0, 2.0, 3.0], None),
+            ("b", 0, [4.0, 5.0, 6.0], None)])
+        with open(path, "rb") as f:
+            data = f.read()
+        with open(path, "wb") as f:
+            f.write(data[:-4])
+        frame = viz_io.read_viz_frame(path)
+        # The partially written block is dropped
+        self.assertEqual(list(frame.keys()), ["a"])
+
+    def test_ascii_round_trip(self):
+        path = os.path.join(self.dir, "Scene.ascii.0001.dat")
+        write_ascii_frame(path, [
+            ("a", 1, 2, 3, 0, 0, 0),
+            ("s", 4, 5, 6, 0, 1, 0),
+            ("a", 7, 8, 9, 0, 0, 0)])
+        frame = viz_io.read_viz_frame(path)
+        self.assertEqual(list(frame.keys()), ["a", "s"])
+        self.assertEqual(frame["a"][0], 0)
+        self.assertEqual(as_list(frame["a"][1]), [1, 2, 3, 7, 8, 9])
+        self.assertEqual(frame["s"][0], 1)
+        self.assertEqual(as_list(frame["s"][2]), [0, 1, 0])
+
+    def test_ascii_empty_and_truncated(self):
+        path = os.path.join(self.dir, "Scene.ascii.0001.dat")
+        open(path, "w").close()
+        self.assertEqual(len(viz_io.read_viz_frame(path)), 0)
+        with open(path, "w") as f:
+            f.write("a 0 1 2")
+        self.assertRaises(ValueError, viz_io.read_viz_frame, path)
+
+
+class SeedIndexTest(TempDirTestCase):
+
+    def frame_path(self, iteration):
+        return os.path.join(self.dir, "Scene.cellbin.%04d.dat" % iteration)
+
+    def test_index_after_appended_frames(self):
+        for i in range(3):
+            write_binary_frame(self.frame_path(i), [("a", 0, [i, 0.0, 0.0], None)])
+        index = viz_io.update_seed_index(self.dir)
+        self.assertEqual([e['iteration'] for e in index['frames']], [0, 1, 2])
+
+        # MCell appends frames; the directory time stamp may not have moved
+        time.sleep(0.01)
+        for i in range(3, 5):
+            write_binary_frame(self.frame_path(i), [("a", 0, [i, 0.0, 0.0], None)])
+        index = viz_io.update_seed_index(self.dir, index, check_all=False)
+        self.assertEqual([e['iteration'] for e in index['frames']], [0, 1, 2, 3, 4])
+        self.assertEqual(index['frames'][4]['species']['a'][1], 1)
+        self.assertEqual(index['frames'][4]['bbox'], [4.0, 0.0, 0.0, 4.0, 0.0, 0.0])
+
+        # The saved index is read back unchanged
+        self.assertEqual(viz_io.load_seed_index(self.dir)['frames'], index['frames'])
+
+    def test_unreadable_frame_keeps_its_place(self):
+        write_binary_frame(self.frame_path(0), [("a", 0, [0.0, 0.0, 0.0], None)])
+        ascii_path = os.path.join(self.dir, "Scene.cellbin.0001.dat")
+        with open(ascii_path, "w") as f:
+            f.write("a 0 1 2")
+        write_binary_frame(self.frame_path(2), [("a", 0, [2.0, 0.0, 0.0], None)])
+        index = viz_io.update_seed_index(self.dir)
+        self.assertEqual(len(index['frames']), 3)
+        self.assertTrue(index['frames'][1]['unindexed'])
+
+        time.sleep(0.01)
+        write_ascii_frame(ascii_path, [("a", 1, 2, 3, 0, 0, 0)])
+        index = viz_io.update_seed_index(self.dir, index, check_all=False)
+        self.assertFalse(index['frames'][1].get('unindexed'))
+        self.assertEqual(index['frames'][1]['bbox'], [1.0, 2.0, 3.0, 1.0, 2.0, 3.0])
+
+
+class SeedArchiveTest(TempDirTestCase):
+
+    def setUp(self):
+        TempDirTestCase.setUp(self)
+        self.frames = {}
+        for i in range(4):
+            name = "Scene.cellbin.%04d.dat" % i
+            species = [("a", 0, [0.1 * i, 1.0, -2.5, 3.0, 4.25, 5.0], None),
+                       ("empty", 0, [], None),
+                       ("s", 1, [1.0, 1.0, 1.0], [0.0, 1.0, 0.0])]
+            write_binary_frame(os.path.join(self.dir, name), species)
+            self.frames[name] = viz_io.read_viz_frame(os.path.join(self.dir, name), copy=True)
+
+    def check_archive(self, places):
+        for name, frame in self.frames.items():
+            archived = viz_io.read_viz_frame(os.path.join(self.dir, name))
+            self.assertEqual(list(archived.keys()), list(frame.keys()))
+            for species, (mol_type, pos, orient) in frame.items():
+                self.assertEqual(archived[species][0], mol_type)
+                for got, want in ((archived[species][1], pos), (archived[species][2], orient)):
+                    self.assertEqual(len(got), len(want))
+                    for g, w in zip(as_list(got), as_list(want)):
+                        self.assertAlmostEqual(g, w, places=places)
+
+    def test_float32_round_trip(self):
+        n = viz_io.write_seed_archive(self.dir, remove=True)
+        self.assertEqual(n, len(self.frames))
+        self.assertFalse(any([name in os.listdir(self.dir) for name in self.frames]))
+        self.check_archive(places=6)
+        index = viz_io.update_seed_index(self.dir)
+        self.assertEqual(len(index['frames']), len(self.frames))
+
+    @unittest.skipIf(viz_io.numpy is None, "quantized archives require NumPy")
+    def test_quantized_round_trip(self):
+        viz_io.write_seed_archive(self.dir, quantize=True)
+        for name in self.frames:
+            os.remove(os.path.join(self.dir, name))
+        # int16 over each axis' range of the frame
+        self.check_archive(places=3)
+
+
+class SweepTest(TempDirTestCase):
+
+    def test_designs(self):
+        grid = sweep.grid_design([("k", [1, 2]), ("d", [10, 20, 30])])
+        self.assertEqual(len(grid), 6)
+        self.assertEqual(list(grid[1].items()), [("k", 1), ("d", 20)])
+        lhs = sweep.latin_hypercube_design([("k", 0.0, 1.0)], 5, seed=3)
+        strata = sorted([int(point["k"] * 5) for point in lhs])
+        self.assertEqual(strata, [0, 1, 2, 3, 4])
+        self.assertEqual(lhs, sweep.latin_hypercube_design([("k", 0.0, 1.0)], 5, seed=3))
+
+    def test_write_variant(self):
+        with open(os.path.join(self.dir, "S.main.mdl"), "w") as f:
+            f.write('INCLUDE_FILE = "S.parameters.mdl"\nINCLUDE_FILE = "S.rxn_output.mdl"\n')
+        with open(os.path.join(self.dir, "S.rxn_output.mdl"), "w") as f:
+            f.write('{COUNT[a,WORLD]}=> "./react_data/seed_" & seed & "/a.dat"\n')
+        main = sweep.write_variant(self.dir, "S", "point_0001",
+                                   lambda out_file: out_file.write("k = 1\n"))
+        with open(os.path.join(self.dir, main)) as f:
+            main_text = f.read()
+        self.assertIn('"S.point_0001.parameters.mdl"', main_text)
+        self.assertIn('"S.point_0001.rxn_output.mdl"', main_text)
+        with open(os.path.join(self.dir, "S.point_0001.rxn_output.mdl")) as f:
+            self.assertIn('"./react_data/point_0001/seed_"', f.read())
+
+
+class RunCacheTest(TempDirTestCase):
+
+    def setUp(self):
+        TempDirTestCase.setUp(self)
+        self.wd = os.path.join(self.dir, "project")
+        os.makedirs(self.wd)
+        self.binary = os.path.join(self.dir, "mcell")
+        with open(self.binary, "w") as f:
+            f.write("binary")
+        with open(os.path.join(self.wd, "S.main.mdl"), "w") as f:
+            f.write('INCLUDE_FILE = "S.rxn_output.mdl"\n')
+        with open(os.path.join(self.wd, "S.rxn_output.mdl"), "w") as f:
+            f.write('{COUNT[a,WORLD]}=> "./react_data/seed_" & seed & "/a.dat"\n')
+        self.cache = run_cache.RunCache(os.path.join(self.wd, "run_cache"))
+
+    def key(self, seed=1):
+        return self.cache.task_key(self.binary, "-seed %d S.main.mdl" % seed,
+                                   self.wd, "S.main.mdl", seed)
+
+    def test_store_and_restore(self):
+        key, outputs = self.key()
+        self.assertEqual(outputs, [os.path.join("react_data", "seed_00001")])
+        self.assertFalse(self.cache.restore(key, self.wd, outputs))
+        out_dir = os.path.join(self.wd, outputs[0])
+        os.makedirs(out_dir)
+        with open(os.path.join(out_dir, "a.dat"), "w") as f:
+            f.write("0 1\n")
+        self.cache.store(key, self.wd, outputs)
+
+        shutil.rmtree(os.path.join(self.wd, "react_data"))
+        self.assertTrue(self.cache.restore(key, self.wd, outputs))
+        self.assertFalse(os.path.islink(out_dir))
+        # Restored files are copies, so changing them leaves the cache alone
+        os.remove(os.path.join(out_dir, "a.dat"))
+        self.assertTrue(self.cache.restore(key, self.wd, outputs))
+        with open(os.path.join(out_dir, "a.dat")) as f:
+            self.assertEqual(f.read(), "0 1\n")
+
+    def test_key_follows_inputs(self):
+        key, outputs = self.key()
+        self.assertNotEqual(key, self.key(seed=2)[0])
+        time.sleep(0.01)
+        with open(os.path.join(self.wd, "S.rxn_output.mdl"), "a") as f:
+            f.write("\n")
+        self.assertNotEqual(key, self.key()[0])
+
+
+class ResourcePolicyTest(unittest.TestCase):
+
+    def test_core_sets(self):
+        policy = resource_policy.ResourcePolicy(cores_per_task=1)
+        if not policy.pinning():
+            self.skipTest("no CPU affinity on this system")
+        n_sets = len(policy.free_core_sets)
+        cores = policy.acquire_cores()
+        self.assertEqual(len(policy.free_core_sets), n_sets - 1)
+        policy.release_cores(cores)
+        policy.release_cores(cores)
+        self.assertEqual(len(policy.free_core_sets), n_sets)
+
+    def test_admit_by_memory(self):
+        available = resource_policy.mem_available_kb()
+        if available is None:
+            self.skipTest("available memory unknown on this system")
+        progress = sim_runner_queue.TaskProgress()
+        progress.peak_rss = 1
+        policy = resource_policy.ResourcePolicy(admit_by_memory=True, mem_reserve_mb=0)
+        self.assertTrue(policy.admit([], [progress]))
+        policy = resource_policy.ResourcePolicy(
+            admit_by_memory=True, mem_reserve_mb=0, mem_per_task_mb=2 * available // 1024 + 1)
+        self.assertFalse(policy.admit([], []))
+        self.assertEqual(policy.task_spec([0]), {'cores': [0], 'mem_limit_mb': 0, 'nice': 0})
+
+
+class JobJournalTest(TempDirTestCase):
+
+    def setUp(self):
+        TempDirTestCase.setUp(self)
+        self.path = os.path.join(self.dir, "run_journal.jsonl")
+
+    def test_replay(self):
+        journal = sim_runner_queue.JobJournal(self.path)
+        journal.record(1, cmd="mcell", args="-seed 1", wd=self.dir, info={}, status='queued')
+        journal.record(1, pid=123, status='running')
+        journal.record(2, cmd="mcell", args="-seed 2", wd=self.dir, info={}, status='queued')
+        journal.record(1, status='completed', rc=0)
+        journal.record(2, cleared=True)
+        with open(self.path, "a") as f:
+            f.write('{"task_id": 3, "sta')
+        tasks = journal.load()
+        self.assertEqual(list(tasks.keys()), [1])
+        self.assertEqual(tasks[1]['status'], 'completed')
+        self.assertEqual(tasks[1]['pid'], 123)
+        self.assertEqual(journal.max_task_id, 2)
+
+    def test_compaction_keeps_max_task_id(self):
+        journal = sim_runner_queue.JobJournal(self.path)
+        for task_id in range(1, 11):
+            for status in ('queued', 'running', 'completed', 'completed', 'completed'):
+                journal.record(task_id, status=status)
+        for task_id in range(6, 11):
+            journal.record(task_id, cleared=True)
+        tasks = journal.load()
+        # load() never rewrites the file
+        with open(self.path) as f:
+            self.assertEqual(len(f.readlines()), 55)
+        self.assertTrue(journal.needs_compacting(tasks))
+        journal.compact(tasks)
+
+        journal = sim_runner_queue.JobJournal(self.path)
+        self.assertEqual(journal.load(), tasks)
+        self.assertEqual(journal.max_task_id, 10)
+        with open(self.path) as f:
+            self.assertEqual(len(f.readlines()), 6)
+
+
+class FakeTexts:
+    """ Stands in for bpy.data.texts, which SimQueue keeps task output in """
+
+    def __init__(self):
+        self.texts = {}
+
+    def get(self, name):
+        return self.texts.get(name)
+
+    def new(self, name):
+        self.texts[name] = types.SimpleNamespace(name=name)
+        return self.texts[name]
+
+    def remove(self, text):
+        self.texts.pop(text.name, None)
+
+
+class SimQueueTest(TempDirTestCase):
+
+    def setUp(self):
+        TempDirTestCase.setUp(self)
+        self.saved_bpy = sys.modules.get('bpy')
+        sys.modules['bpy'] = types.SimpleNamespace(
+            data=types.SimpleNamespace(texts=FakeTexts()))
+
+    def tearDown(self):
+        if self.saved_bpy is None:
+            sys.modules.pop('bpy', None)
+        else:
+            sys.modules['bpy'] = self.saved_bpy
+        TempDirTestCase.tearDown(self)
+
+    def test_open_journal_restores_tasks(self):
+        path = os.path.join(self.dir, "run_journal.jsonl")
+        journal = sim_runner_queue.JobJournal(path)
+        journal.record(1, cmd="mcell", args="-seed 1", wd=self.dir, info={'seed': 1}, status='completed', rc=0)
+        journal.record(2, cmd="mcell", args="-seed 2", wd=self.dir, info={'seed': 2}, status='queued')
+        journal.record(3, cmd="mcell", args="-seed 3", wd=self.dir, info={'seed': 3}, status='running', pid=0)
+        journal.record(4, cmd="mcell", args="-seed 4", wd=self.dir, info={'seed': 4}, status='queued')
+        journal.record(4, cleared=True)
+
+        queue = sim_runner_queue.SimQueue()
+        self.assertEqual(queue.open_journal(path), [1, 2, 3])
+        self.assertEqual(queue.status_table.status(1), 'completed')
+        self.assertEqual(queue.status_table.status(2), 'died')
+        self.assertEqual(queue.status_table.status(3), 'died')
+        self.assertEqual(sorted(queue.resumable), [2, 3])
+        # Cleared ids are not reused
+        self.assertEqual(queue.next_task_id, 5)
+        self.assertEqual(sim_runner_queue.JobJournal(path).load()[2]['status'], 'died')
+
+    def test_tasks_keep_their_journal(self):
+        first = os.path.join(self.dir, "first.jsonl")
+        second = os.path.join(self.dir, "second.jsonl")
+        queue = sim_runner_queue.SimQueue()
+        queue.open_journal(first)
+        task_id = queue.add_task("mcell", "-seed 1", self.dir, {'seed': 1})
+        queue.open_journal(second)
+        queue.kill_task(task_id)
+        self.assertEqual(sim_runner_queue.JobJournal(first).load()[task_id]['status'], 'died')
+        self.assertFalse(os.path.exists(second))
+
+
+class RunStatusTableTest(unittest.TestCase):
+
+    def test_watch(self):
+        table = sim_runner_queue.RunStatusTable()
+        keys = []
+        procs = [subprocess.Popen([sys.executable, "-c", "import sys; sys.exit(%d)" % (i % 2)])
+                 for i in range(6)]
+        threads = [threading.Thread(target=lambda p=p: keys.append(table.watch(p))) for p in procs]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(set(keys)), len(procs))
+        for proc in procs:
+            proc.wait()
+        deadline = time.time() + 10.0
+        while table.count('running') and (time.time() < deadline):
+            time.sleep(0.01)
+        self.assertEqual(table.counts_snapshot(), {'completed': 3, 'died': 3})
+
+
+class WorkerLoopbackTest(TempDirTestCase):
+
+    token = "secret"
+
+    def setUp(self):
+        TempDirTestCase.setUp(self)
+        self.wd = os.path.join(self.dir, "project")
+        os.makedirs(self.wd)
+        with open(os.path.join(self.wd, "run.py"), "w") as f:
+            f.write("import os, sys\n"
+                    "os.makedirs('react_data/seed_00001')\n"
+                    "with open('react_data/seed_00001/a.dat', 'w') as f:\n"
+                    "    f.write(open('input.txt').read())\n"
+                    "print('done')\n")
+        with open(os.path.join(self.wd, "input.txt"), "w") as f:
+            f.write("42\n")
+        self.server = sim_worker.WorkerServer(
+            ("localhost", 0), os.path.join(self.dir, "worker"), 1, self.token,
+            allow=[sys.executable])
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        TempDirTestCase.tearDown(self)
+
+    def run_task(self, token, cmd):
+        task = {'task_id': 1, 'wd': self.wd, 'cmd': cmd, 'args': 'run.py',
+                'progress': sim_runner_queue.TaskProgress()}
+        proc = sim_runner_queue.RemoteProcess(self.server.server_address, task, {}, token)
+        with proc.stdout, proc.stderr:
+            out = proc.stdout.read()
+            err = proc.stderr.read()
+        return proc.wait(), out, err
+
+    def test_run(self):
+        rc, out, err = self.run_task(self.token, sys.executable)
+        self.assertEqual(rc, 0, err)
+        self.assertEqual(out.strip(), b"done")
+        with open(os.path.join(self.wd, "react_data", "seed_00001", "a.dat")) as f:
+            self.assertEqual(f.read(), "42\n")
+
+    def test_refused(self):
+        rc, out, err = self.run_task("wrong", sys.executable)
+        self.assertEqual(rc, 2)
+        self.assertIn(b"wrong token", err)
+        rc, out, err = self.run_task(self.token, shutil.which("sh") or "/bin/sh")
+        self.assertEqual(rc, 2)
+        self.assertIn(b"not allowed", err)
+        self.assertFalse(os.path.exists(os.path.join(self.wd, "react_data")))
+
+    def test_no_addresses(self):
+        self.assertRaises(ValueError, sim_runner_queue.RemoteExecutor, [], self.token)
+
+
+if __name__ == '__main__':
+    unittest.main()
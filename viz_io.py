@@ -0,0 +1,1165 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# <pep8 compliant>
+
+"""
+This module decodes MCell molecule visualization frames (the "cellbin"
+binary format and the ASCII format) without depending on Blender.
+
+Each decoded frame is an ordered dictionary mapping a species name to a list
+of [mol_type, positions, orientations] where mol_type is 1 for surface
+molecules and 0 for volume molecules. Positions and orientations are flat
+float32 arrays (x,y,z,x,y,z,...) which can be handed directly to
+foreach_set. Volume molecules have an empty orientation array.
+
+When NumPy is available the binary frame is memory mapped and the arrays are
+zero-copy views into the mapping. Otherwise the standard "array" module is
+used (one read per species block).
+
+The VizFrameCache class decodes upcoming frames on a thread pool and keeps
+them in a memory bounded LRU cache so playback does not wait on disk.
+
+subsample_frame() bounds the number of molecules displayed per species by
+keeping an evenly spread, deterministic subset of each species.
+
+crop_frame() keeps only the molecules inside an axis aligned region of
+interest, and boxes_intersect() lets callers skip frames whose indexed
+bounding box lies outside of it.
+
+Frames of several seeds (an ensemble) can be decoded in parallel and either
+overlaid or reduced to a per-species occupancy density grid.
+
+Each seed directory can carry a small index file (SEED_INDEX_NAME) which
+records the iteration, per-species byte offsets, molecule counts and bounding
+box of every frame. It is built once and then updated only for frames which
+were added or changed, so opening a seed does not require reading its frames.
+
+The frames of a seed directory can be packed into one compressed archive
+(ARCHIVE_NAME) with write_seed_archive(). Archived frames are listed by the
+seed index and read by read_viz_frame() as if their files still existed.
+"""
+
+import array
+import collections
+import concurrent.futures
+import json
+import mmap
+import os
+import random
+import re
+import struct
+import sys
+import threading
+import zlib
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+# The first 4 bytes of a binary frame hold this (native endian) value
+CELLBIN_VERSION = 1
+
+_uint32 = struct.Struct("=I")
+
+# Name and format version of the per-seed index file
+SEED_INDEX_NAME = ".cbindex"
+SEED_INDEX_VERSION = 1
+
+# Name and format version of the per-seed frame archive. The archive starts
+# with ARCHIVE_MAGIC and ends with a trailer giving the position of its table
+# of contents.
+ARCHIVE_NAME = ".cbarchive"
+ARCHIVE_VERSION = 1
+ARCHIVE_MAGIC = b"CBVZARC1"
+_archive_trailer = struct.Struct("<QI8s")
+_open_archives = {}
+_archive_lock = threading.Lock()
+
+# Frame files end with the iteration number (e.g. Scene.cellbin.0042.dat)
+_iteration_re = re.compile(r"(\d+)(\.[^.\d]*)?$")
+
+# Volume molecule orientations come from a table of random unit vectors
+# which is built in fixed size blocks, each from its own seed. Molecule i
+# therefore always gets the same orientation no matter how large the table
+# has grown, so frames render identically and molecules don't spin between
+# frames.
+ORIENT_SEED = 1
+ORIENT_BLOCK = 65536
+_orient_table = None
+_orient_lock = threading.Lock()
+
+
+def frame_is_binary(filepath):
+    """ Return True if the frame file is in the binary cellbin format """
+    with open(filepath, "rb") as f:
+        head = f.read(_uint32.size)
+    return (len(head) == _uint32.size) and (
+        _uint32.unpack(head)[0] == CELLBIN_VERSION)
+
+
+def index_binary_frame(buf):
+    """ Scan the headers of a binary frame in a single pass.
+
+    Returns a list of (name, mol_type, pos_offset, n_floats, orient_offset)
+    tuples where the offsets are byte offsets into buf, n_floats is the number
+    of floats in the position block (3 per molecule), and orient_offset is -1
+    for volume molecules. A truncated trailing block is dropped, matching the
+    behavior of the original reader which stopped at the first EOF.
+
+    """
+    index = []
+    buf_len = len(buf)
+    offset = _uint32.size
+    while offset < buf_len:
+        name_len = buf[offset]
+        offset += 1
+        if offset + name_len + 1 + _uint32.size > buf_len:
+            break
+        name = bytes(buf[offset:offset+name_len]).decode()
+        offset += name_len
+        mol_type = buf[offset]
+        offset += 1
+        n_floats = _uint32.unpack_from(buf, offset)[0]
+        offset += _uint32.size
+        pos_offset = offset
+        offset += 4 * n_floats
+        orient_offset = -1
+        if mol_type == 1:
+            orient_offset = offset
+            offset += 4 * n_floats
+        if offset > buf_len:
+            break
+        index.append((name, mol_type, pos_offset, n_floats, orient_offset))
+    return index
+
+
+def _empty_floats():
+    if numpy is not None:
+        return numpy.empty(0, dtype=numpy.float32)
+    return array.array("f")
+
+
+def _float_view(buf, offset, n_floats):
+    """ Return n_floats float32 values starting at byte offset of buf """
+    if numpy is not None:
+        return numpy.frombuffer(buf, dtype=numpy.float32, count=n_floats,
+                                offset=offset)
+    a = array.array("f")
+    a.frombytes(buf[offset:offset+4*n_floats])
+    return a
+
+
+def read_binary_frame(filepath, copy=False):
+    """ Decode a binary cellbin frame.
+
+    With copy=True the frame is read into memory owned by the returned arrays
+    instead of being memory mapped. This forces the actual disk I/O to happen
+    now (useful for prefetching) and releases the file immediately.
+
+    """
+    mol_dict = collections.OrderedDict()
+    with open(filepath, "rb") as f:
+        if os.fstat(f.fileno()).st_size <= _uint32.size:
+            return mol_dict
+        if (numpy is not None) and not copy:
+            # The mapping stays alive as long as any array views it
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            buf = f.read()
+
+    for name, mol_type, pos_offset, n_floats, orient_offset in \
+            index_binary_frame(buf):
+        mol_pos = _float_view(buf, pos_offset, n_floats)
+        if orient_offset >= 0:
+            mol_orient = _float_view(buf, orient_offset, n_floats)
+        else:
+            mol_orient = _empty_floats()
+        mol_dict[name] = [mol_type, mol_pos, mol_orient]
+    return mol_dict
+
+
+def read_ascii_frame(filepath):
+    """ Decode an ASCII frame.
+
+    Each line holds: name id x y z x_orient y_orient z_orient
+    A species is considered to be a surface molecule if the first molecule of
+    that species found in the frame has a non-zero orientation.
+
+    """
+    mol_dict = collections.OrderedDict()
+    with open(filepath, "r") as f:
+        tokens = f.read().split()
+    if not tokens:
+        return mol_dict
+    if len(tokens) % 8 != 0:
+        raise ValueError("Malformed ASCII viz frame: " + filepath)
+
+    names = tokens[0::8]
+    if numpy is not None:
+        # Drop the name and id columns and convert everything else at once
+        cols = numpy.array(tokens).reshape(-1, 8)[:, 2:]
+        values = cols.astype(numpy.float32)
+        unique_names, first_index, species = numpy.unique(
+            names, return_index=True, return_inverse=True)
+        order = numpy.argsort(species, kind='mergesort')
+        bounds = numpy.searchsorted(species[order],
+                                    numpy.arange(len(unique_names) + 1))
+        # Preserve the order in which species first appear in the file
+        for s in numpy.argsort(first_index):
+            rows = values[order[bounds[s]:bounds[s+1]]]
+            mol_type = 1 if rows[0, 3:].any() else 0
+            mol_pos = numpy.ascontiguousarray(rows[:, :3]).reshape(-1)
+            if mol_type == 1:
+                mol_orient = numpy.ascontiguousarray(rows[:, 3:]).reshape(-1)
+            else:
+                mol_orient = _empty_floats()
+            mol_dict[str(unique_names[s])] = [mol_type, mol_pos, mol_orient]
+    else:
+        for i in range(0, len(tokens), 8):
+            name = tokens[i]
+            vals = [float(x) for x in tokens[i+2:i+8]]
+            if name not in mol_dict:
+                mol_type = 1 if (vals[3] != 0.0 or vals[4] != 0.0 or
+                                 vals[5] != 0.0) else 0
+                mol_dict[name] = [mol_type, array.array("f"),
+                                  array.array("f")]
+            entry = mol_dict[name]
+            entry[1].extend(vals[:3])
+            if entry[0] == 1:
+                entry[2].extend(vals[3:])
+    return mol_dict
+
+
+def read_viz_frame(filepath, copy=False):
+    """ Decode one viz frame file of either format (see module docstring)
+
+    A frame which has no file of its own is read from the seed archive in
+    the same directory.
+
+    """
+    if not os.path.exists(filepath):
+        archive = open_seed_archive(os.path.dirname(filepath))
+        name = os.path.basename(filepath)
+        if (archive is not None) and (name in archive):
+            return archive.read_frame(name)
+    if frame_is_binary(filepath):
+        return read_binary_frame(filepath, copy=copy)
+    return read_ascii_frame(filepath)
+
+
+def molecule_count(mol_dict):
+    """ Return the total number of molecules in a decoded frame """
+    return sum([len(entry[1]) // 3 for entry in mol_dict.values()])
+
+
+def frame_nbytes(mol_dict):
+    """ Return the approximate number of bytes held by a decoded frame """
+    nbytes = 0
+    for entry in mol_dict.values():
+        for a in entry[1:3]:
+            nbytes += len(a) * a.itemsize
+    return nbytes
+
+
+def _orient_block(block_num):
+    """ Return ORIENT_BLOCK random unit vectors as 3*ORIENT_BLOCK floats """
+    if numpy is not None:
+        rng = numpy.random.RandomState(ORIENT_SEED + block_num)
+        v = rng.uniform(-1.0, 1.0, size=(ORIENT_BLOCK, 3))
+        norm = numpy.sqrt((v * v).sum(axis=1))
+        norm[norm == 0.0] = 1.0
+        return (v / norm[:, numpy.newaxis]).astype(numpy.float32).reshape(-1)
+    rng = random.Random(ORIENT_SEED + block_num)
+    block = array.array("f")
+    for i in range(ORIENT_BLOCK):
+        x, y, z = [rng.uniform(-1.0, 1.0) for j in range(3)]
+        norm = (x * x + y * y + z * z) ** 0.5 or 1.0
+        block.extend((x / norm, y / norm, z / norm))
+    return block
+
+
+def volume_orientations(n_mols):
+    """ Return deterministic orientations (3*n_mols floats) for n_mols
+    volume molecules. The result is shared and must not be modified. """
+    global _orient_table
+    with _orient_lock:
+        n_have = 0 if _orient_table is None else len(_orient_table) // 3
+        if n_have < n_mols:
+            blocks = [_orient_block(b) for b in range(
+                n_have // ORIENT_BLOCK,
+                (n_mols + ORIENT_BLOCK - 1) // ORIENT_BLOCK)]
+            if numpy is not None:
+                if _orient_table is not None:
+                    blocks.insert(0, _orient_table)
+                _orient_table = numpy.concatenate(blocks)
+            else:
+                if _orient_table is None:
+                    _orient_table = array.array("f")
+                for block in blocks:
+                    _orient_table.extend(block)
+        table = _orient_table
+    if table is None:
+        return _empty_floats()
+    return table[:3*n_mols]
+
+
+def pad_with_first(values, n_extra):
+    """ Return values (3 floats per molecule) followed by n_extra copies of
+    its first 3 floats, as the same kind of float array. """
+    if (numpy is not None) and isinstance(values, numpy.ndarray):
+        return numpy.concatenate((values, numpy.tile(values[0:3], n_extra)))
+    padded = array.array("f", values)
+    padded.extend(padded[0:3] * n_extra)
+    return padded
+
+
+def frame_iteration(file_name):
+    """ Return the iteration number encoded in a frame file name (or -1) """
+    match = _iteration_re.search(file_name)
+    if match:
+        return int(match.group(1))
+    return -1
+
+
+def _bounding_box(mol_dict):
+    """ Return [xmin, ymin, zmin, xmax, ymax, zmax] of a frame or None """
+    lo = None
+    hi = None
+    for entry in mol_dict.values():
+        mol_pos = entry[1]
+        if len(mol_pos) == 0:
+            continue
+        if numpy is not None:
+            xyz = numpy.asarray(mol_pos).reshape(-1, 3)
+            e_lo = xyz.min(axis=0).tolist()
+            e_hi = xyz.max(axis=0).tolist()
+        else:
+            e_lo = [min(mol_pos[i::3]) for i in range(3)]
+            e_hi = [max(mol_pos[i::3]) for i in range(3)]
+        if lo is None:
+            lo, hi = e_lo, e_hi
+        else:
+            lo = [min(a, b) for a, b in zip(lo, e_lo)]
+            hi = [max(a, b) for a, b in zip(hi, e_hi)]
+    if lo is None:
+        return None
+    return [float(v) for v in lo + hi]
+
+
+def build_frame_index_entry(filepath):
+    """ Describe one frame file for the seed index.
+
+    The "species" entry maps each species name to
+    [mol_type, n_mols, pos_offset, orient_offset]. Byte offsets are only
+    meaningful for binary frames and are -1 for ASCII frames.
+
+    """
+    st = os.stat(filepath)
+    entry = {
+        'file': os.path.basename(filepath),
+        'size': st.st_size,
+        'mtime': st.st_mtime,
+        'iteration': frame_iteration(os.path.basename(filepath)),
+        'binary': frame_is_binary(filepath),
+        'species': collections.OrderedDict(),
+        'bbox': None,
+    }
+    if entry['binary']:
+        if st.st_size <= _uint32.size:
+            return entry
+        # One scan of one buffer gives both the offsets and the positions
+        with open(filepath, "rb") as f:
+            buf = f.read(st.st_size) if numpy is None else mmap.mmap(
+                f.fileno(), 0, access=mmap.ACCESS_READ)
+        mol_dict = collections.OrderedDict()
+        for name, mol_type, pos_offset, n_floats, orient_offset in \
+                index_binary_frame(buf):
+            entry['species'][name] = [
+                mol_type, n_floats // 3, pos_offset, orient_offset]
+            mol_dict[name] = [mol_type, _float_view(buf, pos_offset, n_floats)]
+    else:
+        mol_dict = read_ascii_frame(filepath)
+        for name, mol_data in mol_dict.items():
+            entry['species'][name] = [mol_data[0], len(mol_data[1]) // 3, -1, -1]
+    entry['bbox'] = _bounding_box(mol_dict)
+    return entry
+
+
+def unindexed_frame_entry(filepath):
+    """ Placeholder for a frame file which could not be read (yet).
+
+    MCell may still be writing it. Keeping an entry keeps the positions of
+    the later frames, and update_seed_index reads the file again next time.
+
+    """
+    st = os.stat(filepath)
+    return {
+        'file': os.path.basename(filepath),
+        'size': st.st_size,
+        'mtime': st.st_mtime,
+        'iteration': frame_iteration(os.path.basename(filepath)),
+        'binary': False,
+        'species': collections.OrderedDict(),
+        'bbox': None,
+        'unindexed': True,
+    }
+
+
+def load_seed_index(seed_dir):
+    """ Read the index file of a seed directory (None if missing or stale) """
+    index_path = os.path.join(seed_dir, SEED_INDEX_NAME)
+    try:
+        with open(index_path, "r") as f:
+            seed_index = json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+    if seed_index.get('version') != SEED_INDEX_VERSION:
+        return None
+    return seed_index
+
+
+def save_seed_index(seed_dir, seed_index):
+    """ Write the index file (silently skipped if the directory is read-only)
+
+    The file is rewritten in place rather than renamed into place because
+    creating a directory entry changes the directory time stamp which is
+    used to detect new frames. A torn write is detected by load_seed_index
+    and simply causes the index to be rebuilt.
+
+    """
+    index_path = os.path.join(seed_dir, SEED_INDEX_NAME)
+    try:
+        if not os.path.exists(index_path):
+            open(index_path, "w").close()
+            seed_index['dir_mtime'] = os.stat(seed_dir).st_mtime
+        with open(index_path, "w") as f:
+            json.dump(seed_index, f, separators=(',', ':'))
+    except (IOError, OSError):
+        pass
+
+
+def _frame_unchanged(seed_dir, entry):
+    if entry.get('archived'):
+        try:
+            st = os.stat(os.path.join(seed_dir, ARCHIVE_NAME))
+        except OSError:
+            return False
+        return st.st_mtime == entry['mtime']
+    try:
+        st = os.stat(os.path.join(seed_dir, entry['file']))
+    except OSError:
+        return False
+    return (st.st_size == entry['size']) and (st.st_mtime == entry['mtime'])
+
+
+def update_seed_index(seed_dir, seed_index=None, check_all=True, save=True):
+    """ Return the index of a seed directory, bringing it up to date first.
+
+    If the directory has not changed since the index was written, only the
+    index file and the last frame are looked at. Otherwise only frames which
+    are new or whose size or time stamp changed are read.
+
+    An index already in memory may be passed as seed_index to avoid reading
+    the index file. With check_all=False, frames already in the index are
+    assumed unchanged (except the last one and those which could not be
+    read before) which keeps the cost of polling a directory that MCell is
+    appending to independent of its length. With save=False the updated
+    index is not written back.
+
+    Frames which can't be read are listed with an unindexed_frame_entry so
+    that the positions of the frames after them don't change.
+
+    """
+    if seed_index is None:
+        seed_index = load_seed_index(seed_dir)
+    dir_mtime = os.stat(seed_dir).st_mtime
+
+    if seed_index is not None and seed_index['dir_mtime'] == dir_mtime:
+        # MCell may still have been writing the last frame when it was indexed
+        frames = seed_index['frames']
+        if (not seed_index.get('n_unindexed')) and (
+                (not frames) or _frame_unchanged(seed_dir, frames[-1])):
+            return seed_index
+
+    old_frames = {}
+    last_file = None
+    if seed_index is not None:
+        for entry in seed_index['frames']:
+            old_frames[entry['file']] = entry
+        if seed_index['frames']:
+            last_file = seed_index['frames'][-1]['file']
+
+    file_names = [f for f in os.listdir(seed_dir) if not f.startswith('.')]
+    archive = open_seed_archive(seed_dir)
+    if archive is not None:
+        file_names = list(set(file_names).union(archive.toc))
+    file_names.sort()
+
+    frames = []
+    changed = (seed_index is None)
+    for file_name in file_names:
+        entry = old_frames.get(file_name)
+        if ((entry is not None) and (not check_all) and
+                (file_name != last_file) and not entry.get('unindexed')):
+            frames.append(entry)
+            continue
+        filepath = os.path.join(seed_dir, file_name)
+        if not os.path.isfile(filepath):
+            if (archive is None) or (file_name not in archive):
+                continue
+            archived_entry = archive.index_entry(file_name)
+            if archived_entry != entry:
+                entry = archived_entry
+                changed = True
+            frames.append(entry)
+            continue
+        if ((entry is None) or entry.get('unindexed') or
+                not _frame_unchanged(seed_dir, entry)):
+            try:
+                entry = build_frame_index_entry(filepath)
+            except (IOError, OSError, ValueError):
+                try:
+                    entry = unindexed_frame_entry(filepath)
+                except OSError:
+                    # Gone since the listing
+                    continue
+            if entry != old_frames.get(file_name):
+                changed = True
+        frames.append(entry)
+    if len(frames) != len(old_frames):
+        changed = True
+    if (seed_index is not None) and (seed_index['dir_mtime'] != dir_mtime):
+        changed = True
+
+    seed_index = {
+        'version': SEED_INDEX_VERSION,
+        'dir_mtime': dir_mtime,
+        'frames': frames,
+        'n_unindexed': len([e for e in frames if e.get('unindexed')]),
+    }
+    if changed and save:
+        save_seed_index(seed_dir, seed_index)
+    return seed_index
+
+
+def _to_le_bytes(values, typecode):
+    """ Little endian bytes of a numpy array or array.array """
+    if numpy is not None:
+        return numpy.asarray(values).astype('<' + typecode).tobytes()
+    values = array.array(values.typecode, values)
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return values.tobytes()
+
+
+def _from_le_bytes(buf, typecode, n_values):
+    if numpy is not None:
+        return numpy.frombuffer(buf, dtype='<' + typecode, count=n_values)
+    values = array.array({'f4': 'f', 'i2': 'h'}[typecode])
+    values.frombytes(buf[:n_values * values.itemsize])
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return values
+
+
+def _columns(floats):
+    """ Reorder x,y,z,x,y,z,... into x,x,...,y,y,...,z,z,... """
+    if numpy is not None:
+        return numpy.asarray(floats, dtype=numpy.float32).reshape(-1, 3).T.ravel()
+    return array.array('f', floats[0::3]) + array.array('f', floats[1::3]) + \
+        array.array('f', floats[2::3])
+
+
+def _interleave(columns, n_mols):
+    """ Inverse of _columns, always returning float32 values """
+    if numpy is not None:
+        return numpy.ascontiguousarray(
+            numpy.asarray(columns, dtype=numpy.float32).reshape(3, n_mols).T
+        ).ravel()
+    floats = array.array('f', bytes(12 * n_mols))
+    for k in range(3):
+        floats[k::3] = array.array('f', columns[k*n_mols:(k+1)*n_mols])
+    return floats
+
+
+def _encode_species(floats, quantize):
+    """ Return (bytes, low, step) for one position or orientation array """
+    n_mols = len(floats) // 3
+    columns = _columns(floats)
+    if not quantize:
+        return _to_le_bytes(columns, 'f4'), None, None
+    # Map the range of each axis onto the full int16 range
+    xyz = columns.reshape(3, n_mols)
+    low = xyz.min(axis=1).astype(numpy.float64)
+    extent = xyz.max(axis=1) - low
+    step = numpy.where(extent > 0, extent / 65535.0, 1.0)
+    q = numpy.rint((xyz - low[:, None]) / step[:, None]) - 32768
+    return (_to_le_bytes(q.astype(numpy.int16).ravel(), 'i2'),
+            low.tolist(), step.tolist())
+
+
+def _decode_species(buf, offset, n_mols, low, step):
+    """ Return (floats, end offset) for one position or orientation array """
+    n_values = 3 * n_mols
+    if low is None:
+        columns = _from_le_bytes(buf[offset:offset + 4*n_values], 'f4', n_values)
+        return _interleave(columns, n_mols), offset + 4*n_values
+    q = _from_le_bytes(buf[offset:offset + 2*n_values], 'i2', n_values)
+    if numpy is not None:
+        xyz = (q.reshape(3, n_mols) + 32768.0) * numpy.array(step)[:, None] + \
+            numpy.array(low)[:, None]
+        columns = xyz.astype(numpy.float32).ravel()
+    else:
+        columns = array.array('f', [
+            (q[i] + 32768.0) * step[i // n_mols] + low[i // n_mols]
+            for i in range(n_values)])
+    return _interleave(columns, n_mols), offset + 2*n_values
+
+
+def write_seed_archive(seed_dir, quantize=False, level=6, remove=False):
+    """ Pack all frame files of a seed directory into its ARCHIVE_NAME file.
+
+    Each frame becomes one zlib compressed chunk holding every species as
+    x, y and z columns, either as float32 or (with quantize=True, which needs
+    NumPy) as int16 scaled to the range of each axis in that frame. A table
+    of contents with the chunk offsets and the seed index entries of all
+    frames is kept at the end of the file, so any frame is found without a
+    directory listing. Frames already in an existing archive are carried
+    over. With remove=True the frame files are deleted once the archive is
+    in place. Returns the number of frames in the archive.
+
+    """
+    if quantize and numpy is None:
+        raise ValueError("Quantized archives require NumPy")
+
+    old_archive = open_seed_archive(seed_dir)
+    file_names = sorted([f for f in os.listdir(seed_dir)
+                         if not f.startswith('.') and
+                         os.path.isfile(os.path.join(seed_dir, f))])
+    file_name_set = set(file_names)
+    names = set(file_name_set)
+    if old_archive is not None:
+        names.update(old_archive.toc)
+    names = sorted(names)
+
+    archive_path = os.path.join(seed_dir, ARCHIVE_NAME)
+    temp_path = archive_path + ".tmp"
+    toc = collections.OrderedDict()
+    with open(temp_path, "wb") as f:
+        f.write(ARCHIVE_MAGIC)
+        for name in names:
+            if name in file_name_set:
+                filepath = os.path.join(seed_dir, name)
+                mol_dict = read_viz_frame(filepath)
+            else:
+                mol_dict = old_archive.read_frame(name)
+
+            species = []
+            blocks = []
+            for s, (mol_type, pos, orient) in mol_dict.items():
+                n_mols = len(pos) // 3
+                data, low, step = _encode_species(pos, quantize and n_mols > 0)
+                blocks.append(data)
+                info = [s, mol_type, n_mols, low, step]
+                if len(orient):
+                    data, low, step = _encode_species(orient, quantize)
+                    blocks.append(data)
+                    info += [low, step]
+                species.append(info)
+            chunk = zlib.compress(b"".join(blocks), level)
+            toc[name] = {
+                'offset': f.tell(),
+                'length': len(chunk),
+                'iteration': frame_iteration(name),
+                'species': species,
+                'bbox': _bounding_box(mol_dict),
+            }
+            f.write(chunk)
+
+        toc_data = zlib.compress(json.dumps(
+            {'version': ARCHIVE_VERSION, 'frames': toc},
+            separators=(',', ':')).encode(), level)
+        toc_offset = f.tell()
+        f.write(toc_data)
+        f.write(_archive_trailer.pack(toc_offset, len(toc_data), ARCHIVE_MAGIC))
+    if old_archive is not None:
+        old_archive.close()
+    os.rename(temp_path, archive_path)
+
+    if remove:
+        for name in file_names:
+            os.remove(os.path.join(seed_dir, name))
+    return len(toc)
+
+
+class VizSeedArchive:
+    """ Read access to the frames of one seed archive (see write_seed_archive)
+
+    Instances are safe to use from several threads. Use open_seed_archive()
+    rather than creating them directly so each archive is opened only once.
+
+    """
+
+    def __init__(self, archive_path):
+        self.archive_path = archive_path
+        st = os.stat(archive_path)
+        self.mtime = st.st_mtime
+        self.size = st.st_size
+        with open(archive_path, "rb") as f:
+            self.buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if ((self.size < len(ARCHIVE_MAGIC) + _archive_trailer.size) or
+                (self.buf[:len(ARCHIVE_MAGIC)] != ARCHIVE_MAGIC)):
+            self.close()
+            raise ValueError("Not a viz archive: %s" % archive_path)
+        toc_offset, toc_length, magic = _archive_trailer.unpack(
+            self.buf[-_archive_trailer.size:])
+        if magic != ARCHIVE_MAGIC:
+            self.close()
+            raise ValueError("Incomplete viz archive: %s" % archive_path)
+        header = json.loads(zlib.decompress(
+            self.buf[toc_offset:toc_offset + toc_length]).decode(),
+            object_pairs_hook=collections.OrderedDict)
+        if header.get('version') != ARCHIVE_VERSION:
+            self.close()
+            raise ValueError("Unsupported viz archive: %s" % archive_path)
+        self.toc = header['frames']
+
+    def __contains__(self, name):
+        return name in self.toc
+
+    def close(self):
+        self.buf.close()
+
+    def read_frame(self, name):
+        """ Decode one frame, returned like read_viz_frame """
+        info = self.toc[name]
+        data = zlib.decompress(
+            self.buf[info['offset']:info['offset'] + info['length']])
+        mol_dict = collections.OrderedDict()
+        offset = 0
+        for species in info['species']:
+            s, mol_type, n_mols, low, step = species[:5]
+            pos, offset = _decode_species(data, offset, n_mols, low, step)
+            if len(species) > 5:
+                orient, offset = _decode_species(
+                    data, offset, n_mols, species[5], species[6])
+            else:
+                orient = _empty_floats()
+            mol_dict[s] = [mol_type, pos, orient]
+        return mol_dict
+
+    def index_entry(self, name):
+        """ Return the seed index entry of an archived frame """
+        info = self.toc[name]
+        return {
+            'file': name,
+            'size': info['length'],
+            'mtime': self.mtime,
+            'iteration': info['iteration'],
+            'binary': False,
+            'archived': True,
+            'species': collections.OrderedDict(
+                [(s[0], [s[1], s[2], -1, -1]) for s in info['species']]),
+            'bbox': info['bbox'],
+        }
+
+
+def open_seed_archive(seed_dir):
+    """ Return the (shared) archive of a seed directory or None if it has none
+
+    An archive which was rewritten since it was opened is opened again.
+
+    """
+    archive_path = os.path.join(seed_dir, ARCHIVE_NAME)
+    try:
+        st = os.stat(archive_path)
+    except OSError:
+        return None
+    with _archive_lock:
+        archive = _open_archives.get(archive_path)
+        if (archive is not None and archive.mtime == st.st_mtime and
+                archive.size == st.st_size):
+            return archive
+        try:
+            archive = VizSeedArchive(archive_path)
+        except (IOError, OSError, ValueError, zlib.error):
+            return None
+        # An older mapping may still be in use by another thread, so it is
+        # left for the garbage collector instead of being closed here.
+        _open_archives[archive_path] = archive
+        return archive
+
+
+
+def seed_index_species_counts(seed_index, frame_index):
+    """ Return {species name: molecule count} for a frame of a seed index """
+    counts = collections.OrderedDict()
+    for name, info in seed_index['frames'][frame_index]['species'].items():
+        counts[name] = info[1]
+    return counts
+
+
+def subsample_indices(n_mols, max_mols):
+    """ Return max_mols molecule indices spread evenly over range(n_mols).
+
+    One molecule is taken from the middle of each of max_mols equal strata,
+    so the same count always selects the same molecules.
+
+    """
+    if numpy is not None:
+        return (numpy.arange(1, 2*max_mols, 2, dtype=numpy.int64) *
+                n_mols) // (2*max_mols)
+    return [((2*i + 1) * n_mols) // (2*max_mols) for i in range(max_mols)]
+
+
+def _take_vectors(floats, indices):
+    if numpy is not None:
+        return numpy.asarray(floats).reshape(-1, 3)[indices].ravel()
+    taken = array.array('f')
+    for i in indices:
+        taken.extend(floats[3*i:3*i+3])
+    return taken
+
+
+def subsample_frame(mol_dict, max_mols):
+    """ Limit every species of a decoded frame to at most max_mols molecules.
+
+    Species at or under the limit are passed through unchanged. A new dict
+    is returned, so cached frames are never modified.
+
+    """
+    sampled = collections.OrderedDict()
+    for name, (mol_type, pos, orient) in mol_dict.items():
+        n_mols = len(pos) // 3
+        if n_mols > max_mols:
+            indices = subsample_indices(n_mols, max_mols)
+            pos = _take_vectors(pos, indices)
+            if len(orient):
+                orient = _take_vectors(orient, indices)
+        sampled[name] = [mol_type, pos, orient]
+    return sampled
+
+
+def boxes_intersect(box_a, box_b):
+    """ True if two [xmin, ymin, zmin, xmax, ymax, zmax] boxes overlap """
+    return all([(box_a[i] <= box_b[i+3]) and (box_b[i] <= box_a[i+3])
+                for i in range(3)])
+
+
+def crop_frame(mol_dict, box):
+    """ Keep only the molecules inside box = [xmin, ymin, zmin, xmax, ymax, zmax].
+
+    A new dict is returned, so cached frames are never modified. Species
+    without molecules inside the box are kept with empty arrays so they
+    still replace the previous frame.
+
+    """
+    cropped = collections.OrderedDict()
+    for name, (mol_type, pos, orient) in mol_dict.items():
+        if len(pos) == 0:
+            cropped[name] = [mol_type, pos, orient]
+            continue
+        if numpy is not None:
+            xyz = numpy.asarray(pos).reshape(-1, 3)
+            inside = numpy.all((xyz >= box[:3]) & (xyz <= box[3:]), axis=1)
+            if inside.all():
+                cropped[name] = [mol_type, pos, orient]
+                continue
+            indices = numpy.flatnonzero(inside)
+        else:
+            indices = [i for i in range(len(pos) // 3)
+                       if all([box[k] <= pos[3*i+k] <= box[k+3]
+                               for k in range(3)])]
+        pos = _take_vectors(pos, indices)
+        if len(orient):
+            orient = _take_vectors(orient, indices)
+        cropped[name] = [mol_type, pos, orient]
+    return cropped
+
+
+def _read_frame_or_none(filepath, copy=False):
+    try:
+        return read_viz_frame(filepath, copy=copy)
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def read_frames_parallel(filepaths, n_workers=4, processes=False):
+    """ Decode several frames at once (e.g. one iteration of every seed).
+
+    Returns the decoded frames in the order of filepaths, with None for files
+    which could not be read. With processes=True a process pool is used and
+    the arrays are copied back to the caller. Threads are used otherwise,
+    which is what should be used inside Blender since its executable can't
+    host multiprocessing children.
+
+    """
+    if processes:
+        executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=max(1, n_workers))
+    else:
+        executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max(1, n_workers))
+    with executor:
+        return list(executor.map(_read_frame_or_none, filepaths,
+                                 [processes] * len(filepaths)))
+
+
+def density_grid_dims(bbox, resolution):
+    """ Return grid dimensions with resolution cells along the longest axis """
+    extent = [bbox[i+3] - bbox[i] for i in range(3)]
+    longest = max(extent)
+    if longest <= 0.0:
+        return [1, 1, 1]
+    return [max(1, int(round(resolution * e / longest))) for e in extent]
+
+
+def ensemble_density(frames, resolution=32):
+    """ Reduce the frames of an ensemble to per-species occupancy grids.
+
+    Returns (grids, bbox, dims) where grids maps a species name to a NumPy
+    array of shape dims holding the mean number of molecules per cell over
+    all frames, and bbox is the box covered by the grid. Requires NumPy.
+
+    """
+    frames = [f for f in frames if f is not None]
+    bbox = None
+    for frame in frames:
+        f_bbox = _bounding_box(frame)
+        if f_bbox is None:
+            continue
+        if bbox is None:
+            bbox = f_bbox
+        else:
+            bbox = [min(bbox[i], f_bbox[i]) for i in range(3)] + \
+                   [max(bbox[i], f_bbox[i]) for i in range(3, 6)]
+    if bbox is None:
+        return {}, None, None
+
+    # Give flat dimensions some thickness so histogram ranges are valid
+    for i in range(3):
+        if bbox[i+3] <= bbox[i]:
+            bbox[i] -= 0.5e-3
+            bbox[i+3] += 0.5e-3
+    dims = density_grid_dims(bbox, resolution)
+    ranges = [(bbox[i], bbox[i+3]) for i in range(3)]
+
+    grids = collections.OrderedDict()
+    for frame in frames:
+        for name, entry in frame.items():
+            if len(entry[1]) == 0:
+                continue
+            xyz = numpy.asarray(entry[1]).reshape(-1, 3)
+            counts = numpy.histogramdd(xyz, bins=dims, range=ranges)[0]
+            if name in grids:
+                grids[name] += counts
+            else:
+                grids[name] = counts
+    for name in grids:
+        grids[name] /= len(frames)
+    return grids, bbox, dims
+
+
+class VizFrameCache:
+    """ Decode viz frames ahead of the current frame on a thread pool.
+
+    Decoded frames are kept in an LRU cache whose total size is bounded by
+    budget_mb. Each call to get_frame schedules the next "lookahead" frames
+    in the current playback direction, which is taken from the difference
+    between successive requested indices (so reverse playback prefetches
+    backwards).
+
+    """
+
+    def __init__(self, lookahead=4, budget_mb=512, n_threads=2):
+        self.lock = threading.Lock()
+        self.frames = collections.OrderedDict()
+        self.pending = {}
+        self.nbytes = 0
+        self.frame_list = []
+        self.frame_set = set()
+        self.last_index = None
+        self.direction = 1
+        self.executor = None
+        self.n_threads = 0
+        self.configure(lookahead, budget_mb, n_threads)
+
+    def configure(self, lookahead, budget_mb, n_threads):
+        """ Change the prefetch depth, memory budget and thread count """
+        self.lookahead = max(0, lookahead)
+        self.budget = max(0, budget_mb) * 1024 * 1024
+        if n_threads != self.n_threads:
+            if self.executor is not None:
+                self.executor.shutdown(wait=False)
+            self.executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=max(1, n_threads))
+            self.n_threads = n_threads
+        with self.lock:
+            self._evict(None)
+
+    def drop_frames(self):
+        """ Cancel pending decodes and free all cached frames """
+        with self.lock:
+            for future in self.pending.values():
+                future.cancel()
+            self.pending = {}
+            self.frames.clear()
+            self.nbytes = 0
+
+    def set_frame_list(self, frame_list):
+        """ Replace the list of frame file paths and drop all cached frames """
+        self.drop_frames()
+        with self.lock:
+            self.frame_list = list(frame_list)
+            self.frame_set = set(self.frame_list)
+            self.last_index = None
+            self.direction = 1
+
+    def extend_frame_list(self, frame_list):
+        """ Append new frame file paths without dropping cached frames """
+        with self.lock:
+            self.frame_list.extend(frame_list)
+            self.frame_set.update(frame_list)
+
+    def clear(self):
+        self.set_frame_list([])
+
+    def shutdown(self):
+        self.clear()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+            self.n_threads = 0
+
+    def get_frame(self, index):
+        """ Return the decoded frame at index and prefetch the ones after it """
+        with self.lock:
+            if self.last_index is not None and index != self.last_index:
+                self.direction = 1 if index > self.last_index else -1
+            self.last_index = index
+            filepath = self.frame_list[index]
+            mol_dict = self.frames.get(filepath)
+            future = None
+            if mol_dict is not None:
+                self.frames.move_to_end(filepath)
+            else:
+                future = self.pending.get(filepath)
+
+        if mol_dict is None:
+            if future is not None:
+                try:
+                    mol_dict = future.result()
+                except concurrent.futures.CancelledError:
+                    mol_dict = None
+            if mol_dict is None:
+                mol_dict = read_viz_frame(filepath, copy=True)
+                self._store(filepath, mol_dict)
+
+        self._schedule(index)
+        return mol_dict
+
+    def _schedule(self, index):
+        with self.lock:
+            wanted = set()
+            for i in range(1, self.lookahead + 1):
+                j = index + self.direction * i
+                if (j < 0) or (j >= len(self.frame_list)):
+                    break
+                wanted.add(self.frame_list[j])
+            # Stop decoding frames that playback has moved away from
+            for filepath in list(self.pending.keys()):
+                if filepath not in wanted:
+                    if self.pending[filepath].cancel():
+                        self.pending.pop(filepath)
+            for filepath in wanted:
+                if (filepath not in self.frames) and (
+                        filepath not in self.pending):
+                    self.pending[filepath] = self.executor.submit(
+                        self._prefetch, filepath)
+
+    def _prefetch(self, filepath):
+        try:
+            mol_dict = read_viz_frame(filepath, copy=True)
+        except (IOError, ValueError):
+            mol_dict = None
+        if mol_dict is not None:
+            self._store(filepath, mol_dict)
+        with self.lock:
+            self.pending.pop(filepath, None)
+        return mol_dict
+
+    def _store(self, filepath, mol_dict):
+        with self.lock:
+            if filepath not in self.frame_set:
+                # The frame list was replaced while this frame was decoded
+                return
+            if filepath in self.frames:
+                self.nbytes -= frame_nbytes(self.frames.pop(filepath))
+            self.frames[filepath] = mol_dict
+            self.nbytes += frame_nbytes(mol_dict)
+            current = None
+            if self.last_index is not None:
+                current = self.frame_list[self.last_index]
+            self._evict(current)
+
+    def _evict(self, keep):
+        """ Drop least recently used frames until the cache fits the budget """
+        for filepath in list(self.frames.keys()):
+            if self.nbytes <= self.budget:
+                break
+            if filepath != keep:
+                self.nbytes -= frame_nbytes(self.frames.pop(filepath))
+
+
+if __name__ == '__main__':
+    # Decode the frames given on the command line and report timing.
+    # This runs outside of Blender for benchmarking the decoder.
+    #
+    # With "pack" as the first argument, the seed directories given instead
+    # are packed into archives ("--int16" quantizes the coordinates and
+    # "--remove" deletes the packed frame files).
+    import time
+
+    if sys.argv[1:2] == ['pack']:
+        options = [a for a in sys.argv[2:] if a.startswith('--')]
+        for seed_dir in [a for a in sys.argv[2:] if not a.startswith('--')]:
+            begin = time.time()
+            n_frames = write_seed_archive(seed_dir,
+                                          quantize='--int16' in options,
+                                          remove='--remove' in options)
+            sys.stdout.write('{0}: packed {1} frames into {2} bytes in {3:0.2f} s\n'.format(
+                seed_dir, n_frames,
+                os.path.getsize(os.path.join(seed_dir, ARCHIVE_NAME)),
+                time.time() - begin))
+        sys.exit(0)
+
+    total_time = 0.0
+    for filepath in sys.argv[1:]:
+        begin = time.time()
+        mol_dict = read_viz_frame(filepath)
+        elapsed = time.time() - begin
+        total_time += elapsed
+        sys.stdout.write('{0}: {1} species, {2} molecules in {3:0.4f} s\n'.format(
+            filepath, len(mol_dict), molecule_count(mol_dict), elapsed))
+        for name, entry in mol_dict.items():
+            sys.stdout.write('  {0}: type {1}, {2} molecules\n'.format(
+                name, entry[0], len(entry[1]) // 3))
+    sys.stdout.write('Decoded {0} frames in {1:0.4f} s\n'.format(
+        len(sys.argv[1:]), total_time))